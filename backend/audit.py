@@ -0,0 +1,236 @@
+"""Automatic audit trail of mutating requests, written in batches.
+
+AuditMiddleware records every POST / PUT / PATCH / DELETE that reached a
+route: the caller (see auth.py), the route as the action ("PUT
+/tenders/{tender_id}/status"), the entity type and id, the request path
+and the response status. For creates, the id comes from the JSON
+response body.
+
+Recording a request only appends to a bounded in-memory queue. A
+background task started by the lifespan hook drains it, writing up to
+TENDER_AUDIT_BATCH_SIZE rows per transaction at least every
+TENDER_AUDIT_FLUSH_INTERVAL seconds. When the queue
+(TENDER_AUDIT_QUEUE_SIZE) is full, requests wait for room instead of
+dropping entries; `stats()` reports how often and how long they waited.
+Entries still queued at shutdown are flushed before the process exits;
+a hard kill loses at most the queue's contents.
+"""
+import asyncio
+import datetime
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from . import database, models
+from .etag import bump_versions
+from .fast_json import loads
+
+QUEUE_SIZE = int(os.environ.get("TENDER_AUDIT_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.environ.get("TENDER_AUDIT_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.environ.get("TENDER_AUDIT_FLUSH_INTERVAL", "0.5"))
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# (method, route) pairs not worth a row each: explicit audit entries are
+# already audit rows, and upload chunks are covered by .../complete.
+SKIP_ROUTES = {("POST", "/audit_logs/"), ("PUT", "/uploads/{upload_id}")}
+
+# Created-row ids are read from JSON responses up to this size
+MAX_ID_BODY = 16 * 1024
+
+AUDIT_TABLE = models.AuditLog.__tablename__
+# Full-text index over action and path (see fts.py, audit_query.py)
+AUDIT_FTS_TABLE = "audit_logs_fts"
+
+
+class AuditWriter:
+    """Bounded queue of audit rows drained by one background task."""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._retry: List[dict] = []
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_depth = 0
+        self.last_batch_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task after writing everything queued."""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self._inflight is not None:
+            # The batch being written when the task was cancelled
+            await self._inflight
+        await self._flush(self._drain(len(self._retry) + self._queue.qsize()))
+        self._task = None
+
+    async def submit(self, row: dict):
+        self.enqueued += 1
+        if not self.running:
+            # No flush task (scripts, tests without a lifespan): write now
+            await self._flush([row])
+            return
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            started = time.perf_counter()
+            self.waits += 1
+            await self._queue.put(row)
+            self.wait_seconds += time.perf_counter() - started
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _drain(self, limit: int) -> List[dict]:
+        batch, self._retry = self._retry[:limit], self._retry[limit:]
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            if not self._retry:
+                # Sleep until there is something to write
+                self._retry.append(await self._queue.get())
+            # Let a batch accumulate, unless one is already full
+            if len(self._retry) + self._queue.qsize() < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            # Shielded: stopping must not abandon a batch halfway
+            self._inflight = asyncio.ensure_future(self._flush(self._drain(self.batch_size)))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+
+    async def _flush(self, batch: List[dict]):
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            await run_in_threadpool(write_batch, batch)
+        except Exception as e:
+            self.failed_batches += 1
+            if not self.running:
+                print(f"Audit batch write failed, {len(batch)} entries lost:", e)
+                return
+            # Keep the rows and try again on the next round
+            self._retry = batch + self._retry
+            print("Audit batch write failed:", e)
+            await asyncio.sleep(self.flush_interval)
+            return
+        self.batches += 1
+        self.written += len(batch)
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": (self._queue.qsize() if self._queue else 0) + len(self._retry),
+            "queue_size": self.queue_size,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "backpressure_waits": self.waits,
+            "backpressure_wait_ms": round(self.wait_seconds * 1000, 2),
+            "last_batch_ms": round(self.last_batch_ms, 2),
+        }
+
+
+def write_batch(rows: List[dict]):
+    """One transaction, one executemany INSERT for the whole batch."""
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.AuditLog), rows)
+        # Core insert: bump the ETag counter the ORM hook would have
+        bump_versions(conn, {AUDIT_TABLE})
+
+
+writer = AuditWriter()
+
+
+def _entity_id(path_params: Dict[str, str]) -> Optional[int]:
+    for name, value in path_params.items():
+        if name.endswith("id") and str(value).isdigit():
+            return int(value)
+    return None
+
+
+def _created_id(body: bytes) -> Optional[int]:
+    try:
+        data = loads(body)
+    except ValueError:
+        return None
+    value = data.get("id") if isinstance(data, dict) else None
+    return value if isinstance(value, int) else None
+
+
+class AuditMiddleware:
+    def __init__(self, app, audit_writer: AuditWriter = None):
+        self.app = app
+        self.writer = audit_writer or writer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        body = []
+        collect = scope["method"] == "POST"
+
+        async def capture(message):
+            nonlocal status, collect
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = Headers(raw=message["headers"])
+                collect = collect and headers.get("content-type", "").startswith("application/json")
+            elif message["type"] == "http.response.body" and collect:
+                body.append(message.get("body", b""))
+                collect = sum(map(len, body)) <= MAX_ID_BODY
+                if not collect:
+                    body.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None)
+            if template is not None and (scope["method"], template) not in SKIP_ROUTES:
+                user = scope.get("state", {}).get("user")
+                entity_id = _entity_id(scope.get("path_params", {}))
+                if entity_id is None and body and 200 <= status < 300:
+                    entity_id = _created_id(b"".join(body))
+                await self.writer.submit({
+                    "user_id": user.user_id if user is not None else None,
+                    "action": f"{scope['method']} {template}",
+                    "entity_type": scope["path"].strip("/").split("/")[0] or None,
+                    "entity_id": entity_id,
+                    "path": scope["path"],
+                    "status_code": status,
+                    "timestamp": datetime.datetime.utcnow(),
+                })
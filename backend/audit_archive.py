@@ -0,0 +1,199 @@
+"""Monthly audit log partitions and their read-only archive files.
+
+`audit_logs` only holds the current month plus the last
+TENDER_AUDIT_HOT_MONTHS closed months. `compact` moves every older month
+into its own SQLite file, `<TENDER_AUDIT_ARCHIVE_DIR>/audit_YYYY-MM.db`:
+same table, same indexes and full-text index, rows keep their ids. The
+file is written next to its final name, VACUUMed and renamed into place,
+and only then are the rows deleted from the hot table, in small
+transactions so the audit writer is never locked out for long.
+
+A month that already has an archive (rows written late, or a run
+interrupted between the rename and the delete) is merged into it; ids
+make the copy idempotent.
+
+Archives never change once written, so backups copy each one once, and
+readers open them with `immutable=1`: no locks, no journal. The audit
+API reads them through the same query code as the hot table (see
+audit_query.py).
+
+Run monthly, e.g. from cron:
+
+    python -m backend.audit_archive
+"""
+import datetime
+import os
+import re
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import database, fts, models
+from .audit import AUDIT_FTS_TABLE
+from .etag import bump_versions
+
+HOT_MONTHS = int(os.environ.get("TENDER_AUDIT_HOT_MONTHS", "1"))
+
+# Rows per copy chunk and per delete transaction
+BATCH_SIZE = 5000
+
+_ARCHIVE_NAME = re.compile(r"^audit_(\d{4}-\d{2})\.db$")
+
+
+def _default_dir() -> str:
+    db_file = database.sqlite_path()
+    return os.path.join(os.path.dirname(db_file) if db_file else os.getcwd(), "audit_archive")
+
+
+ARCHIVE_DIR = os.environ.get("TENDER_AUDIT_ARCHIVE_DIR") or _default_dir()
+
+log_table = models.AuditLog.__table__
+
+
+# Months
+
+def month_of(ts: datetime.datetime) -> str:
+    return ts.strftime("%Y-%m")
+
+
+def month_bounds(month: str) -> Tuple[datetime.datetime, datetime.datetime]:
+    """[start, end) of a "YYYY-MM" month."""
+    start = datetime.datetime.strptime(month, "%Y-%m")
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def hot_cutoff(now: datetime.datetime = None, hot_months: int = HOT_MONTHS) -> datetime.datetime:
+    """Start of the oldest month kept in the hot table."""
+    start = (now or datetime.datetime.utcnow()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(hot_months):
+        start = (start - datetime.timedelta(days=1)).replace(day=1)
+    return start
+
+
+# Reading archives
+
+def archive_path(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"audit_{month}.db")
+
+
+def archived_months() -> List[str]:
+    """Months with an archive file, newest first."""
+    try:
+        names = os.listdir(ARCHIVE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted((m.group(1) for m in map(_ARCHIVE_NAME.match, names) if m), reverse=True)
+
+
+# archive path -> (file mtime, read-only engine); a replaced file gets a new engine
+_engines: Dict[str, Tuple[int, Engine]] = {}
+_engines_lock = threading.Lock()
+
+
+def open_archive(month: str) -> Session:
+    """A read-only Session on a month's archive."""
+    path = archive_path(month)
+    stamp = os.stat(path).st_mtime_ns
+    with _engines_lock:
+        cached = _engines.get(path)
+        if cached is None or cached[0] != stamp:
+            if cached is not None:
+                cached[1].dispose()
+            engine = create_engine(
+                f"sqlite:///file:{quote(path)}?mode=ro&immutable=1&uri=true",
+                connect_args={"check_same_thread": False},
+            )
+            cached = _engines[path] = (stamp, engine)
+    return Session(bind=cached[1])
+
+
+def archives() -> List[dict]:
+    return [{"month": m, "bytes": os.path.getsize(archive_path(m))} for m in archived_months()]
+
+
+# Compaction
+
+def compact(bind: Engine = None, now: datetime.datetime = None, hot_months: int = HOT_MONTHS) -> List[dict]:
+    """Archive every month older than the hot window; one entry per month moved."""
+    bind = bind or database.engine
+    cutoff = hot_cutoff(now, hot_months)
+    with bind.connect() as conn:
+        oldest = conn.execute(select(func.min(log_table.c.timestamp)).where(log_table.c.timestamp < cutoff)).scalar()
+    moved = []
+    month = month_of(oldest) if oldest is not None else None
+    while month is not None and month_bounds(month)[0] < cutoff:
+        result = archive_month(bind, month)
+        if result is not None:
+            moved.append(result)
+        month = month_of(month_bounds(month)[1])
+    return moved
+
+
+def archive_month(bind: Engine, month: str) -> Optional[dict]:
+    """Move one month's rows from the hot table into its archive file."""
+    start, end = month_bounds(month)
+    in_month = (log_table.c.timestamp >= start, log_table.c.timestamp < end)
+    with bind.connect() as conn:
+        last_id = conn.execute(select(func.max(log_table.c.id)).where(*in_month)).scalar()
+    if last_id is None:
+        return None
+    # Rows inserted while this runs are left for the next run
+    selected = (*in_month, log_table.c.id <= last_id)
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(month)
+    partial = path + ".partial"
+    if os.path.exists(path):
+        shutil.copyfile(path, partial)
+    elif os.path.exists(partial):
+        os.remove(partial)
+    _copy_rows(bind, partial, selected)
+    with open(partial, "rb") as fh:
+        os.fsync(fh.fileno())
+    os.replace(partial, path)
+
+    deleted = 0
+    while True:
+        with bind.begin() as conn:
+            batch = select(log_table.c.id).where(*selected).limit(BATCH_SIZE)
+            count = conn.execute(log_table.delete().where(log_table.c.id.in_(batch))).rowcount
+            if count:
+                bump_versions(conn, {log_table.name})
+        deleted += count
+        if count < BATCH_SIZE:
+            break
+    return {"month": month, "rows": deleted, "bytes": os.path.getsize(path)}
+
+
+def _copy_rows(bind: Engine, target: str, selected):
+    out = create_engine(f"sqlite:///{target}")
+    try:
+        with out.begin() as dest:
+            log_table.create(dest, checkfirst=True)
+            with bind.connect() as src:
+                result = src.execution_options(yield_per=BATCH_SIZE).execute(
+                    select(log_table).where(*selected).order_by(log_table.c.id)
+                )
+                for chunk in result.partitions():
+                    dest.execute(insert(log_table).prefix_with("OR IGNORE"), [dict(row._mapping) for row in chunk])
+            # Built after the bulk copy; its triggers cover later merges
+            if fts.fts5_available(dest):
+                fts.create_index(dest, AUDIT_FTS_TABLE, log_table.name, ("action", "path"))
+        with out.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM")
+    finally:
+        out.dispose()
+
+
+if __name__ == "__main__":
+    results = compact()
+    for entry in results:
+        print(f"Archived {entry['rows']} audit entries for {entry['month']} ({entry['bytes']} bytes)")
+    if not results:
+        print(f"Nothing to archive before {hot_cutoff():%Y-%m}.")
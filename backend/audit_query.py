@@ -0,0 +1,127 @@
+"""Filtered, newest-first audit log queries.
+
+Entries are ordered by (timestamp, id) descending and paginated by
+keyset: the X-Next-Cursor of a page encodes the last entry's timestamp
+and id, and the next page starts strictly before it. Going back a
+million entries costs the same as reading the first page. Each filter
+has a composite index ending in timestamp (see models.AuditLog), so a
+page is an index range walk whatever the filters.
+
+`q` searches the action text and request path through the
+`audit_logs_fts` FTS5 index (see fts.py), or with LIKE on databases
+without one.
+
+Months moved out of the hot table (see audit_archive.py) are read with
+the same query, archive by archive, newest first, and merged in. An
+archive is only opened while its rows can still reach the page.
+"""
+import base64
+import binascii
+import datetime
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import audit_archive, fts, models, schemas
+from .audit import AUDIT_FTS_TABLE
+from .database import DBSession
+from .fast_json import list_response, schema_columns
+from .pagination import Page
+
+
+@dataclass
+class AuditFilter:
+    user_id: Optional[int] = None
+    action: Optional[str] = None
+    entity_type: Optional[str] = None
+    entity_id: Optional[int] = None
+    created_from: Optional[datetime.datetime] = None
+    created_to: Optional[datetime.datetime] = None
+    q: Optional[str] = None
+
+
+def encode_cursor(timestamp: datetime.datetime, entry_id: int) -> str:
+    raw = f"ts:{timestamp.isoformat()}|{entry_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        kind, _, value = base64.urlsafe_b64decode(padded.encode()).decode().partition(":")
+        stamp, _, entry_id = value.rpartition("|")
+        if kind != "ts":
+            raise ValueError(kind)
+        return datetime.datetime.fromisoformat(stamp), int(entry_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_filter(db: Session, query, log, f: AuditFilter):
+    """Restrict `query` over the audit table `log` to the entries `f` selects."""
+    if f.user_id is not None:
+        query = query.filter(log.user_id == f.user_id)
+    if f.action:
+        query = query.filter(log.action == f.action)
+    if f.entity_type:
+        query = query.filter(log.entity_type == f.entity_type)
+    if f.entity_id is not None:
+        query = query.filter(log.entity_id == f.entity_id)
+    if f.created_from:
+        query = query.filter(log.timestamp >= f.created_from)
+    if f.created_to:
+        query = query.filter(log.timestamp < f.created_to)
+    if f.q:
+        query = fts.filter_matches(db, query, AUDIT_FTS_TABLE, log.id, ("action", "path"), f.q)
+    return query
+
+
+def fetch_rows(db: Session, f: AuditFilter, after, limit: int, columns) -> list:
+    """Up to `limit` entries older than the `after` (timestamp, id) key."""
+    log = models.AuditLog
+    query = apply_filter(db, db.query(log), log, f)
+    if after is not None:
+        query = query.filter(tuple_(log.timestamp, log.id) < tuple_(*after, types=(log.timestamp.type, log.id.type)))
+    stmt = query.with_entities(*columns).order_by(log.timestamp.desc(), log.id.desc()).limit(limit).statement
+    return db.execute(stmt).all()
+
+
+def with_archived(rows: list, f: AuditFilter, after, limit: int, columns, key) -> list:
+    """Merge archived entries into `rows`, keeping the newest `limit`."""
+    for month in audit_archive.archived_months():
+        start, end = audit_archive.month_bounds(month)
+        if f.created_from and end <= f.created_from:
+            break
+        if len(rows) >= limit and key(rows[limit - 1])[0] >= end:
+            # This month, and every older one, sorts after the page
+            break
+        if (f.created_to and start >= f.created_to) or (after is not None and start > after[0]):
+            continue
+        with audit_archive.open_archive(month) as db:
+            older = fetch_rows(db, f, after, limit, columns)
+        # An entry can be in both while a compaction is deleting it
+        merged = {key(row): row for row in rows + older}
+        rows = sorted(merged.values(), key=key, reverse=True)[:limit]
+    return rows
+
+
+async def audit_page(db: DBSession, f: AuditFilter, page: Page, response: Response) -> Response:
+    names, columns, converters = schema_columns(schemas.AuditLogSchema, models.AuditLog)
+    after = decode_cursor(page.after) if page.after else None
+    position = names.index("timestamp"), names.index("id")
+
+    def key(row):
+        return row[position[0]], row[position[1]]
+
+    rows = await db.run(fetch_rows, f, after, page.limit + 1, columns)
+    if audit_archive.archived_months():
+        rows = await run_in_threadpool(with_archived, rows, f, after, page.limit + 1, columns, key)
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+    return list_response(names, converters, rows, page, response, next_cursor)
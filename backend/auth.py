@@ -0,0 +1,364 @@
+"""Password hashing, signed session tokens and the per-request auth cache.
+
+/login/ returns a bearer token: base64url(JSON {"sub", "iat", "exp"})
+plus an HMAC-SHA256 signature with TENDER_SECRET_KEY. Clients send it as
+`Authorization: Bearer <token>` (or `?token=` on the WebSocket).
+
+Validating a token costs one HMAC. The user's role comes from the users
+table, but a validated token is kept in a bounded LRU cache for
+TENDER_AUTH_CACHE_TTL seconds, so repeat requests do no query at all.
+Deleting a user or changing a role reaches existing sessions within
+that TTL.
+
+Every worker must share TENDER_SECRET_KEY. Without it a random key is
+generated per process, and tokens only work on the worker that issued
+them and until it restarts.
+
+Passwords are stored as PBKDF2-SHA256 with TENDER_PASSWORD_ITERATIONS
+rounds. Hashing runs in worker threads, at most
+TENDER_PASSWORD_HASH_CONCURRENCY at a time, so a burst of logins cannot
+take every threadpool slot from database work. Plaintext passwords left
+from before hashing, and hashes with a different cost, are rehashed on
+the next successful login.
+
+Requests without a token are still served unless TENDER_REQUIRE_AUTH=1.
+Routes that scope data by user (`scoped_id`) apply the caller's identity
+whenever a token is present.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
+
+from . import models, schemas
+from .database import DBSession, get_db
+
+SECRET_KEY = os.environ.get("TENDER_SECRET_KEY", "").encode() or secrets.token_bytes(32)
+SESSION_TTL_SECONDS = int(float(os.environ.get("TENDER_SESSION_TTL_HOURS", "12")) * 3600)
+REQUIRE_AUTH = os.environ.get("TENDER_REQUIRE_AUTH", "").lower() in ("1", "true", "yes")
+
+AUTH_CACHE_SIZE = int(os.environ.get("TENDER_AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.environ.get("TENDER_AUTH_CACHE_TTL", "300"))
+
+PASSWORD_ITERATIONS = int(os.environ.get("TENDER_PASSWORD_ITERATIONS", "600000"))
+HASH_CONCURRENCY = int(os.environ.get("TENDER_PASSWORD_HASH_CONCURRENCY", str(os.cpu_count() or 4)))
+
+HASH_SCHEME = "pbkdf2_sha256"
+
+# Reachable without a token even when TENDER_REQUIRE_AUTH is set. Stored
+# files are addressed by content hash and loaded by <img> tags, which
+# cannot send a bearer token.
+PUBLIC_PATHS = {"/", "/dashboard", "/health", "/login/", "/register/"}
+PUBLIC_PREFIXES = ("/files/", "/thumbnails/")
+
+STAFF_ROLES = {models.UserRole.ADMIN, models.UserRole.TECHNICAL, models.UserRole.FINANCE}
+
+
+# Passwords
+
+_hash_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _limiter() -> anyio.CapacityLimiter:
+    global _hash_limiter
+    if _hash_limiter is None:
+        _hash_limiter = anyio.CapacityLimiter(HASH_CONCURRENCY)
+    return _hash_limiter
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(password: str, iterations: int = None) -> str:
+    iterations = iterations or PASSWORD_ITERATIONS
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{HASH_SCHEME}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, stored: Optional[str]) -> Tuple[bool, bool]:
+    """(matches, needs rehash) for `password` against a stored value."""
+    if not stored:
+        return False, False
+    if not stored.startswith(HASH_SCHEME + "$"):
+        # Plaintext from before passwords were hashed
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    _, iterations, salt, digest = stored.split("$")
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), _unb64(salt), int(iterations))
+    return hmac.compare_digest(candidate, _unb64(digest)), int(iterations) != PASSWORD_ITERATIONS
+
+
+async def hash_password_async(password: str) -> str:
+    return await anyio.to_thread.run_sync(hash_password, password, limiter=_limiter())
+
+
+async def verify_password_async(password: str, stored: Optional[str]) -> Tuple[bool, bool]:
+    return await anyio.to_thread.run_sync(verify_password, password, stored, limiter=_limiter())
+
+
+# Tokens
+
+def issue_token(user_id: int, now: float = None) -> Tuple[str, int]:
+    """A signed token for `user_id` and its expiry (Unix seconds)."""
+    now = int(now or time.time())
+    expires = now + SESSION_TTL_SECONDS
+    payload = _b64(json.dumps({"sub": user_id, "iat": now, "exp": expires}, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}", expires
+
+
+def _sign(payload: str) -> str:
+    return _b64(hmac.new(SECRET_KEY, payload.encode(), hashlib.sha256).digest())
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """The token's claims, or None if it is malformed, forged or expired."""
+    payload, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller."""
+    user_id: int
+    role: models.UserRole
+    username: str
+    expires: int
+
+    @property
+    def is_staff(self) -> bool:
+        return self.role in STAFF_ROLES
+
+
+class AuthCache:
+    """token -> Principal, least recently used first out, entries expire
+    after `ttl` seconds. Thread-safe; routes run in worker threads."""
+
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, ttl: float = AUTH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] < now or entry[0].expires < time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token: str, principal: Principal):
+        with self._lock:
+            self._entries[token] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+auth_cache = AuthCache()
+
+
+def _load_principal(db: Session, claims: dict) -> Optional[Principal]:
+    row = db.query(models.User.role, models.User.username).filter(models.User.id == claims["sub"]).first()
+    if row is None:
+        return None
+    return Principal(user_id=claims["sub"], role=row.role, username=row.username, expires=claims["exp"])
+
+
+async def principal_for(token: str, db: DBSession) -> Optional[Principal]:
+    principal = auth_cache.get(token)
+    if principal is not None:
+        return principal
+    claims = decode_token(token)
+    if claims is None:
+        return None
+    principal = await db.run(_load_principal, claims)
+    if principal is not None:
+        auth_cache.put(token, principal)
+    return principal
+
+
+def _bearer(conn: HTTPConnection) -> Optional[str]:
+    header = conn.headers.get("authorization", "")
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token.strip()
+    return conn.query_params.get("token") if conn.scope["type"] == "websocket" else None
+
+
+async def current_user(conn: HTTPConnection, db: DBSession = Depends(get_db)) -> Optional[Principal]:
+    """The caller, from its bearer token; None for anonymous requests.
+
+    An invalid or expired token is always a 401. A missing one is a 401
+    only when TENDER_REQUIRE_AUTH is set and the path is not public.
+    Installed app-wide; the principal is also left on `conn.state.user`.
+    """
+    token = _bearer(conn)
+    principal = await principal_for(token, db) if token else None
+    if token and principal is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session",
+                            headers={"WWW-Authenticate": "Bearer"})
+    path = conn.url.path
+    if principal is None and REQUIRE_AUTH and path not in PUBLIC_PATHS and not path.startswith(PUBLIC_PREFIXES):
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    conn.state.user = principal
+    return principal
+
+
+async def connection_user(conn: HTTPConnection) -> Optional[Principal]:
+    """The caller of a long-lived connection (WebSocket), or None.
+
+    Unlike `current_user` it borrows a database session only for the token
+    lookup, so the connection does not hold one open while it lasts.
+    """
+    token = _bearer(conn)
+    if not token:
+        return None
+    async with asynccontextmanager(get_db)() as db:
+        return await principal_for(token, db)
+
+
+def require_staff(user: Optional[Principal] = Depends(current_user)) -> Optional[Principal]:
+    """Dependency for staff-only routes. Anonymous callers pass where
+    TENDER_REQUIRE_AUTH allows them, as everywhere else."""
+    if user is not None and not user.is_staff:
+        raise HTTPException(status_code=403, detail="Restricted to staff")
+    return user
+
+
+def scoped_id(user: Optional[Principal], role: models.UserRole, requested: Optional[int]) -> Optional[int]:
+    """The user id a `role`-scoped filter (client_id, vendor_id) may use.
+
+    A caller with that role only sees its own rows: the filter defaults to
+    its id and asking for someone else's is a 403. Staff and anonymous
+    callers (when allowed) filter as requested.
+    """
+    if user is None or user.role != role:
+        return requested
+    if requested is not None and requested != user.user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to read another user's records")
+    return user.user_id
+
+
+# Accounts
+
+_dummy_hash: Optional[str] = None
+
+
+def _find_login(db: Session, username: str):
+    return (
+        db.query(models.User.id, models.User.password, models.User.role, models.User.username, models.User.full_name)
+        .filter(models.User.username == username)
+        .first()
+    )
+
+
+def _store_hash(db: Session, user_id: int, hashed: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"password": hashed})
+    db.commit()
+
+
+async def login(db: DBSession, username: str, password: str) -> dict:
+    global _dummy_hash
+    user = await db.run(_find_login, username)
+    if user is None:
+        # Spend the same time as a real check, so response times do not
+        # reveal which usernames exist.
+        _dummy_hash = _dummy_hash or await hash_password_async(secrets.token_hex(8))
+        await verify_password_async(password, _dummy_hash)
+        matches, rehash = False, False
+    else:
+        matches, rehash = await verify_password_async(password, user.password)
+    if not matches:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if rehash:
+        await db.run(_store_hash, user.id, await hash_password_async(password))
+    token, expires = issue_token(user.id)
+    return {
+        "id": user.id, "username": user.username, "role": user.role, "full_name": user.full_name,
+        "token": token, "token_type": "bearer", "expires_at": expires,
+    }
+
+
+def _insert_user(db: Session, user: schemas.UserCreate, hashed: str, existing_ok: bool) -> models.User:
+    existing = db.query(models.User).filter(models.User.username == user.username).first()
+    if existing:
+        if existing_ok:
+            return existing
+        raise HTTPException(status_code=400, detail="Username already registered")
+    db_user = models.User(**user.model_dump(exclude={"password"}), password=hashed)
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def require_role(user: Optional[Principal], *roles: models.UserRole):
+    """403 unless `user` is staff or has one of `roles`. Anonymous callers
+    pass where TENDER_REQUIRE_AUTH allows them, as in `require_staff`."""
+    if user is not None and not user.is_staff and user.role not in roles:
+        raise HTTPException(status_code=403, detail=f"Not allowed for the {user.role.value} role")
+
+
+def check_role_grant(caller: Optional[Principal], role: str, self_service: bool = False):
+    """403 unless `caller` may create an account with `role`.
+
+    Client and vendor accounts are open to anyone; staff accounts need a
+    staff caller. On a self-service route (/register/) that holds even
+    for anonymous callers; elsewhere they pass where TENDER_REQUIRE_AUTH
+    allows them.
+    """
+    try:
+        role = models.UserRole(role)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Unknown role {role!r}")
+    if role not in STAFF_ROLES or (caller is None and not self_service):
+        return
+    if caller is None or not caller.is_staff:
+        raise HTTPException(status_code=403, detail="Only staff can create staff accounts")
+
+
+async def create_account(db: DBSession, user: schemas.UserCreate, existing_ok: bool = False) -> models.User:
+    hashed = await hash_password_async(user.password)
+    return await db.run(_insert_user, user, hashed, existing_ok)
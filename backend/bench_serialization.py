@@ -0,0 +1,104 @@
+"""Benchmark list serialization: ORM + Pydantic versus column tuples + fast JSON.
+
+Seeds a scratch SQLite database with N tenders and times one full list
+response both ways, reporting the cost per row:
+
+    python -m backend.bench_serialization --rows 10000 100000
+
+The Pydantic path mirrors what FastAPI does for `response_model=List[...]`:
+load ORM objects, validate them with from_attributes, dump in JSON mode and
+encode with the stdlib json module.
+"""
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from . import fast_json, models, schemas
+
+
+def seed(session, rows: int):
+    now = datetime.datetime(2026, 1, 1)
+    session.execute(insert(models.User), [{"id": 1, "username": "bench", "role": models.UserRole.CLIENT}])
+    session.execute(insert(models.Tender), [
+        {
+            "tender_id": f"BENCH-{i}",
+            "title": f"Tender {i}",
+            "description": "Benchmark tender " * 4,
+            "deadline": now + datetime.timedelta(days=i % 365),
+            "status": models.TenderStatus.OPEN,
+            "budget": 1000.0 + i,
+            "estimated_cost": 900.0 + i,
+            "delivery_timeline": "30 days",
+            "created_at": now,
+            "client_id": 1,
+        }
+        for i in range(rows)
+    ])
+    session.commit()
+
+
+def pydantic_path(session) -> bytes:
+    adapter = TypeAdapter(List[schemas.TenderSchema])
+    objects = session.query(models.Tender).order_by(models.Tender.id).all()
+    validated = adapter.validate_python(objects, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def fast_path(session) -> bytes:
+    names, columns, converters = fast_json.schema_columns(schemas.TenderSchema, models.Tender)
+    rows = session.query(models.Tender).with_entities(*columns).order_by(models.Tender.id).all()
+    return fast_json.encode_rows(names, converters, rows)
+
+
+def timed(fn, session, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        session.expunge_all()
+        started = time.perf_counter()
+        fn(session)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(rows: int, repeat: int):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        models.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        seed(session, rows)
+        assert json.loads(pydantic_path(session)) == json.loads(fast_path(session))
+        slow = timed(pydantic_path, session, repeat)
+        fast = timed(fast_path, session, repeat)
+        session.close()
+    finally:
+        engine.dispose()
+        os.remove(path)
+    print(
+        f"{rows:>8} rows  pydantic {slow * 1e6 / rows:7.2f} us/row  "
+        f"fast {fast * 1e6 / rows:7.2f} us/row  speed-up {slow / fast:4.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    encoder = "orjson" if fast_json.orjson is not None else "json"
+    print(f"fast path encoder: {encoder}")
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Batch create / update for onboarding large data sets.
+
+A batch is validated as a whole first: each row against its schema, then
+references (tender_id, vendor_id, ...) and unique keys with one IN query
+per column instead of one lookup per row. The valid rows are then written
+in one transaction: one INSERT ... RETURNING executemany for creates, one
+UPDATE executemany keyed on id for updates.
+
+Updates are checked like creates: fields the entity's update schema does
+not allow, and null for a field that cannot be empty, are row errors too.
+
+Rows with errors are reported by index. By default the valid rows are
+still written. With `atomic=true` the whole batch is rejected with 422
+when any row fails.
+
+These statements bypass the ORM unit of work, so they do its
+bookkeeping themselves:
+- change_seq / updated_at for delta sync;
+- table_versions for ETags;
+- a resync push to connected clients, instead of one event per row.
+"""
+import datetime
+import enum
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, ValidationError, create_model
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .changes import allocate_sequence
+from .etag import bump_versions
+from .notifications import RESYNC
+from .sequences import next_id
+
+MAX_BULK_ROWS = 10000
+
+# SQLite limits bound parameters per statement; stay well below it.
+IN_CHUNK = 900
+
+
+def _partial(schema: Type[BaseModel], exclude=()) -> Type[BaseModel]:
+    """`schema` with every field optional, for PATCH-style updates.
+
+    Fields keep their types, so an explicit null is only accepted where
+    `schema` allows None; any other field is an error.
+    """
+    fields = {
+        name: (f.annotation, None)
+        for name, f in schema.model_fields.items()
+        if name not in exclude
+    }
+    return create_model(f"{schema.__name__}Patch", __config__=ConfigDict(extra="forbid"), id=(int, ...), **fields)
+
+
+@dataclass
+class BulkEntity:
+    model: type
+    create_schema: Type[BaseModel]
+    update_schema: Type[BaseModel]
+    # column -> referenced model, checked for existence
+    references: Dict[str, type] = field(default_factory=dict)
+    # column -> ID series used when the row leaves it empty (sequences.py)
+    generated: Dict[str, str] = field(default_factory=dict)
+    unique: Tuple[str, ...] = ()
+
+
+ENTITIES: Dict[str, BulkEntity] = {
+    "items": BulkEntity(models.Item, schemas.ItemCreate, _partial(schemas.ItemBase)),
+    "tenders": BulkEntity(
+        models.Tender, schemas.TenderCreate, _partial(schemas.TenderCreate),
+        references={"client_id": models.User},
+        generated={"tender_id": "tender"},
+        unique=("tender_id",),
+    ),
+    "proposals": BulkEntity(
+        models.Proposal, schemas.ProposalCreate,
+        _partial(schemas.ProposalUpdate),
+        references={"tender_id": models.Tender, "vendor_id": models.User},
+    ),
+    "milestones": BulkEntity(
+        models.Milestone, schemas.MilestoneCreate, _partial(schemas.MilestoneBase, exclude=("tender_id",)),
+        references={"tender_id": models.Tender},
+    ),
+    "payments": BulkEntity(
+        models.Payment, schemas.PaymentCreate, _partial(schemas.PaymentBase, exclude=("invoice_id",)),
+        references={"invoice_id": models.Invoice},
+        generated={"transaction_id": "transaction"},
+    ),
+}
+
+
+class BulkEntityName(str, enum.Enum):
+    ITEMS = "items"
+    TENDERS = "tenders"
+    PROPOSALS = "proposals"
+    MILESTONES = "milestones"
+    PAYMENTS = "payments"
+
+
+def _chunks(values: list):
+    for i in range(0, len(values), IN_CHUNK):
+        yield values[i:i + IN_CHUNK]
+
+
+def existing_values(db: Session, column, values) -> set:
+    found = set()
+    for chunk in _chunks(sorted(set(v for v in values if v is not None))):
+        found.update(v for (v,) in db.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def _validate(rows: List[dict], schema, partial: bool) -> Tuple[List[Tuple[int, dict]], Dict[int, list]]:
+    valid, errors = [], {}
+    for index, raw in enumerate(rows):
+        try:
+            valid.append((index, schema.model_validate(raw).model_dump(exclude_unset=partial)))
+        except ValidationError as e:
+            errors[index] = [
+                {"loc": list(err["loc"]), "msg": err["msg"]}
+                for err in e.errors(include_url=False, include_context=False)
+            ]
+    return valid, errors
+
+
+def _check_references(db: Session, spec: BulkEntity, valid, errors):
+    for column, target in spec.references.items():
+        wanted = [data.get(column) for _, data in valid]
+        found = existing_values(db, target.id, wanted)
+        for index, data in valid:
+            if data.get(column) is not None and data[column] not in found:
+                errors.setdefault(index, []).append(
+                    {"loc": [column], "msg": f"{target.__tablename__} {data[column]} does not exist"}
+                )
+
+
+def _holders(db: Session, column, id_column, values) -> dict:
+    """value -> id of the row holding it, for the `values` in use."""
+    held = {}
+    for chunk in _chunks(sorted(set(v for v in values if v is not None))):
+        held.update(db.query(column, id_column).filter(column.in_(chunk)))
+    return held
+
+
+def _check_unique(db: Session, spec: BulkEntity, valid, errors):
+    for column in spec.unique:
+        taken = _holders(db, getattr(spec.model, column), spec.model.id, [d.get(column) for _, d in valid])
+        seen = set()
+        for index, data in valid:
+            value = data.get(column)
+            if value is None:
+                continue
+            # An update may keep its own value
+            if taken.get(value, data.get("id")) != data.get("id") or value in seen:
+                errors.setdefault(index, []).append({"loc": [column], "msg": f"{value} is already used"})
+            seen.add(value)
+
+
+def _reject_if_atomic(errors: Dict[int, list], atomic: bool):
+    if errors and atomic:
+        raise HTTPException(status_code=422, detail=_error_list(errors))
+
+
+def _error_list(errors: Dict[int, list]) -> list:
+    return [{"index": i, "errors": errors[i]} for i in sorted(errors)]
+
+
+def _bookkeeping(db: Session, model, params: List[dict]):
+    """Stamp change tracking columns into `params` before they are written,
+    and queue a resync push for after the commit."""
+    if issubclass(model, models.ChangeTracked):
+        seq = allocate_sequence(db.connection(), len(params))
+        now = datetime.datetime.utcnow()
+        for offset, row in enumerate(params):
+            row["change_seq"] = seq + offset
+            row["updated_at"] = now
+        pending = db.info.setdefault("pending_events", [])
+        if not any(e.get("broadcast") for e in pending):
+            pending.append({"broadcast": True, "event": RESYNC})
+    bump_versions(db.connection(), {model.__tablename__})
+
+
+def create_rows(db: Session, entity: str, rows: List[dict], atomic: bool = False) -> dict:
+    spec = ENTITIES[entity]
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per batch")
+    valid, errors = _validate(rows, spec.create_schema, partial=False)
+    _check_references(db, spec, valid, errors)
+    _check_unique(db, spec, valid, errors)
+    _reject_if_atomic(errors, atomic)
+
+    accepted = [(index, data) for index, data in valid if index not in errors]
+    params = []
+    for _, data in accepted:
+        for column, series in spec.generated.items():
+            if not data.get(column):
+                data[column] = next_id(series)
+        params.append(data)
+
+    ids = []
+    if params:
+        _bookkeeping(db, spec.model, params)
+        result = db.execute(
+            insert(spec.model).returning(spec.model.id, sort_by_parameter_order=True), params
+        )
+        ids = [row.id for row in result]
+        if spec.model is models.Payment:
+            # Same rule as POST /payments/: the paid invoice becomes Partial
+            invoices = [{"id": i, "status": "Partial"} for i in sorted({p["invoice_id"] for p in params})]
+            _bookkeeping(db, models.Invoice, invoices)
+            db.execute(update(models.Invoice), invoices)
+        db.commit()
+    return {
+        "created": len(ids),
+        "results": [{"index": index, "id": id_} for (index, _), id_ in zip(accepted, ids)],
+        "errors": _error_list(errors),
+    }
+
+
+def update_rows(db: Session, entity: str, rows: List[dict], atomic: bool = False) -> dict:
+    spec = ENTITIES[entity]
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ROWS} rows per batch")
+    valid, errors = _validate(rows, spec.update_schema, partial=True)
+    found = existing_values(db, spec.model.id, [data["id"] for _, data in valid])
+    seen = set()
+    for index, data in valid:
+        if data["id"] not in found:
+            errors.setdefault(index, []).append({"loc": ["id"], "msg": f"{entity} {data['id']} does not exist"})
+        elif data["id"] in seen:
+            errors.setdefault(index, []).append({"loc": ["id"], "msg": "id appears twice in the batch"})
+        seen.add(data["id"])
+        for column in spec.generated:
+            # Allocated on create; an update cannot empty it
+            if column in data and data[column] is None:
+                errors.setdefault(index, []).append({"loc": [column], "msg": "cannot be null"})
+    _check_references(db, spec, valid, errors)
+    _check_unique(db, spec, valid, errors)
+    _reject_if_atomic(errors, atomic)
+
+    params = [data for index, data in valid if index not in errors and len(data) > 1]
+    if params:
+        _bookkeeping(db, spec.model, params)
+        db.execute(update(spec.model), params)
+        db.commit()
+    return {
+        "updated": len(params),
+        "errors": _error_list(errors),
+    }
@@ -0,0 +1,143 @@
+"""Delta sync: change sequence stamping and the `/changes` feed.
+
+Every flush that inserts or updates a change-tracked row (models.ChangeTracked)
+stamps it with `updated_at` and the next value of a database-wide sequence;
+deleting one leaves a Tombstone carrying its own sequence value. A client
+keeps a local copy current by asking for everything after the last
+sequence it has seen.
+
+The counter row is updated before it is read, so the allocating
+transaction holds the write lock until it commits. Sequence values
+therefore become visible in increasing order and a client cannot skip a
+change committed late.
+
+The feed only carries the rows the caller may read (see visibility.py).
+A deleted row's owner is gone with it, so tombstones are filtered by
+entity only: they hold nothing but the entity name and id, and a client
+drops the ids it does not have.
+"""
+import datetime
+import heapq
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .auth import Principal
+from .fast_json import row_dicts, schema_columns
+from .visibility import NOTHING, visible_clause
+
+# entity name (= table name) -> (model, schema whose fields are returned)
+TRACKED: Dict[str, Tuple[type, type]] = {
+    "tenders": (models.Tender, schemas.TenderSchema),
+    "proposals": (models.Proposal, schemas.ProposalSchema),
+    "contracts": (models.Contract, schemas.ContractSchema),
+    "purchase_orders": (models.PurchaseOrder, schemas.POSchema),
+    "invoices": (models.Invoice, schemas.InvoiceSchema),
+    "payments": (models.Payment, schemas.PaymentSchema),
+    "milestones": (models.Milestone, schemas.MilestoneSchema),
+    "approval_workflows": (models.ApprovalWorkflow, schemas.WorkflowSchema),
+}
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+SEQUENCE_TABLE = models.ChangeSequence.__tablename__
+
+
+def allocate_sequence(connection, count: int) -> int:
+    """Reserve `count` consecutive sequence values; return the first."""
+    bumped = connection.execute(
+        text(f"UPDATE {SEQUENCE_TABLE} SET value = value + :n WHERE id = 1"), {"n": count}
+    )
+    if bumped.rowcount == 0:
+        connection.execute(text(f"INSERT INTO {SEQUENCE_TABLE} (id, value) VALUES (1, :n)"), {"n": count})
+    last = connection.execute(text(f"SELECT value FROM {SEQUENCE_TABLE} WHERE id = 1")).scalar()
+    return last - count + 1
+
+
+def current_sequence(db: Session) -> int:
+    return db.query(models.ChangeSequence.value).filter(models.ChangeSequence.id == 1).scalar() or 0
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_changes(session, flush_context, instances):
+    written = [
+        obj for obj in session.new
+        if isinstance(obj, models.ChangeTracked)
+    ] + [
+        obj for obj in session.dirty
+        if isinstance(obj, models.ChangeTracked) and session.is_modified(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, models.ChangeTracked)]
+    if not written and not deleted:
+        return
+    seq = allocate_sequence(session.connection(), len(written) + len(deleted))
+    now = datetime.datetime.utcnow()
+    for obj in written:
+        obj.change_seq = seq
+        obj.updated_at = now
+        seq += 1
+    for obj in deleted:
+        session.add(models.Tombstone(
+            entity=obj.__tablename__, entity_id=obj.id, change_seq=seq, deleted_at=now,
+        ))
+        seq += 1
+
+
+def changes_since(db: Session, since: int, limit: int, user: Optional[Principal] = None) -> dict:
+    """Rows and tombstones with change_seq > `since` that `user` may read,
+    oldest first.
+
+    At most `limit` entries are returned. `next` is the sequence to pass as
+    `since` on the following call; `more` says whether to call again now.
+    """
+    candidates = []
+    readable = []
+    for entity, (model, schema) in TRACKED.items():
+        clause = visible_clause(model, user)
+        if clause is NOTHING:
+            continue
+        readable.append(entity)
+        names, columns, converters = schema_columns(schema, model)
+        query = db.query(model).with_entities(model.change_seq, model.updated_at, *columns)
+        if clause is not None:
+            query = query.filter(clause)
+        rows = (
+            query
+            .filter(model.change_seq > since)
+            .order_by(model.change_seq)
+            .limit(limit + 1)
+            .all()
+        )
+        for row in row_dicts(["change_seq", "updated_at", *names], [None, None, *converters], rows):
+            candidates.append((row["change_seq"], entity, row))
+    tombstones = (
+        db.query(models.Tombstone)
+        .filter(models.Tombstone.change_seq > since, models.Tombstone.entity.in_(readable))
+        .order_by(models.Tombstone.change_seq)
+        .limit(limit + 1)
+        .all()
+    )
+    for t in tombstones:
+        candidates.append((t.change_seq, None, {"entity": t.entity, "id": t.entity_id, "change_seq": t.change_seq}))
+
+    # Each source is capped at limit + 1, so if more than `limit` entries
+    # came back the lowest `limit` of them are exactly the next ones.
+    selected = heapq.nsmallest(limit, candidates, key=lambda c: c[0])
+    changes = {entity: [] for entity in TRACKED}
+    deleted = []
+    for _, entity, row in selected:
+        if entity is None:
+            deleted.append(row)
+        else:
+            changes[entity].append(row)
+    more = len(candidates) > limit
+    return {
+        "since": since,
+        "next": selected[-1][0] if selected else max(since, current_sequence(db)),
+        "more": more,
+        "changes": changes,
+        "deleted": deleted,
+    }
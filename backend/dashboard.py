@@ -0,0 +1,149 @@
+"""Dashboard counters computed with SQL aggregates.
+
+Each role's landing page needs a handful of counts and sums. Computing them
+with COUNT/SUM ... GROUP BY keeps the cost independent of table size, where
+the desktop client previously downloaded whole tables to count them.
+"""
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+RECENT_PAYMENTS = 10
+
+
+def _by_status(db: Session, status_column, *filters, total_column=None) -> dict:
+    """Return {status: count} (or {status: {"count", "total"}} when
+    `total_column` is given) for the rows matching `filters`."""
+    columns = [status_column, func.count()]
+    if total_column is not None:
+        columns.append(func.coalesce(func.sum(total_column), 0.0))
+    rows = db.query(*columns).filter(*filters).group_by(status_column).all()
+    result = {}
+    for row in rows:
+        status = row[0].value if hasattr(row[0], "value") else row[0]
+        if total_column is None:
+            result[status] = row[1]
+        else:
+            result[status] = {"count": row[1], "total": row[2]}
+    return result
+
+
+def _count(groups: dict, exclude=(), only=None) -> int:
+    return sum(
+        v["count"] if isinstance(v, dict) else v
+        for k, v in groups.items()
+        if k not in exclude and (only is None or k in only)
+    )
+
+
+def _total(groups: dict, exclude=(), only=None) -> float:
+    return sum(
+        v["total"] for k, v in groups.items()
+        if k not in exclude and (only is None or k in only)
+    )
+
+
+def admin_summary(db: Session) -> dict:
+    tenders = _by_status(db, models.Tender.status)
+    payments = _by_status(db, models.Payment.status, total_column=models.Payment.amount_paid)
+    return {
+        "total_users": db.query(func.count(models.User.id)).scalar(),
+        "total_tenders": _count(tenders),
+        "tenders_by_status": tenders,
+        "verified_revenue": _total(payments, only={"Verified"}),
+    }
+
+
+def finance_summary(db: Session) -> dict:
+    invoices = _by_status(db, models.Invoice.status, total_column=models.Invoice.total_payable)
+    payments = _by_status(db, models.Payment.status, total_column=models.Payment.amount_paid)
+    recent = (
+        db.query(models.Payment)
+        .order_by(models.Payment.id.desc())
+        .limit(RECENT_PAYMENTS)
+        .all()
+    )
+    return {
+        "pending_invoices": _count(invoices, exclude={"Paid"}),
+        "outstanding_balance": _total(invoices, exclude={"Paid"}),
+        "payments_received": _total(payments, only={"Verified"}),
+        "invoices_by_status": invoices,
+        "payments_by_status": payments,
+        "recent_payments": [
+            {
+                "id": p.id,
+                "invoice_id": p.invoice_id,
+                "amount_paid": p.amount_paid,
+                "status": p.status,
+                "payment_date": p.payment_date,
+            }
+            for p in recent
+        ],
+    }
+
+
+def technical_summary(db: Session) -> dict:
+    tenders = _by_status(db, models.Tender.status)
+    scored_count, avg_score = db.query(
+        func.count(models.Proposal.id), func.avg(models.Proposal.technical_score)
+    ).filter(models.Proposal.technical_score > 0).one()
+    return {
+        "pending_evaluation": _count(tenders, only={models.TenderStatus.OPEN.value, models.TenderStatus.SUBMITTED.value}),
+        "completed_evaluations": scored_count,
+        "average_technical_score": avg_score or 0.0,
+        "tenders_by_status": tenders,
+    }
+
+
+def vendor_summary(db: Session, vendor_id: int) -> dict:
+    proposals = _by_status(db, models.Proposal.status, models.Proposal.vendor_id == vendor_id)
+    invoices = _by_status(
+        db,
+        models.Invoice.status,
+        models.Invoice.po_id == models.PurchaseOrder.id,
+        models.PurchaseOrder.vendor_id == vendor_id,
+        total_column=models.Invoice.total_payable,
+    )
+    return {
+        "total_bids": _count(proposals),
+        "approved_bids": _count(proposals, only={"Approved"}),
+        "pending_bids": _count(proposals, exclude={"Approved", "Rejected"}),
+        "pending_invoices": _count(invoices, exclude={"Paid"}),
+        "proposals_by_status": proposals,
+    }
+
+
+def client_summary(db: Session, client_id: int) -> dict:
+    tenders = _by_status(db, models.Tender.status, models.Tender.client_id == client_id)
+    invoices = _by_status(
+        db,
+        models.Invoice.status,
+        models.Invoice.po_id == models.PurchaseOrder.id,
+        models.PurchaseOrder.tender_id == models.Tender.id,
+        models.Tender.client_id == client_id,
+        total_column=models.Invoice.total_payable,
+    )
+    return {
+        "awaiting_approval": _count(tenders, only={models.TenderStatus.SUBMITTED.value}),
+        "active_contracts": _count(tenders, only={models.TenderStatus.APPROVED.value}),
+        "pending_payments": _total(invoices, exclude={"Paid"}),
+        "tenders_by_status": tenders,
+    }
+
+
+def summary_for_role(db: Session, role: models.UserRole, user_id: Optional[int] = None) -> dict:
+    if role == models.UserRole.ADMIN:
+        return admin_summary(db)
+    if role == models.UserRole.FINANCE:
+        return finance_summary(db)
+    if role == models.UserRole.TECHNICAL:
+        return technical_summary(db)
+    if user_id is None:
+        raise HTTPException(status_code=400, detail=f"user_id is required for the {role.value} summary")
+    if role == models.UserRole.VENDOR:
+        return vendor_summary(db, user_id)
+    return client_summary(db, user_id)
@@ -1,19 +1,166 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
+import functools
+import inspect
+import os
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./tender_system.db"
+# Connection settings come from the environment so deployments can point at a
+# different file or a client/server database without editing source.
+SQLALCHEMY_DATABASE_URL = os.environ.get("TENDER_DATABASE_URL", "sqlite:///./tender_system.db")
+
+# Pool settings, used for client/server databases (SQLite keeps the default
+# per-thread pool since connections are cheap and file-local).
+POOL_SIZE = int(os.environ.get("TENDER_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("TENDER_DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.environ.get("TENDER_DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.environ.get("TENDER_DB_POOL_RECYCLE", "1800"))
+
+# SQLite tuning applied to every new connection. WAL lets readers proceed
+# while a writer commits, and synchronous=NORMAL is durable in WAL mode
+# except for the last transactions before a power loss.
+SQLITE_JOURNAL_MODE = os.environ.get("TENDER_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("TENDER_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("TENDER_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.environ.get("TENDER_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# "sync" runs each request's ORM work in the AnyIO threadpool; "async" runs it
+# through an AsyncSession so driver I/O is awaited instead of holding a
+# worker thread. Both execute the same route code, so they can be benchmarked
+# side by side by flipping TENDER_DB_MODE.
+DB_MODE = os.environ.get("TENDER_DB_MODE", "sync").lower()
+
+# Async drivers for the sync URLs we support.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url_for(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {parsed.drivername}; set TENDER_ASYNC_DATABASE_URL")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def sqlite_path(url: str = SQLALCHEMY_DATABASE_URL):
+    """Absolute path of a file-based SQLite URL, or None for anything else."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(parsed.database)
+
+
+def tune_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+
+def engine_options(url: str) -> dict:
+    if is_sqlite(url):
+        return {}
+    return {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+# Defaults to the async driver for SQLALCHEMY_DATABASE_URL (see async_url_for)
+ASYNC_DATABASE_URL = os.environ.get("TENDER_ASYNC_DATABASE_URL")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if is_sqlite(SQLALCHEMY_DATABASE_URL) else {},
+    **engine_options(SQLALCHEMY_DATABASE_URL),
 )
+if is_sqlite(SQLALCHEMY_DATABASE_URL):
+    event.listen(engine, "connect", tune_sqlite)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    """Create the async engine on first use (needs aiosqlite or asyncpg)."""
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        url = ASYNC_DATABASE_URL or async_url_for(SQLALCHEMY_DATABASE_URL)
+        async_engine = create_async_engine(url, **engine_options(url))
+        if is_sqlite(url):
+            event.listen(async_engine.sync_engine, "connect", tune_sqlite)
+        # Objects are serialized after the handler returns, outside the
+        # greenlet, so they must not expire and lazy-load on commit.
+        _async_sessionmaker = async_sessionmaker(
+            async_engine, autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker
+
+
+class DBSession:
+    """A request's database session plus a way to run ORM code on it.
+
+    `run(fn)` calls `fn(session)` with a regular ORM Session without
+    blocking the event loop: in the threadpool in sync mode, or through
+    AsyncSession.run_sync in async mode.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        if isinstance(self.session, Session):
+            return await run_in_threadpool(fn, self.session, *args, **kwargs)
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+
+async def get_db():
+    if DB_MODE == "async":
+        async with get_async_sessionmaker()() as session:
+            yield DBSession(session)
+    else:
+        db = SessionLocal()
+        try:
+            yield DBSession(db)
+        finally:
+            db.close()
+
+
+def async_route(func):
+    """Expose a route written against a plain `db: Session` as `async def`.
+
+    The handler body is unchanged; FastAPI sees a coroutine whose `db`
+    parameter is the DBSession dependency, and the body runs via
+    DBSession.run with the underlying Session passed in as `db`.
+    """
+    signature = inspect.signature(func)
+    parameters = [
+        p.replace(default=Depends(get_db)) if p.name == "db" else p
+        for p in signature.parameters.values()
+    ]
+
+    @functools.wraps(func)
+    async def endpoint(*args, **kwargs):
+        runner = kwargs.pop("db")
+        return await runner.run(lambda session: func(*args, db=session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    return endpoint
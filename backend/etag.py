@@ -0,0 +1,94 @@
+"""ETag / If-None-Match support for read routes.
+
+Every flush that writes ORM objects bumps a counter per touched table in
+`table_versions`, inside the same transaction. A route's ETag hashes the
+counters of the tables it reads together with the request path, query
+string, Accept and Authorization headers (responses are scoped to the
+caller), so computing it is one primary-key lookup. When
+the client's If-None-Match still matches, the route body never runs and
+the client gets an empty 304.
+
+Writes that bypass the ORM unit of work (Core `insert`/`update`) must call
+`bump_versions` themselves.
+"""
+import hashlib
+from typing import Iterable
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import DBSession, get_db
+
+VERSION_TABLE = models.TableVersion.__tablename__
+
+_BUMP = text(
+    f"INSERT INTO {VERSION_TABLE} (table_name, version) VALUES (:t, 1) "
+    f"ON CONFLICT (table_name) DO UPDATE SET version = {VERSION_TABLE}.version + 1"
+)
+
+
+def bump_versions(connection, tables: Iterable[str]):
+    for table in sorted(set(tables) - {VERSION_TABLE}):
+        connection.execute(_BUMP, {"t": table})
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed_tables(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+def table_versions(db: Session, tables: Iterable[str]) -> dict:
+    rows = db.query(models.TableVersion).filter(models.TableVersion.table_name.in_(list(tables))).all()
+    return {row.table_name: row.version for row in rows}
+
+
+def compute_etag(request: Request, versions: dict) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for table in sorted(versions):
+        digest.update(f"{table}={versions[table]};".encode())
+    digest.update(request.url.path.encode())
+    digest.update(b"?" + request.url.query.encode())
+    digest.update(request.headers.get("accept", "").encode())
+    digest.update(request.headers.get("authorization", "").encode())
+    # Weak: the gzip / brotli / identity bodies are equivalent, not identical
+    return f'W/"{digest.hexdigest()}"'
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any(
+        (tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == opaque
+        for tag in header.split(",")
+    )
+
+
+def conditional(*tables: str):
+    """Dependency answering 304 when `tables` are unchanged since the
+    client's If-None-Match, and otherwise setting the ETag header.
+
+        @app.get("/tenders/", dependencies=[Depends(conditional("tenders"))])
+    """
+    async def check(request: Request, response: Response, db: DBSession = Depends(get_db)) -> str:
+        versions = await db.run(table_versions, tables)
+        etag = compute_etag(request, {t: versions.get(t, 0) for t in tables})
+        if if_none_match(request, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return etag
+
+    return check
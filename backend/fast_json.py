@@ -0,0 +1,164 @@
+"""Fast JSON path for read-only list endpoints.
+
+With `response_model=List[Schema]` FastAPI builds an ORM object per row,
+validates it into a Pydantic model and serializes that model again. For
+plain column data all of that is overhead: `paginate_json` selects just
+the schema's columns as tuples and hands them straight to a fast encoder
+(orjson when installed, the stdlib json module otherwise). The route keeps
+its `response_model` for the OpenAPI docs; returning a Response bypasses it.
+
+Clients that send `Accept: application/msgpack` get the same rows as
+MessagePack when the `msgpack` package is installed.
+
+`python -m backend.bench_serialization` compares both paths.
+"""
+import datetime
+import functools
+import json
+import typing
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import Response
+from sqlalchemy import null
+
+from .pagination import NEXT_CURSOR_HEADER, Page, decode_cursor, encode_cursor
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional compact representation
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def loads(data: bytes):
+    """Parse JSON; raises ValueError on invalid input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def packb(obj) -> bytes:
+    # Datetimes go out as the same ISO strings the JSON representation uses
+    return msgpack.packb(obj, default=_default)
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    if msgpack is None or not accept:
+        return False
+    for part in accept.split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip().lower() in MSGPACK_MEDIA_TYPES:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class FastJSONResponse(Response):
+    """JSON response whose body is encoded by `dumps`."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+def _allows_none(field) -> bool:
+    return type(None) in typing.get_args(field.annotation)
+
+
+def _to_date(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+@functools.lru_cache(maxsize=None)
+def schema_columns(schema, model) -> Tuple[List[str], list, List[Optional[Callable]]]:
+    """Map `schema`'s fields onto `model`'s columns.
+
+    Returns (field names, columns, per-field converters). A converter is
+    only needed where the schema narrows the column type, e.g. a `date`
+    field backed by a DateTime column. Optional fields without a column
+    (e.g. MilestoneSchema.completion_date) are selected as NULL.
+    """
+    table = model.__table__
+    names, columns, converters = [], [], []
+    for name, field in schema.model_fields.items():
+        if name in table.c:
+            columns.append(getattr(model, name))
+        elif not field.is_required() or _allows_none(field):
+            columns.append(null().label(name))
+        else:
+            raise ValueError(f"{schema.__name__}.{name} has no column on {table.name}")
+        names.append(name)
+        converters.append(_to_date if field.annotation is datetime.date else None)
+    return names, columns, converters
+
+
+def row_dicts(names, converters, rows) -> List[dict]:
+    if any(converters):
+        rows = [
+            [conv(v) if conv else v for conv, v in zip(converters, row)]
+            for row in rows
+        ]
+    return [dict(zip(names, row)) for row in rows]
+
+
+def encode_rows(names, converters, rows) -> bytes:
+    return dumps(row_dicts(names, converters, rows))
+
+
+def paginate_json(query, key_column, page: Page, response: Response, schema) -> Response:
+    """Keyset pagination on `key_column` (a unique, indexed column),
+    returning the encoded page directly.
+
+    Rows come in ascending key order. One extra row is fetched to find
+    out whether another page exists; if so its cursor is sent back in the
+    `X-Next-Cursor` header so the body stays a plain list.
+
+    `query` may carry filters and joins; only `schema`'s columns of the
+    key column's model are selected. Headers already set on the route's
+    `response` (e.g. ETag) are carried over.
+    """
+    names, columns, converters = schema_columns(schema, key_column.class_)
+    if page.after:
+        query = query.filter(key_column > decode_cursor(page.after))
+    stmt = query.with_entities(*columns).order_by(key_column.asc()).limit(page.limit + 1).statement
+    rows = query.session.execute(stmt).all()
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor(rows[-1][names.index(key_column.key)])
+    return list_response(names, converters, rows, page, response, next_cursor)
+
+
+def list_response(names, converters, rows, page: Page, response: Response, next_cursor: Optional[str]) -> Response:
+    """Encode one page of `rows` as JSON or MessagePack (per Accept),
+    carrying over headers already set on the route's `response`."""
+    # The representation depends on Accept, so caches must key on it
+    headers = {
+        k: v for k, v in response.headers.items()
+        if k not in ("content-length", "content-type")
+    }
+    headers["Vary"] = "Accept"
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if wants_msgpack(page.accept):
+        body = packb(row_dicts(names, converters, rows))
+        return Response(body, media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return FastJSONResponse(encode_rows(names, converters, rows), headers=headers)
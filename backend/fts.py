@@ -0,0 +1,118 @@
+"""SQLite FTS5 indexes kept in sync with ordinary tables.
+
+An index is an external-content FTS5 table: it stores only the inverted
+index and reads column values from the source table by rowid (the
+integer `id`). Insert / update / delete triggers on the source table keep
+it current inside the writing transaction, including for Core
+executemany inserts that bypass the ORM.
+
+FTS5 is compiled into the SQLite shipped with CPython, but not
+guaranteed; callers fall back to LIKE when `has_index` is False.
+"""
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import false, or_, text
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Tables confirmed to exist, per database URL (they are never dropped)
+_known = set()
+
+
+def fts5_available(conn) -> bool:
+    if conn.dialect.name != "sqlite":
+        return False
+    try:
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.exec_driver_sql("DROP TABLE temp.fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def create_index(conn, fts_table: str, source: str, columns: Iterable[str], prefix: str = "2 3"):
+    """Create `fts_table` over `source(columns)` with its triggers, and
+    index the rows already there. Idempotent."""
+    columns = list(columns)
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,)
+    ).first()
+    if exists:
+        return
+    conn.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5({', '.join(columns)}, content='{source}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='{prefix}')"
+    )
+    create_triggers(conn, fts_table, source, columns)
+    conn.exec_driver_sql(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+
+def create_triggers(conn, fts_table: str, source: str, columns: Iterable[str]):
+    """(Re)create the triggers syncing `fts_table`, e.g. after `source`
+    was rebuilt, which drops them."""
+    columns = list(columns)
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts_table} (rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts_table} ({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {fts_table} ({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts_table} (rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+
+
+def has_index(db, fts_table: str) -> bool:
+    bind = db.get_bind()
+    key = (str(bind.url), fts_table)
+    if key in _known:
+        return True
+    found = db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :t"), {"t": fts_table}
+    ).first() if bind.dialect.name == "sqlite" else None
+    if found:
+        _known.add(key)
+    return bool(found)
+
+
+def match_expression(query: str) -> Optional[str]:
+    """An FTS5 MATCH expression for free text typed by a user.
+
+    Every word must match, the last one as a prefix (search-as-you-type).
+    Words are quoted, so FTS5 operators in the input are taken literally.
+    None when the text has no words.
+    """
+    words = _TOKEN.findall(query)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def like_pattern(query: str) -> str:
+    """A LIKE pattern for the fallback path, escaping wildcards with '\\'."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def filter_matches(db, query, fts_table: str, id_column, columns: Iterable[str], q: str):
+    """Restrict an ORM `query` to rows of `id_column`'s model matching `q`,
+    through `fts_table` or, without it, LIKE on `columns`."""
+    expr = match_expression(q)
+    if expr is None:
+        return query.filter(false())
+    if has_index(db, fts_table):
+        matches = text(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH :fts_q")
+        return query.filter(id_column.in_(matches.bindparams(fts_q=expr)))
+    pattern = like_pattern(q)
+    model = id_column.class_
+    return query.filter(or_(*(getattr(model, c).like(pattern, escape="\\") for c in columns)))
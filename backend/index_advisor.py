@@ -0,0 +1,136 @@
+"""Report full table scans in the queries behind the API routes.
+
+Runs SQLite's EXPLAIN QUERY PLAN on a representative query for each list /
+lookup route and flags plans that scan a whole table. Sorts through a
+temporary B-tree are listed as notes: they are cheap once an index has
+narrowed the rows. Run it against a live database after schema changes
+(and ANALYZE, so the planner has statistics):
+
+    python -m backend.index_advisor
+"""
+import sys
+from typing import Callable, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .audit_query import AuditFilter, apply_filter
+from .lookup import prefix_range
+from .database import SessionLocal
+
+# Sample values stand in for request parameters; only the plan matters.
+SAMPLE_ID = 1
+
+
+def _audit(db: Session, f: AuditFilter):
+    log = models.AuditLog
+    return (apply_filter(db, db.query(log), log, f)
+            .order_by(log.timestamp.desc(), log.id.desc()).limit(100))
+
+ROUTE_QUERIES: List[Tuple[str, Callable[[Session], object]]] = [
+    ("GET /users/?role=", lambda db: db.query(models.User)
+        .filter(models.User.role == models.UserRole.VENDOR, models.User.id > SAMPLE_ID)
+        .order_by(models.User.id)),
+    ("GET /tenders/?client_id=", lambda db: db.query(models.Tender)
+        .filter(models.Tender.client_id == SAMPLE_ID, models.Tender.id > SAMPLE_ID)
+        .order_by(models.Tender.id)),
+    ("GET /tenders/?status=", lambda db: db.query(models.Tender)
+        .filter(models.Tender.status == models.TenderStatus.UNDER_REVIEW)
+        .order_by(models.Tender.id)),
+    ("GET /tenders/{id}", lambda db: db.query(models.Tender)
+        .filter(models.Tender.id == SAMPLE_ID)),
+    ("open tenders by deadline", lambda db: db.query(models.Tender)
+        .filter(models.Tender.status == models.TenderStatus.OPEN)
+        .order_by(models.Tender.deadline)),
+    ("GET /proposals/?tender_id=", lambda db: db.query(models.Proposal)
+        .filter(models.Proposal.tender_id == SAMPLE_ID, models.Proposal.id > SAMPLE_ID)
+        .order_by(models.Proposal.id)),
+    ("GET /proposals/?vendor_id=", lambda db: db.query(models.Proposal)
+        .filter(models.Proposal.vendor_id == SAMPLE_ID, models.Proposal.id > SAMPLE_ID)
+        .order_by(models.Proposal.id)),
+    ("GET /proposals/?status=", lambda db: db.query(models.Proposal)
+        .filter(models.Proposal.status == "Shortlisted")
+        .order_by(models.Proposal.id)),
+    ("GET /purchase_orders/?vendor_id=", lambda db: db.query(models.PurchaseOrder)
+        .filter(models.PurchaseOrder.vendor_id == SAMPLE_ID, models.PurchaseOrder.id > SAMPLE_ID)
+        .order_by(models.PurchaseOrder.id)),
+    ("GET /invoices/?po_id=", lambda db: db.query(models.Invoice)
+        .filter(models.Invoice.po_id == SAMPLE_ID)
+        .order_by(models.Invoice.id)),
+    ("GET /invoices/?client_id=&exclude_status=Paid", lambda db: db.query(models.Invoice)
+        .join(models.PurchaseOrder, models.Invoice.po_id == models.PurchaseOrder.id)
+        .join(models.Tender, models.PurchaseOrder.tender_id == models.Tender.id)
+        .filter(models.Tender.client_id == SAMPLE_ID, models.Invoice.status != "Paid")
+        .order_by(models.Invoice.id)),
+    ("GET /payments/?invoice_id=", lambda db: db.query(models.Payment)
+        .filter(models.Payment.invoice_id == SAMPLE_ID)
+        .order_by(models.Payment.id)),
+    ("GET /tenders/{id}/milestones", lambda db: db.query(models.Milestone)
+        .filter(models.Milestone.tender_id == SAMPLE_ID)),
+    ("GET /workflows/{entity_type}/{entity_id}", lambda db: db.query(models.ApprovalWorkflow)
+        .filter(models.ApprovalWorkflow.entity_type == "Proposal",
+                models.ApprovalWorkflow.entity_id == SAMPLE_ID)),
+    ("GET /audit_logs/", lambda db: db.query(models.AuditLog)
+        .order_by(models.AuditLog.timestamp.desc(), models.AuditLog.id.desc()).limit(100)),
+    ("GET /audit_logs/?user_id=", lambda db: _audit(db, AuditFilter(user_id=SAMPLE_ID))),
+    ("GET /audit_logs/?entity_type=&entity_id=", lambda db: _audit(db, AuditFilter(entity_type="tenders",
+                                                                                entity_id=SAMPLE_ID))),
+    ("GET /lookup/tenders?q=", lambda db: db.query(models.Tender.id, models.Tender.title)
+        .filter(prefix_range(models.Tender.tender_id, "T-10")).order_by(models.Tender.tender_id).limit(10)),
+    ("GET /lookup/vendors?q=", lambda db: db.query(models.User.id, models.User.full_name)
+        .filter(models.User.role == models.UserRole.VENDOR, prefix_range(func.lower(models.User.full_name), "ac"))
+        .order_by(func.lower(models.User.full_name)).limit(10)),
+    ("GET /lookup/purchase_orders?q=", lambda db: db.query(models.PurchaseOrder.id, models.PurchaseOrder.tender_id)
+        .filter(prefix_range(models.PurchaseOrder.po_number, "PO-0001")).order_by(models.PurchaseOrder.po_number).limit(10)),
+    ("GET /audit_logs/?action=", lambda db: _audit(db, AuditFilter(action="POST /tenders/"))),
+]
+
+
+def explain(db: Session, query) -> List[str]:
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query."""
+    compiled = query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    conn = db.connection()
+    # EXPLAIN does not open a read transaction, so a pooled connection could
+    # plan against a schema cached from before indexes were added. Reading
+    # sqlite_master makes SQLite check the schema cookie first.
+    conn.exec_driver_sql("SELECT count(*) FROM sqlite_master").fetchall()
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").fetchall()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t" walks the whole table; "SCAN t USING [COVERING] INDEX ix"
+    # walks an index in order and is bounded by LIMIT on paginated routes.
+    return detail.startswith("SCAN ") and " USING " not in detail
+
+
+def advise(db: Session):
+    """Yield (route, plan_lines, full_scans) for every route query."""
+    for route, build in ROUTE_QUERIES:
+        plan = explain(db, build(db))
+        yield route, plan, [line for line in plan if is_full_scan(line)]
+
+
+def main() -> int:
+    db = SessionLocal()
+    try:
+        flagged = 0
+        for route, plan, scans in advise(db):
+            if scans:
+                flagged += 1
+                print(f"[SCAN] {route}")
+                for line in scans:
+                    print(f"         {line}")
+            else:
+                print(f"[ok]   {route}: {'; '.join(plan)}")
+            if any("TEMP B-TREE" in line for line in plan):
+                print("         note: result is sorted in a temporary B-tree")
+        print(f"\n{flagged} of {len(ROUTE_QUERIES)} route queries need an index.")
+        return 1 if flagged else 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
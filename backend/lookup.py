@@ -0,0 +1,114 @@
+"""Typeahead lookups for the tender, vendor and purchase order pickers.
+
+GET /lookup/{entity}?q=&limit= returns at most `limit` {id, label}
+pairs, so a form no longer downloads a whole table to fill a combo box.
+Each source is an index range scan that stops after `limit` rows:
+
+- tenders: tender_id prefix (unique index), then title words through
+  the tenders FTS index (prefix-indexed, see search.py);
+- vendors: username prefix (unique index), then full name prefix
+  (case-insensitive, ix_users_full_name_lower);
+- purchase_orders: po_number prefix (unique index).
+
+Codes are matched upper-cased, and a bare number gets the series prefix
+("1004" finds T-1004), zero-padded where the series is ("12" finds
+PO-000012). An empty `q` returns the newest rows. Options are limited to
+the rows the caller may read (see visibility.py), as in the list routes.
+"""
+import enum
+from typing import Callable, List, Optional
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+from . import models
+from .auth import Principal
+from .search import SearchEntity, filter_query
+from .visibility import visible
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Digits in a PO-000001 number (sequences.SERIES["po"])
+PO_DIGITS = 6
+
+# Sorts after every other character, closing a prefix range
+_MAX_CHAR = "\U0010ffff"
+
+
+class LookupEntity(str, enum.Enum):
+    TENDERS = "tenders"
+    VENDORS = "vendors"
+    PURCHASE_ORDERS = "purchase_orders"
+
+
+def prefix_range(column, prefix: str):
+    """`column` starts with `prefix`, as a range an index can seek."""
+    return and_(column >= prefix, column < prefix + _MAX_CHAR)
+
+
+def _code_prefixes(q: str, series: str, width: int = 0) -> List[str]:
+    code = q.upper()
+    if not code[:1].isdigit():
+        return [code]
+    prefixes = [code, series + code]
+    if code.isdigit() and len(code) < width:
+        prefixes.append(series + code.zfill(width))
+    return prefixes
+
+
+def _collect(queries, limit: int, label: Callable) -> List[dict]:
+    """Run `queries` in order until `limit` distinct rows are found."""
+    options = {}
+    for query in queries:
+        for row in query.limit(limit).all():
+            options.setdefault(row.id, {"id": row.id, "label": label(row)})
+        if len(options) >= limit:
+            break
+    return list(options.values())[:limit]
+
+
+def _tenders(db: Session, q: str, limit: int, user: Optional[Principal]) -> List[dict]:
+    t = models.Tender
+    base = visible(db.query(t.id, t.tender_id, t.title), t, user)
+    if not q:
+        queries = [base.order_by(t.id.desc())]
+    else:
+        queries = [base.filter(prefix_range(t.tender_id, code)).order_by(t.tender_id) for code in _code_prefixes(q, "T-")]
+        queries.append(filter_query(db, base, SearchEntity.TENDERS, t.id, q).order_by(t.id.desc()))
+    return _collect(queries, limit, lambda r: f"{r.tender_id} - {r.title}")
+
+
+def _vendors(db: Session, q: str, limit: int, user: Optional[Principal]) -> List[dict]:
+    u = models.User
+    base = db.query(u.id, u.username, u.full_name).filter(u.role == models.UserRole.VENDOR)
+    if not q:
+        queries = [base.order_by(u.id.desc())]
+    else:
+        queries = [
+            base.filter(prefix_range(u.username, q)).order_by(u.username),
+            base.filter(prefix_range(func.lower(u.full_name), q.lower())).order_by(func.lower(u.full_name)),
+        ]
+    return _collect(queries, limit, lambda r: f"{r.full_name} ({r.username})" if r.full_name else r.username)
+
+
+def _purchase_orders(db: Session, q: str, limit: int, user: Optional[Principal]) -> List[dict]:
+    po = models.PurchaseOrder
+    base = visible(db.query(po.id, po.po_number, po.tender_id), po, user)
+    if not q:
+        queries = [base.order_by(po.id.desc())]
+    else:
+        queries = [base.filter(prefix_range(po.po_number, code)).order_by(po.po_number)
+                   for code in _code_prefixes(q, "PO-", PO_DIGITS)]
+    return _collect(queries, limit, lambda r: f"{r.po_number or f'PO-{r.id}'} - Tender {r.tender_id}")
+
+
+LOOKUPS = {
+    LookupEntity.TENDERS: _tenders,
+    LookupEntity.VENDORS: _vendors,
+    LookupEntity.PURCHASE_ORDERS: _purchase_orders,
+}
+
+
+def lookup(db: Session, entity: LookupEntity, q: str, limit: int, user: Optional[Principal] = None) -> List[dict]:
+    return LOOKUPS[entity](db, q.strip(), limit, user)
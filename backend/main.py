@@ -1,35 +1,73 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Body, Depends, HTTPException, status, UploadFile, File, Response, Request, Query, Path, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
+import anyio
 import os
-from . import models, schemas, database
-from .database import engine, get_db
-from .upgrade_db import ensure_db_schema
-
-# Create any missing tables first. Note: SQLAlchemy won't alter existing tables
-# to add columns in SQLite; we'll run a small ensure_db_schema step after
-# tables exist to add any missing columns (safe ADD COLUMN operations).
-models.Base.metadata.create_all(bind=engine)
-
-# Ensure simple DB schema fixes (add missing columns) after SQLAlchemy create_all
-try:
-    ensure_db_schema()
-except Exception as e:
-    # Print but do not stop startup; if migration fails the explicit error will
-    # still show when a query referencing the missing column runs.
-    print("DB schema ensure step failed:", e)
-
-app = FastAPI(title="Tender Procurement System API")
+from . import models, schemas
+from .database import DBSession, get_db, async_route
+from .pagination import NEXT_CURSOR_HEADER, Page, decode_cursor, encode_cursor, page_params
+from .fast_json import paginate_json
+from .etag import conditional
+from .changes import DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT, changes_since
+from .notifications import hub, encode as encode_event
+from .dashboard import summary_for_role
+from .sequences import next_id
+from .bulk import BulkEntityName, create_rows, update_rows
+from .export import FORMATS, STREAMERS, build_export
+from .startup import lifespan, STATIC_DIR
+from .compression import CompressionMiddleware
+from .audit import AuditMiddleware, writer as audit_writer
+from .audit_query import AuditFilter, audit_page
+from . import audit_archive
+from .auth import (
+    Principal, check_role_grant, connection_user, create_account, current_user, login as login_user, require_role,
+    require_staff, scoped_id,
+)
+from .uploads import (
+    abort_session, append_chunk, complete_session, object_path, session_status, start_session,
+    store_stream, stored_file, upload_chunks,
+)
+from .search import DEFAULT_LIMIT as DEFAULT_SEARCH_LIMIT, MAX_LIMIT as MAX_SEARCH_LIMIT, SearchEntity, filter_query as filter_search, search
+from .lookup import DEFAULT_LIMIT as DEFAULT_LOOKUP_LIMIT, MAX_LIMIT as MAX_LOOKUP_LIMIT, LookupEntity, lookup
+from .ranking import Criteria, criteria_params, rank_tenders
+from .thumbnails import media_type as thumbnail_media_type, thumbnail
+from .visibility import require_visible, visible, visible_row
+
+# Schema migration and other setup run in the lifespan hook (see startup.py),
+# not at import.
+# Every route resolves the caller's session token first (see auth.py).
+app = FastAPI(title="Tender Procurement System API", lifespan=lifespan, dependencies=[Depends(current_user)])
+# Audit capture sits inside compression so it sees the plain JSON body
+app.add_middleware(AuditMiddleware)
+app.add_middleware(CompressionMiddleware)
+
+
+def filter_date_range(query, column, start: Optional[datetime], end: Optional[datetime]):
+    """Restrict `query` to rows whose `column` falls in [start, end)."""
+    if start:
+        query = query.filter(column >= start)
+    if end:
+        query = query.filter(column < end)
+    return query
+
+# Write routes: staff may do everything; other roles only act on rows they
+# can read (visibility.py), and only on the fields their role owns.
+CLIENT = models.UserRole.CLIENT
+VENDOR = models.UserRole.VENDOR
+
+# What a client may change on a bid for their own tender (the approval step)
+CLIENT_PROPOSAL_FIELDS = {"status", "feedback"}
+# Inspection results are recorded by the client or staff, not the vendor
+INSPECTION_FIELDS = {"inspection_status", "quality_remarks"}
 
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 
-# Serve static files (HTML, CSS, JS)
-static_path = os.path.join(os.path.dirname(__file__), "static")
-os.makedirs(static_path, exist_ok=True)
-app.mount("/static", StaticFiles(directory=static_path), name="static")
+# Serve static files (HTML, CSS, JS). The directory is created at startup.
+static_path = STATIC_DIR
+app.mount("/static", StaticFiles(directory=static_path, check_dir=False), name="static")
 
 @app.get("/")
 async def read_root():
@@ -44,92 +82,248 @@ async def dashboard():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/dashboard/summary/{role}", dependencies=[Depends(conditional("users", "tenders", "proposals", "purchase_orders", "invoices", "payments"))])
+@async_route
+def dashboard_summary(role: models.UserRole, user_id: Optional[int] = None,
+                      user: Optional[Principal] = Depends(current_user), db: Session = Depends(get_db)):
+    """Counters for a role's landing page; vendor and client need user_id."""
+    if user is not None and not user.is_staff and role != user.role:
+        raise HTTPException(status_code=403, detail="Not allowed to read this summary")
+    return summary_for_role(db, role, scoped_id(user, role, user_id))
+
+@app.get("/changes")
+@async_route
+def get_changes(
+    since: int = Query(0, ge=0, description="Sequence from the previous call's `next`; 0 for a full sync"),
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_CHANGES_LIMIT),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    """Synced entities written, and tombstones of those deleted, after `since`,
+    limited to the rows the caller may read."""
+    return changes_since(db, since, limit, user)
+
+# A plain Starlette route: the app-wide `current_user` dependency would keep
+# a request-scoped session open for the socket's whole lifetime
+@app.websocket_route("/ws/events")
+async def events_socket(websocket: WebSocket):
+    """Push change events the user may see (see notifications.py).
+
+    The user comes from the session token (`?token=`), which is required
+    even when TENDER_REQUIRE_AUTH is off: the events carry other users'
+    rows.
+
+    Messages are JSON: {"type": "change", "entity", "op", "id", "change_seq",
+    "row"}, or {"type": "resync"} when the client fell too far behind and
+    should reload. Anything the client sends is ignored (keep-alives).
+    """
+    user = await connection_user(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    sub = hub.subscribe(user.user_id, user.role)
+
+    async def pump():
+        while True:
+            await websocket.send_text(encode_event(await sub.next_event()))
+
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(pump)
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+            tg.cancel_scope.cancel()
+    finally:
+        hub.unsubscribe(sub)
+
 @app.post("/users/", response_model=schemas.UserSchema)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, caller: Optional[Principal] = Depends(current_user),
+                      db: DBSession = Depends(get_db)):
+    check_role_grant(caller, user.role)
     # If the username already exists, return the existing user (idempotent)
-    existing = db.query(models.User).filter(models.User.username == user.username).first()
-    if existing:
-        return existing
-
-    db_user = models.User(
-        username=user.username, 
-        password=user.password, 
-        role=user.role, 
-        email=user.email,
-        full_name=user.full_name
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return await create_account(db, user, existing_ok=True)
 
-@app.get("/users/", response_model=List[schemas.UserSchema])
-def get_users(role: str = None, db: Session = Depends(get_db)):
+@app.get("/users/", response_model=List[schemas.UserSchema], dependencies=[Depends(conditional("users"))])
+@async_route
+def get_users(response: Response, role: str = None, page: Page = Depends(page_params), db: Session = Depends(get_db)):
     query = db.query(models.User)
     if role:
         query = query.filter(models.User.role == role)
-    return query.all()
+    return paginate_json(query, models.User.id, page, response, schemas.UserSchema)
 
 @app.post("/login/")
-def login(request: schemas.LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == request.username).first()
-    if not user or user.password != request.password:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    return {"id": user.id, "username": user.username, "role": user.role, "full_name": user.full_name}
+async def login(request: schemas.LoginRequest, db: DBSession = Depends(get_db)):
+    """Checks the password and returns the user with a session token."""
+    return await login_user(db, request.username, request.password)
 
 # Tender Endpoints
 @app.post("/tenders/", response_model=schemas.TenderSchema)
-def create_tender(tender: schemas.TenderCreate, db: Session = Depends(get_db)):
-    db_tender = models.Tender(**tender.dict())
+@async_route
+def create_tender(tender: schemas.TenderCreate, user: Optional[Principal] = Depends(current_user),
+                  db: Session = Depends(get_db)):
+    require_role(user, CLIENT)
+    tender_data = tender.dict()
+    tender_data['client_id'] = scoped_id(user, CLIENT, tender.client_id)
+    if not tender_data.get('tender_id'):
+        tender_data['tender_id'] = next_id("tender")
+    db_tender = models.Tender(**tender_data)
     db.add(db_tender)
     db.commit()
     db.refresh(db_tender)
     return db_tender
 
-@app.get("/tenders/", response_model=List[schemas.TenderSchema])
-def get_tenders(db: Session = Depends(get_db)):
-    return db.query(models.Tender).all()
-
-@app.get("/tenders/{tender_id}", response_model=schemas.TenderSchema)
-def get_tender(tender_id: int, db: Session = Depends(get_db)):
-    tender = db.query(models.Tender).filter(models.Tender.id == tender_id).first()
+@app.get("/tenders/", response_model=List[schemas.TenderSchema], dependencies=[Depends(conditional("tenders"))])
+@async_route
+def get_tenders(
+    response: Response,
+    client_id: Optional[int] = None,
+    status: Optional[models.TenderStatus] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    q: Optional[str] = Query(None, max_length=200, description="Words to find in the title or description"),
+    page: Page = Depends(page_params),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    client_id = scoped_id(user, models.UserRole.CLIENT, client_id)
+    query = visible(db.query(models.Tender), models.Tender, user)
+    if client_id is not None:
+        query = query.filter(models.Tender.client_id == client_id)
+    if status:
+        query = query.filter(models.Tender.status == status)
+    if q:
+        query = filter_search(db, query, SearchEntity.TENDERS, models.Tender.id, q)
+    query = filter_date_range(query, models.Tender.created_at, created_from, created_to)
+    return paginate_json(query, models.Tender.id, page, response, schemas.TenderSchema)
+
+@app.get("/tenders/{tender_id}", response_model=schemas.TenderSchema, dependencies=[Depends(conditional("tenders"))])
+@async_route
+def get_tender(tender_id: int, user: Optional[Principal] = Depends(current_user), db: Session = Depends(get_db)):
+    # Another client's tender is reported as missing, not forbidden
+    query = visible(db.query(models.Tender), models.Tender, user)
+    tender = query.filter(models.Tender.id == tender_id).first()
     if not tender:
         raise HTTPException(status_code=404, detail="Tender not found")
     return tender
 
+def _ranking_viewer(user: Optional[Principal]) -> Optional[int]:
+    """Client id whose tenders `user` may rank (None: any); vendors may not
+    see competing bids."""
+    if user is not None and user.role == models.UserRole.VENDOR:
+        raise HTTPException(status_code=403, detail="Vendors cannot view bid rankings")
+    return scoped_id(user, models.UserRole.CLIENT, None)
+
+@app.get("/tenders/{tender_id}/ranking", dependencies=[Depends(conditional("tenders", "proposals"))])
+@async_route
+def get_tender_ranking(tender_id: int, criteria: Criteria = Depends(criteria_params),
+                       user: Optional[Principal] = Depends(current_user), db: Session = Depends(get_db)):
+    """Every proposal with its scores and L1 / H1 positions, best first."""
+    client_id = _ranking_viewer(user)
+    tender = db.query(models.Tender.id, models.Tender.tender_id, models.Tender.title, models.Tender.estimated_cost,
+                      models.Tender.client_id).filter(models.Tender.id == tender_id).first()
+    if not tender:
+        raise HTTPException(status_code=404, detail="Tender not found")
+    if client_id is not None and tender.client_id != client_id:
+        raise HTTPException(status_code=403, detail="Not allowed to rank another client's tender")
+    return rank_tenders(db, [tender], criteria)[0]
+
+@app.get("/rankings", dependencies=[Depends(conditional("tenders", "proposals"))])
+@async_route
+def get_rankings(
+    response: Response,
+    status: models.TenderStatus = models.TenderStatus.UNDER_REVIEW,
+    criteria: Criteria = Depends(criteria_params),
+    page: Page = Depends(page_params),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    """Batch mode: the recommended proposals of every tender in `status`,
+    one page of tenders at a time (X-Next-Cursor)."""
+    client_id = _ranking_viewer(user)
+    t = models.Tender
+    query = db.query(t.id, t.tender_id, t.title, t.estimated_cost).filter(t.status == status)
+    if client_id is not None:
+        query = query.filter(t.client_id == client_id)
+    if page.after:
+        query = query.filter(t.id > decode_cursor(page.after))
+    tenders = query.order_by(t.id).limit(page.limit + 1).all()
+    if len(tenders) > page.limit:
+        tenders = tenders[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(tenders[-1].id)
+    return rank_tenders(db, tenders, criteria, full=False)
+
 @app.put("/tenders/{tender_id}/status")
-def update_tender_status(tender_id: int, status: models.TenderStatus, db: Session = Depends(get_db)):
-    tender = db.query(models.Tender).filter(models.Tender.id == tender_id).first()
-    if not tender: raise HTTPException(404)
+@async_route
+def update_tender_status(tender_id: int, status: models.TenderStatus, user: Optional[Principal] = Depends(current_user),
+                         db: Session = Depends(get_db)):
+    require_role(user, CLIENT)
+    tender = visible_row(db, models.Tender, tender_id, user, "Tender not found")
     tender.status = status
     db.commit()
     return {"message": "Tender status updated"}
 
 # Proposal Endpoints
 @app.post("/proposals/", response_model=schemas.ProposalSchema)
-def create_proposal(proposal: schemas.ProposalCreate, db: Session = Depends(get_db)):
+@async_route
+def create_proposal(proposal: schemas.ProposalCreate, user: Optional[Principal] = Depends(current_user),
+                    db: Session = Depends(get_db)):
+    require_role(user, VENDOR)
+    scoped_id(user, VENDOR, proposal.vendor_id)
     db_proposal = models.Proposal(**proposal.dict())
     db.add(db_proposal)
     db.commit()
     db.refresh(db_proposal)
     return db_proposal
 
-@app.get("/proposals/", response_model=List[schemas.ProposalSchema])
-def get_all_proposals(db: Session = Depends(get_db)):
-    return db.query(models.Proposal).all()
+@app.get("/proposals/", response_model=List[schemas.ProposalSchema], dependencies=[Depends(conditional("proposals", "tenders"))])
+@async_route
+def get_all_proposals(
+    response: Response,
+    tender_id: Optional[int] = None,
+    vendor_id: Optional[int] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    page: Page = Depends(page_params),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    vendor_id = scoped_id(user, models.UserRole.VENDOR, vendor_id)
+    # Clients only see bids on their own tenders
+    query = visible(db.query(models.Proposal), models.Proposal, user)
+    if tender_id is not None:
+        query = query.filter(models.Proposal.tender_id == tender_id)
+    if vendor_id is not None:
+        query = query.filter(models.Proposal.vendor_id == vendor_id)
+    if status:
+        query = query.filter(models.Proposal.status == status)
+    query = filter_date_range(query, models.Proposal.created_at, created_from, created_to)
+    return paginate_json(query, models.Proposal.id, page, response, schemas.ProposalSchema)
 
 @app.put("/proposals/{proposal_id}", response_model=schemas.ProposalSchema)
-def update_proposal(proposal_id: int, update: schemas.ProposalUpdate, db: Session = Depends(get_db)):
-    db_proposal = db.query(models.Proposal).filter(models.Proposal.id == proposal_id).first()
-    if not db_proposal: raise HTTPException(404)
-    for key, value in update.dict(exclude_unset=True).items():
+@async_route
+def update_proposal(proposal_id: int, update: schemas.ProposalUpdate, user: Optional[Principal] = Depends(current_user),
+                    db: Session = Depends(get_db)):
+    """Evaluation by staff; the tender's client may only approve or reject."""
+    # Vendors cannot score or move their own bids
+    require_role(user, CLIENT)
+    db_proposal = visible_row(db, models.Proposal, proposal_id, user, "Proposal not found")
+    changes = update.dict(exclude_unset=True)
+    if user is not None and user.role == CLIENT and not changes.keys() <= CLIENT_PROPOSAL_FIELDS:
+        raise HTTPException(status_code=403, detail="Evaluation fields are set by staff")
+    for key, value in changes.items():
         setattr(db_proposal, key, value)
     db.commit()
     db.refresh(db_proposal)
     return db_proposal
 
 # Contract Endpoints
-@app.post("/contracts/", response_model=schemas.ContractSchema)
+@app.post("/contracts/", response_model=schemas.ContractSchema, dependencies=[Depends(require_staff)])
+@async_route
 def create_contract(contract: schemas.ContractCreate, db: Session = Depends(get_db)):
     db_contract = models.Contract(**contract.dict())
     db.add(db_contract)
@@ -138,16 +332,20 @@ def create_contract(contract: schemas.ContractCreate, db: Session = Depends(get_
     return db_contract
 
 
-@app.get("/contracts/", response_model=List[schemas.ContractSchema])
-def get_contracts(db: Session = Depends(get_db)):
-    return db.query(models.Contract).all()
+@app.get("/contracts/", response_model=List[schemas.ContractSchema], dependencies=[Depends(conditional("contracts", "tenders", "purchase_orders"))])
+@async_route
+def get_contracts(response: Response, page: Page = Depends(page_params),
+                  user: Optional[Principal] = Depends(current_user), db: Session = Depends(get_db)):
+    query = visible(db.query(models.Contract), models.Contract, user)
+    return paginate_json(query, models.Contract.id, page, response, schemas.ContractSchema)
 
 
 @app.put('/contracts/{contract_id}/sign')
-def sign_contract(contract_id: int, signer: Optional[str] = None, db: Session = Depends(get_db)):
-    c = db.query(models.Contract).filter(models.Contract.id == contract_id).first()
-    if not c:
-        raise HTTPException(404, 'Contract not found')
+@async_route
+def sign_contract(contract_id: int, signer: Optional[str] = None, user: Optional[Principal] = Depends(current_user),
+                  db: Session = Depends(get_db)):
+    require_role(user, CLIENT)
+    c = visible_row(db, models.Contract, contract_id, user, 'Contract not found')
     c.status = 'Signed'
     c.signed_date = datetime.utcnow()
     db.commit()
@@ -155,12 +353,12 @@ def sign_contract(contract_id: int, signer: Optional[str] = None, db: Session =
 
 
 # Purchase Order Endpoints
-@app.post("/purchase_orders/", response_model=schemas.POSchema)
+@app.post("/purchase_orders/", response_model=schemas.POSchema, dependencies=[Depends(require_staff)])
+@async_route
 def create_po(po: schemas.POCreate, db: Session = Depends(get_db)):
     po_data = po.dict()
     if not po_data.get('po_number'):
-        import uuid
-        po_data['po_number'] = f"PO-{str(uuid.uuid4())[:8].upper()}"
+        po_data['po_number'] = next_id("po")
         
     db_po = models.PurchaseOrder(**po_data)
     db.add(db_po)
@@ -168,27 +366,51 @@ def create_po(po: schemas.POCreate, db: Session = Depends(get_db)):
     db.refresh(db_po)
     return db_po
 
-@app.get("/purchase_orders/", response_model=List[schemas.POSchema])
-def get_pos(db: Session = Depends(get_db)):
-    return db.query(models.PurchaseOrder).all()
+@app.get("/purchase_orders/", response_model=List[schemas.POSchema], dependencies=[Depends(conditional("purchase_orders", "tenders"))])
+@async_route
+def get_pos(
+    response: Response,
+    tender_id: Optional[int] = None,
+    vendor_id: Optional[int] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    page: Page = Depends(page_params),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    vendor_id = scoped_id(user, models.UserRole.VENDOR, vendor_id)
+    query = visible(db.query(models.PurchaseOrder), models.PurchaseOrder, user)
+    if tender_id is not None:
+        query = query.filter(models.PurchaseOrder.tender_id == tender_id)
+    if vendor_id is not None:
+        query = query.filter(models.PurchaseOrder.vendor_id == vendor_id)
+    if status:
+        query = query.filter(models.PurchaseOrder.status == status)
+    query = filter_date_range(query, models.PurchaseOrder.created_at, created_from, created_to)
+    return paginate_json(query, models.PurchaseOrder.id, page, response, schemas.POSchema)
 
 
 @app.put('/purchase_orders/{po_id}/acknowledge')
-def acknowledge_po(po_id: int, db: Session = Depends(get_db)):
-    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == po_id).first()
-    if not po:
-        raise HTTPException(404, 'PO not found')
+@async_route
+def acknowledge_po(po_id: int, user: Optional[Principal] = Depends(current_user), db: Session = Depends(get_db)):
+    require_role(user, VENDOR)
+    po = visible_row(db, models.PurchaseOrder, po_id, user, 'PO not found')
     po.acknowledged = 1
     db.commit()
     return {"message": "PO acknowledged", "po_id": po_id}
 
 # Invoice Endpoints
 @app.post("/invoices/", response_model=schemas.InvoiceSchema)
-def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)):
+@async_route
+def create_invoice(invoice: schemas.InvoiceCreate, user: Optional[Principal] = Depends(current_user),
+                   db: Session = Depends(get_db)):
+    # Finance, or the vendor billing its own order
+    require_role(user, VENDOR)
+    require_visible(db, models.PurchaseOrder, invoice.po_id, user, "PO not found")
     inv_data = invoice.dict()
     if not inv_data.get('invoice_number'):
-        import uuid
-        inv_data['invoice_number'] = f"INV-{str(uuid.uuid4())[:8].upper()}"
+        inv_data['invoice_number'] = next_id("invoice")
         
     db_invoice = models.Invoice(**inv_data)
     db.add(db_invoice)
@@ -197,17 +419,53 @@ def create_invoice(invoice: schemas.InvoiceCreate, db: Session = Depends(get_db)
     return db_invoice
 
 
-@app.get('/invoices/', response_model=List[schemas.InvoiceSchema])
-def list_invoices(db: Session = Depends(get_db)):
-    return db.query(models.Invoice).all()
+@app.get('/invoices/', response_model=List[schemas.InvoiceSchema], dependencies=[Depends(conditional("invoices", "purchase_orders", "tenders"))])
+@async_route
+def list_invoices(
+    response: Response,
+    po_id: Optional[int] = None,
+    vendor_id: Optional[int] = None,
+    client_id: Optional[int] = None,
+    status: Optional[str] = None,
+    exclude_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    page: Page = Depends(page_params),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    vendor_id = scoped_id(user, models.UserRole.VENDOR, vendor_id)
+    client_id = scoped_id(user, models.UserRole.CLIENT, client_id)
+    query = db.query(models.Invoice)
+    if po_id is not None:
+        query = query.filter(models.Invoice.po_id == po_id)
+    # Vendor and client live on the PO / tender; resolve them with joins
+    # instead of making the caller download every PO and tender.
+    if vendor_id is not None or client_id is not None:
+        query = query.join(models.PurchaseOrder, models.Invoice.po_id == models.PurchaseOrder.id)
+        if vendor_id is not None:
+            query = query.filter(models.PurchaseOrder.vendor_id == vendor_id)
+        if client_id is not None:
+            query = query.join(models.Tender, models.PurchaseOrder.tender_id == models.Tender.id)
+            query = query.filter(models.Tender.client_id == client_id)
+    if status:
+        query = query.filter(models.Invoice.status == status)
+    if exclude_status:
+        query = query.filter(models.Invoice.status != exclude_status)
+    query = filter_date_range(query, models.Invoice.created_at, created_from, created_to)
+    return paginate_json(query, models.Invoice.id, page, response, schemas.InvoiceSchema)
 
 # Payment Endpoints
 @app.post("/payments/", response_model=schemas.PaymentSchema)
-def create_payment(payment: schemas.PaymentCreate, db: Session = Depends(get_db)):
+@async_route
+def create_payment(payment: schemas.PaymentCreate, user: Optional[Principal] = Depends(current_user),
+                   db: Session = Depends(get_db)):
+    # Finance, or the client paying an invoice on its own tender
+    require_role(user, CLIENT)
+    require_visible(db, models.Invoice, payment.invoice_id, user, "Invoice not found")
     pay_data = payment.dict()
     if not pay_data.get('transaction_id'):
-        import uuid
-        pay_data['transaction_id'] = f"TXN-{str(uuid.uuid4())[:8].upper()}"
+        pay_data['transaction_id'] = next_id("transaction")
         
     db_payment = models.Payment(**pay_data)
     db.add(db_payment)
@@ -219,11 +477,30 @@ def create_payment(payment: schemas.PaymentCreate, db: Session = Depends(get_db)
     db.refresh(db_payment)
     return db_payment
 
-@app.get("/payments/", response_model=List[schemas.PaymentSchema])
-def get_payments(db: Session = Depends(get_db)):
-    return db.query(models.Payment).all()
-
-@app.put("/payments/{payment_id}/verify")
+@app.get("/payments/", response_model=List[schemas.PaymentSchema], dependencies=[Depends(conditional("payments", "invoices", "purchase_orders", "tenders"))])
+@async_route
+def get_payments(
+    response: Response,
+    invoice_id: Optional[int] = None,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    page: Page = Depends(page_params),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    # Clients and vendors only see payments on their own orders
+    query = visible(db.query(models.Payment), models.Payment, user)
+    if invoice_id is not None:
+        query = query.filter(models.Payment.invoice_id == invoice_id)
+    if status:
+        query = query.filter(models.Payment.status == status)
+    # Payments are dated by payment_date rather than created_at
+    query = filter_date_range(query, models.Payment.payment_date, created_from, created_to)
+    return paginate_json(query, models.Payment.id, page, response, schemas.PaymentSchema)
+
+@app.put("/payments/{payment_id}/verify", dependencies=[Depends(require_staff)])
+@async_route
 def verify_payment(payment_id: int, completion_date: Optional[datetime] = None, db: Session = Depends(get_db)):
     payment = db.query(models.Payment).filter(models.Payment.id == payment_id).first()
     if not payment: raise HTTPException(404)
@@ -237,66 +514,147 @@ def verify_payment(payment_id: int, completion_date: Optional[datetime] = None,
     db.commit()
     return {"message": "Payment verified and completed"}
 
+# Bulk Endpoints
+# Each takes a JSON array; see bulk.py for validation and per-row errors.
+@app.post("/{entity}/bulk", dependencies=[Depends(require_staff)])
+@async_route
+def bulk_create(
+    entity: BulkEntityName,
+    rows: List[dict] = Body(...),
+    atomic: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Create many items, tenders, proposals, milestones or payments at once."""
+    return create_rows(db, entity.value, rows, atomic)
+
+@app.patch("/{entity}/bulk", dependencies=[Depends(require_staff)])
+@async_route
+def bulk_update(
+    entity: BulkEntityName,
+    rows: List[dict] = Body(...),
+    atomic: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Update many rows at once; each row needs its `id` plus the fields to change."""
+    return update_rows(db, entity.value, rows, atomic)
+
+# Export Endpoints
+@app.get("/export/{entity}")
+def export_rows(
+    entity: str,
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    user: Optional[Principal] = Depends(current_user),
+):
+    """Stream every matching tender, invoice or payment the caller may read
+    as NDJSON or CSV."""
+    names, stmt = build_export(entity, status, created_from, created_to, user)
+    return StreamingResponse(
+        STREAMERS[fmt](names, stmt),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{entity}.{fmt}"'},
+    )
+
 # Milestone Endpoints
 @app.post("/milestones/", response_model=schemas.MilestoneSchema)
-def create_milestone(milestone: schemas.MilestoneCreate, db: Session = Depends(get_db)):
+@async_route
+def create_milestone(milestone: schemas.MilestoneCreate, user: Optional[Principal] = Depends(current_user),
+                     db: Session = Depends(get_db)):
+    require_role(user, CLIENT)
+    require_visible(db, models.Tender, milestone.tender_id, user, "Tender not found")
     db_milestone = models.Milestone(**milestone.dict())
     db.add(db_milestone)
     db.commit()
     db.refresh(db_milestone)
     return db_milestone
 
-@app.get("/tenders/{tender_id}/milestones", response_model=List[schemas.MilestoneSchema])
-def get_milestones(tender_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Milestone).filter(models.Milestone.tender_id == tender_id).all()
+@app.get("/tenders/{tender_id}/milestones", response_model=List[schemas.MilestoneSchema], dependencies=[Depends(conditional("milestones", "tenders", "purchase_orders"))])
+@async_route
+def get_milestones(tender_id: int, user: Optional[Principal] = Depends(current_user), db: Session = Depends(get_db)):
+    query = db.query(models.Milestone).filter(models.Milestone.tender_id == tender_id)
+    return visible(query, models.Milestone, user).all()
 
 
 @app.put("/milestones/{milestone_id}", response_model=schemas.MilestoneSchema)
-def update_milestone(milestone_id: int, update: schemas.MilestoneCreate, db: Session = Depends(get_db)):
-    m = db.query(models.Milestone).filter(models.Milestone.id == milestone_id).first()
-    if not m:
-        raise HTTPException(404, "Milestone not found")
-    for k, v in update.dict(exclude_unset=True).items():
+@async_route
+def update_milestone(milestone_id: int, update: schemas.MilestoneUpdate, user: Optional[Principal] = Depends(current_user),
+                     db: Session = Depends(get_db)):
+    """Vendors holding an order on the tender report delivery; the client
+    and staff record the inspection."""
+    m = visible_row(db, models.Milestone, milestone_id, user, "Milestone not found")
+    changes = update.dict(exclude_unset=True)
+    if user is not None and user.role == VENDOR and changes.keys() & INSPECTION_FIELDS:
+        raise HTTPException(status_code=403, detail="Inspection results are recorded by the client")
+    for k, v in changes.items():
         setattr(m, k, v)
     db.commit()
     db.refresh(m)
     return m
 
 
-import shutil
-
 @app.post('/upload/')
-def upload_file(file: UploadFile = File(...)):
-    """Uploads file to backend/static/uploads/ and returns relative URL."""
-    static_dir = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-    os.makedirs(static_dir, exist_ok=True)
-    
-    file_path = os.path.join(static_dir, file.filename)
-    with open(file_path, "wb+") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    return {"url": f"/static/uploads/{file.filename}"}
-
-@app.post("/register/", response_model=schemas.UserSchema)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    new_user = models.User(
-        username=user.username,
-        password=user.password, # In real app, hash this!
-        role=user.role,
-        email=user.email,
-        full_name=user.full_name,
-        profile_image=user.profile_image
+async def upload_file(file: UploadFile = File(...), db: DBSession = Depends(get_db)):
+    """Stores `file` in the content-addressed upload store and returns its URL."""
+    return await store_stream(db, upload_chunks(file), file.filename, file.content_type)
+
+@app.post('/uploads/')
+async def start_upload(upload: schemas.UploadStart, db: DBSession = Depends(get_db)):
+    """Opens a resumable upload of `size` bytes (see uploads.py)."""
+    return await start_session(db, upload.filename, upload.content_type, upload.size)
+
+@app.get('/uploads/{upload_id}')
+async def get_upload(upload_id: str, db: DBSession = Depends(get_db)):
+    return await session_status(db, upload_id)
+
+@app.put('/uploads/{upload_id}')
+async def put_upload_chunk(upload_id: str, request: Request, offset: int = Query(..., ge=0),
+                           db: DBSession = Depends(get_db)):
+    """Appends the raw request body at `offset`, streaming it to disk."""
+    length = request.headers.get("content-length")
+    return await append_chunk(db, upload_id, offset, request.stream(), int(length) if length else None)
+
+@app.post('/uploads/{upload_id}/complete')
+async def complete_upload(upload_id: str, db: DBSession = Depends(get_db)):
+    return await complete_session(db, upload_id)
+
+@app.delete('/uploads/{upload_id}')
+async def abort_upload(upload_id: str, db: DBSession = Depends(get_db)):
+    await abort_session(db, upload_id)
+    return {"ok": True}
+
+@app.get('/files/{sha256}')
+async def get_file(sha256: str = Path(..., pattern="^[0-9a-f]{64}$"), db: DBSession = Depends(get_db)):
+    """Serves a stored upload. Content never changes under its hash, so it
+    may be cached forever; byte ranges are supported."""
+    stored = await db.run(stored_file, sha256)
+    return FileResponse(
+        object_path(sha256),
+        media_type=stored.content_type,
+        filename=stored.original_name,
+        content_disposition_type="inline",
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{sha256}"'},
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
 
-@app.post("/items/", response_model=schemas.ItemSchema)
+@app.get('/thumbnails/{size}')
+async def get_thumbnail(size: int = Path(..., ge=1, le=4096), src: str = Query(...)):
+    """Serves a `size` px thumbnail of the uploaded image at `src` (see thumbnails.py)."""
+    found = await thumbnail(src, size)
+    if found is None:
+        return RedirectResponse(src)
+    path, cache_control = found
+    return FileResponse(path, media_type=thumbnail_media_type(path), headers={"Cache-Control": cache_control})
+
+@app.post("/register/", response_model=schemas.UserSchema)
+async def register_user(user: schemas.UserCreate, caller: Optional[Principal] = Depends(current_user),
+                        db: DBSession = Depends(get_db)):
+    """Self-service sign-up for clients and vendors."""
+    check_role_grant(caller, user.role, self_service=True)
+    return await create_account(db, user)
+
+@app.post("/items/", response_model=schemas.ItemSchema, dependencies=[Depends(require_staff)])
+@async_route
 def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
     db_item = models.Item(**item.dict())
     db.add(db_item)
@@ -304,12 +662,43 @@ def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
     db.refresh(db_item)
     return db_item
 
-@app.get("/items/", response_model=List[schemas.ItemSchema])
-def read_items(db: Session = Depends(get_db)):
-    return db.query(models.Item).all()
+@app.get("/items/", response_model=List[schemas.ItemSchema], dependencies=[Depends(conditional("items"))])
+@async_route
+def read_items(response: Response, q: Optional[str] = Query(None, max_length=200), page: Page = Depends(page_params),
+               db: Session = Depends(get_db)):
+    query = db.query(models.Item)
+    if q:
+        query = filter_search(db, query, SearchEntity.ITEMS, models.Item.id, q)
+    return paginate_json(query, models.Item.id, page, response, schemas.ItemSchema)
+
+@app.get("/search", response_model=List[schemas.SearchHit], dependencies=[Depends(conditional("tenders", "items", "proposals"))])
+@async_route
+def search_records(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find; the last one matches as a prefix"),
+    entity: Optional[List[SearchEntity]] = Query(None, description="Entities to search; all by default"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    """Best matches first, each with a snippet around the matched words."""
+    return search(db, q, entity or list(SearchEntity), limit, user)
+
+@app.get("/lookup/{entity}", response_model=List[schemas.LookupOption],
+         dependencies=[Depends(conditional("tenders", "users", "purchase_orders"))])
+@async_route
+def lookup_options(
+    entity: LookupEntity,
+    q: str = Query("", max_length=100, description="Typed prefix; empty for the newest rows"),
+    limit: int = Query(DEFAULT_LOOKUP_LIMIT, ge=1, le=MAX_LOOKUP_LIMIT),
+    user: Optional[Principal] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    """{id, label} pairs for a picker, matched by prefix."""
+    return lookup(db, entity, q, limit, user)
 
 # Workflow & Tracking Endpoints (UC 9-10)
-@app.post("/workflows/", response_model=schemas.WorkflowSchema)
+@app.post("/workflows/", response_model=schemas.WorkflowSchema, dependencies=[Depends(require_staff)])
+@async_route
 def create_workflow(workflow: schemas.WorkflowBase, db: Session = Depends(get_db)):
     db_wf = models.ApprovalWorkflow(**workflow.dict())
     db.add(db_wf)
@@ -317,16 +706,19 @@ def create_workflow(workflow: schemas.WorkflowBase, db: Session = Depends(get_db
     db.refresh(db_wf)
     return db_wf
 
-@app.get("/workflows/{entity_type}/{entity_id}", response_model=schemas.WorkflowSchema)
-def get_workflow(entity_type: str, entity_id: int, db: Session = Depends(get_db)):
-    wf = db.query(models.ApprovalWorkflow).filter(
+@app.get("/workflows/{entity_type}/{entity_id}", response_model=schemas.WorkflowSchema, dependencies=[Depends(conditional("approval_workflows"))])
+@async_route
+def get_workflow(entity_type: str, entity_id: int, user: Optional[Principal] = Depends(current_user),
+                 db: Session = Depends(get_db)):
+    wf = visible(db.query(models.ApprovalWorkflow), models.ApprovalWorkflow, user).filter(
         models.ApprovalWorkflow.entity_type == entity_type,
         models.ApprovalWorkflow.entity_id == entity_id
     ).first()
     if not wf: raise HTTPException(404)
     return wf
 
-@app.put("/workflows/{wf_id}")
+@app.put("/workflows/{wf_id}", dependencies=[Depends(require_staff)])
+@async_route
 def update_workflow(wf_id: int, next_step: str, status: str, db: Session = Depends(get_db)):
     wf = db.query(models.ApprovalWorkflow).filter(models.ApprovalWorkflow.id == wf_id).first()
     if not wf: raise HTTPException(404)
@@ -337,7 +729,8 @@ def update_workflow(wf_id: int, next_step: str, status: str, db: Session = Depen
 
 
 # Audit logs endpoints
-@app.post('/audit_logs/')
+@app.post('/audit_logs/', dependencies=[Depends(require_staff)])
+@async_route
 def create_audit_log(log: dict, db: Session = Depends(get_db)):
     # minimal implementation: expect keys user_id, action, entity_type, entity_id
     al = models.AuditLog(
@@ -349,9 +742,42 @@ def create_audit_log(log: dict, db: Session = Depends(get_db)):
     return al
 
 
-@app.get('/audit_logs/')
-def list_audit_logs(db: Session = Depends(get_db)):
-    return db.query(models.AuditLog).order_by(models.AuditLog.timestamp.desc()).limit(100).all()
+@app.get('/audit_logs/writer', dependencies=[Depends(require_staff)])
+def audit_writer_stats():
+    """Queue depth, batch and backpressure counters of the audit writer."""
+    return audit_writer.stats()
+
+
+@app.get('/audit_logs/archive', dependencies=[Depends(require_staff)])
+def list_audit_archives():
+    """Archived months (see audit_archive.py), newest first."""
+    return audit_archive.archives()
+
+
+@app.post('/audit_logs/archive', dependencies=[Depends(require_staff)])
+async def archive_audit_logs():
+    """Move closed months out of the hot audit table now."""
+    return await anyio.to_thread.run_sync(audit_archive.compact)
+
+
+@app.get('/audit_logs/', response_model=List[schemas.AuditLogSchema], dependencies=[Depends(require_staff), Depends(conditional("audit_logs"))])
+async def list_audit_logs(
+    response: Response,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    q: Optional[str] = Query(None, max_length=200, description="Words to find in the action or request path"),
+    page: Page = Depends(page_params),
+    db: DBSession = Depends(get_db),
+):
+    """Newest first, archived months included; follow X-Next-Cursor with
+    `after` for older entries."""
+    f = AuditFilter(user_id=user_id, action=action, entity_type=entity_type, entity_id=entity_id,
+                    created_from=created_from, created_to=created_to, q=q)
+    return await audit_page(db, f, page, response)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Text, Index, func, text
 from sqlalchemy.orm import relationship
 import enum
 from .database import Base
@@ -24,6 +24,15 @@ class TenderStatus(str, enum.Enum):
     COMPLETED = "completed"
     CLOSED = "closed"
 
+class ChangeTracked:
+    """Columns for delta sync (see changes.py).
+
+    `change_seq` is taken from a database-wide sequence on every insert or
+    update, so `/changes?since=` can find everything written after a point.
+    """
+    updated_at = Column(DateTime)
+    change_seq = Column(Integer, index=True)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -34,6 +43,11 @@ class User(Base):
     full_name = Column(String)
     profile_image = Column(String, nullable=True) # Uploaded image URL
 
+    # Case-insensitive name prefix lookups (see lookup.py)
+    __table_args__ = (
+        Index("ix_users_full_name_lower", func.lower(full_name)),
+    )
+
 class Item(Base):
     __tablename__ = "items"
     id = Column(Integer, primary_key=True, index=True)
@@ -43,33 +57,39 @@ class Item(Base):
     description = Column(String)
     image_url = Column(String, nullable=True)
 
-class Tender(Base):
+class Tender(ChangeTracked, Base):
     __tablename__ = "tenders"
     id = Column(Integer, primary_key=True, index=True)
     tender_id = Column(String, unique=True, index=True)
     title = Column(String)
     description = Column(Text)
     deadline = Column(DateTime)
-    status = Column(Enum(TenderStatus), default=TenderStatus.OPEN)
+    status = Column(Enum(TenderStatus), default=TenderStatus.OPEN, index=True)
     budget = Column(Float, default=0.0)
     quantity = Column(Integer, default=1)
     estimated_cost = Column(Float, default=0.0)
     delivery_timeline = Column(String) # e.g., "30 days"
     submission_method = Column(String) # e.g., "Online", "Manual"
     package_id = Column(String) 
+    image_url = Column(String, nullable=True)
     
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    client_id = Column(Integer, ForeignKey("users.id"))
+    client_id = Column(Integer, ForeignKey("users.id"), index=True)
     
     proposals = relationship("Proposal", back_populates="tender")
     contracts = relationship("Contract", back_populates="tender")
     purchase_orders = relationship("PurchaseOrder", back_populates="tender")
 
-class Proposal(Base):
+    __table_args__ = (
+        # Enum columns store the member name, hence 'OPEN'
+        Index("ix_tenders_open_deadline", "deadline", sqlite_where=text("status = 'OPEN'")),
+    )
+
+class Proposal(ChangeTracked, Base):
     __tablename__ = "proposals"
     id = Column(Integer, primary_key=True, index=True)
-    tender_id = Column(Integer, ForeignKey("tenders.id"))
-    vendor_id = Column(Integer, ForeignKey("users.id"))
+    tender_id = Column(Integer, ForeignKey("tenders.id"), index=True)
+    vendor_id = Column(Integer, ForeignKey("users.id"), index=True)
     
     technical_input = Column(Text)
     technical_score = Column(Float, default=0.0)
@@ -82,7 +102,7 @@ class Proposal(Base):
     document_url = Column(String) # For simplicity, path to file
     
     version = Column(Integer, default=1)
-    status = Column(String, default="Submitted") # Submitted, Under Review, Shortlisted, Approved, Rejected
+    status = Column(String, default="Submitted", index=True) # Submitted, Under Review, Shortlisted, Approved, Rejected
     
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     integration_id = Column(String)
@@ -90,10 +110,10 @@ class Proposal(Base):
     
     tender = relationship("Tender", back_populates="proposals")
 
-class Contract(Base):
+class Contract(ChangeTracked, Base):
     __tablename__ = "contracts"
     id = Column(Integer, primary_key=True, index=True)
-    tender_id = Column(Integer, ForeignKey("tenders.id"))
+    tender_id = Column(Integer, ForeignKey("tenders.id"), index=True)
     content = Column(Text)
     scope_of_work = Column(Text)
     start_date = Column(DateTime)
@@ -105,12 +125,12 @@ class Contract(Base):
     
     tender = relationship("Tender", back_populates="contracts")
 
-class PurchaseOrder(Base):
+class PurchaseOrder(ChangeTracked, Base):
     __tablename__ = "purchase_orders"
     id = Column(Integer, primary_key=True, index=True)
     po_number = Column(String, unique=True, index=True)
-    tender_id = Column(Integer, ForeignKey("tenders.id"))
-    vendor_id = Column(Integer, ForeignKey("users.id"))
+    tender_id = Column(Integer, ForeignKey("tenders.id"), index=True)
+    vendor_id = Column(Integer, ForeignKey("users.id"), index=True)
     items = Column(Text) 
     total_amount = Column(Float)
     status = Column(String, default="Created") # Created, Confirmed, Completed
@@ -121,16 +141,16 @@ class PurchaseOrder(Base):
     tender = relationship("Tender", back_populates="purchase_orders")
     invoices = relationship("Invoice", back_populates="purchase_order")
 
-class Invoice(Base):
+class Invoice(ChangeTracked, Base):
     __tablename__ = "invoices"
     id = Column(Integer, primary_key=True, index=True)
     invoice_number = Column(String, unique=True, index=True)
-    po_id = Column(Integer, ForeignKey("purchase_orders.id"))
+    po_id = Column(Integer, ForeignKey("purchase_orders.id"), index=True)
     amount = Column(Float)
     tax_amount = Column(Float, default=0.0)
     discount_amount = Column(Float, default=0.0)
     total_payable = Column(Float)
-    status = Column(String, default="Draft") # Draft, Issued, Pending, Partial, Paid
+    status = Column(String, default="Draft", index=True) # Draft, Issued, Pending, Partial, Paid
     issuance_id = Column(String) #
     audit_flag = Column(Integer, default=0) 
     verification_date = Column(DateTime) 
@@ -139,10 +159,14 @@ class Invoice(Base):
     purchase_order = relationship("PurchaseOrder", back_populates="invoices")
     payments = relationship("Payment", back_populates="invoice")
 
-class Payment(Base):
+    __table_args__ = (
+        Index("ix_invoices_unpaid", "po_id", sqlite_where=text("status != 'Paid'")),
+    )
+
+class Payment(ChangeTracked, Base):
     __tablename__ = "payments"
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.id"))
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), index=True)
     amount_paid = Column(Float)
     payment_mode = Column(String) # Bank Transfer, Cheque, Online
     transaction_id = Column(String)
@@ -151,14 +175,14 @@ class Payment(Base):
     payment_date = Column(DateTime, default=datetime.datetime.utcnow)
     completion_date = Column(DateTime)
     commission_amount = Column(Float, default=0.0) # Profit/Commission for Sales Dept
-    status = Column(String, default="Pending") # Pending, Verified, Failed
+    status = Column(String, default="Pending", index=True) # Pending, Verified, Failed
     
     invoice = relationship("Invoice", back_populates="payments")
 
-class Milestone(Base):
+class Milestone(ChangeTracked, Base):
     __tablename__ = "milestones"
     id = Column(Integer, primary_key=True, index=True)
-    tender_id = Column(Integer, ForeignKey("tenders.id"))
+    tender_id = Column(Integer, ForeignKey("tenders.id"), index=True)
     title = Column(String)
     description = Column(Text)
     status = Column(String, default="Pending") # Pending, In Progress, Completed
@@ -176,13 +200,25 @@ class Milestone(Base):
 class AuditLog(Base):
     __tablename__ = "audit_logs"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     action = Column(String)
     entity_type = Column(String) # Tender, Proposal, Invoice, etc.
     entity_id = Column(Integer)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    path = Column(String) # Request path, for automatically captured entries
+    status_code = Column(Integer)
+
+    # Newest-first keyset pagination walks (filter, timestamp, id); SQLite
+    # appends the rowid id to every index, so these cover the sort too.
+    # AUTOINCREMENT: ids of entries moved to archives are never reused.
+    __table_args__ = (
+        Index("ix_audit_logs_user_time", "user_id", "timestamp"),
+        Index("ix_audit_logs_entity_time", "entity_type", "entity_id", "timestamp"),
+        Index("ix_audit_logs_action_time", "action", "timestamp"),
+        {"sqlite_autoincrement": True},
+    )
 
-class ApprovalWorkflow(Base):
+class ApprovalWorkflow(ChangeTracked, Base):
     __tablename__ = "approval_workflows"
     id = Column(Integer, primary_key=True, index=True)
     workflow_id = Column(String, unique=True, index=True)
@@ -194,3 +230,60 @@ class ApprovalWorkflow(Base):
     notification_sent = Column(Integer, default=0) 
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_approval_workflows_entity", "entity_type", "entity_id"),
+    )
+
+class TableVersion(Base):
+    """Per-table change counter, bumped whenever a flush writes to the table.
+
+    Conditional GETs derive their ETags from it (see etag.py).
+    """
+    __tablename__ = "table_versions"
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ChangeSequence(Base):
+    """Single-row counter handing out `ChangeTracked.change_seq` values."""
+    __tablename__ = "change_sequence"
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class Tombstone(Base):
+    """Marks a deleted change-tracked row so delta sync can remove it."""
+    __tablename__ = "tombstones"
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class IdSequence(Base):
+    """Next unreserved number of a human-readable ID series (see sequences.py)."""
+    __tablename__ = "id_sequences"
+    name = Column(String, primary_key=True)
+    next_value = Column(Integer, nullable=False)
+
+
+class StoredFile(Base):
+    """A file in the content-addressed upload store (see uploads.py).
+
+    Identical uploads share one row and one file on disk; `document_url`,
+    `proof_url` and `image_url` hold its `/files/<sha256>` URL.
+    """
+    __tablename__ = "stored_files"
+    sha256 = Column(String, primary_key=True)
+    size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False)
+    original_name = Column(String)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class UploadSession(Base):
+    """A resumable upload in progress; its bytes so far are on disk."""
+    __tablename__ = "upload_sessions"
+    id = Column(String, primary_key=True)
+    filename = Column(String)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
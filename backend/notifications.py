@@ -0,0 +1,193 @@
+"""Entity change notifications pushed to desktop clients over WebSocket.
+
+A flush that writes a change-tracked row (see changes.py) records one
+event per row. The events are published to the in-process Hub once the
+transaction commits and dropped on rollback. The Hub fans them out to the
+connected sockets whose user may see them, by the same rules as
+/changes (visibility.py):
+- staff roles get everything;
+- clients get rows belonging to their tenders;
+- vendors get every tender, their own proposals, orders, invoices and
+  payments, and the contracts and milestones of tenders they hold an
+  order on;
+- approval workflows go to staff only.
+
+The Hub lives in one process. With several API workers, a client only
+hears about writes made by the worker holding its socket. Such
+deployments should keep a single worker for /ws/events, or swap the Hub
+for a broker.
+"""
+import asyncio
+from typing import Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .auth import STAFF_ROLES
+from .changes import TRACKED
+from .fast_json import dumps, schema_columns
+
+# Events queued per socket before it is considered lagging and told to resync
+QUEUE_SIZE = 1000
+
+RESYNC = {"type": "resync"}
+
+
+class Subscriber:
+    def __init__(self, user_id: int, role: models.UserRole):
+        self.user_id = user_id
+        self.role = role
+        self.queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+        self.lagged = False
+
+    def wants(self, envelope: dict) -> bool:
+        if envelope.get("broadcast") or self.role in STAFF_ROLES:
+            return True
+        if self.role == models.UserRole.CLIENT:
+            return envelope["client_id"] == self.user_id
+        if self.role == models.UserRole.VENDOR:
+            return envelope["all_vendors"] or self.user_id in envelope["vendor_ids"]
+        return False
+
+    def deliver(self, envelope: dict):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(envelope["event"])
+        except asyncio.QueueFull:
+            self.lagged = True
+
+    async def next_event(self) -> dict:
+        if self.lagged:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.lagged = False
+            return RESYNC
+        return await self.queue.get()
+
+
+class Hub:
+    """In-process pub/sub between request handlers and open sockets."""
+
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, user_id: int, role: models.UserRole) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscriber(user_id, role)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def publish(self, envelopes):
+        """Thread-safe; called from worker threads after a commit."""
+        if not self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._fan_out, list(envelopes))
+
+    def _fan_out(self, envelopes):
+        for sub in list(self._subscribers):
+            for envelope in envelopes:
+                if sub.wants(envelope):
+                    sub.deliver(envelope)
+
+
+hub = Hub()
+
+
+def _scalar(conn, sql: str, value):
+    if value is None:
+        return None
+    return conn.execute(text(sql), {"v": value}).scalar()
+
+
+def _tender_client(conn, tender_id):
+    return _scalar(conn, "SELECT client_id FROM tenders WHERE id = :v", tender_id)
+
+
+def _tender_vendors(conn, tender_id):
+    if tender_id is None:
+        return ()
+    rows = conn.execute(text("SELECT DISTINCT vendor_id FROM purchase_orders WHERE tender_id = :v"), {"v": tender_id})
+    return tuple(vendor_id for vendor_id, in rows)
+
+
+def _po_parties(conn, po_id):
+    row = conn.execute(
+        text("SELECT vendor_id, tender_id FROM purchase_orders WHERE id = :v"), {"v": po_id}
+    ).first() if po_id is not None else None
+    if row is None:
+        return None, ()
+    return _tender_client(conn, row.tender_id), (row.vendor_id,)
+
+
+def _audience(conn, obj):
+    """(client_id, vendor_ids, all_vendors) of the non-staff users who may
+    see `obj`: `visible_clause` read from the row's side."""
+    if isinstance(obj, models.Tender):
+        return obj.client_id, (), True
+    if isinstance(obj, (models.Proposal, models.PurchaseOrder)):
+        return _tender_client(conn, obj.tender_id), (obj.vendor_id,), False
+    if isinstance(obj, (models.Contract, models.Milestone)):
+        return _tender_client(conn, obj.tender_id), _tender_vendors(conn, obj.tender_id), False
+    if isinstance(obj, models.Invoice):
+        return (*_po_parties(conn, obj.po_id), False)
+    if isinstance(obj, models.Payment):
+        po_id = _scalar(conn, "SELECT po_id FROM invoices WHERE id = :v", obj.invoice_id)
+        return (*_po_parties(conn, po_id), False)
+    return None, (), False
+
+
+def _row(obj) -> dict:
+    names, _, converters = schema_columns(TRACKED[obj.__tablename__][1], type(obj))
+    return {
+        name: conv(getattr(obj, name, None)) if conv else getattr(obj, name, None)
+        for name, conv in zip(names, converters)
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    changed = [("insert", obj) for obj in session.new] + [
+        ("update", obj) for obj in session.dirty if session.is_modified(obj)
+    ] + [("delete", obj) for obj in session.deleted]
+    changed = [(op, obj) for op, obj in changed if isinstance(obj, models.ChangeTracked)]
+    if not changed:
+        return
+    conn = session.connection()
+    pending = session.info.setdefault("pending_events", [])
+    for op, obj in changed:
+        client_id, vendor_ids, all_vendors = _audience(conn, obj)
+        pending.append({
+            "client_id": client_id,
+            "vendor_ids": vendor_ids,
+            "all_vendors": all_vendors,
+            "event": {
+                "type": "change",
+                "entity": obj.__tablename__,
+                "op": op,
+                "id": obj.id,
+                "change_seq": obj.change_seq,
+                "row": None if op == "delete" else _row(obj),
+            },
+        })
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    pending = session.info.pop("pending_events", None)
+    if pending:
+        hub.publish(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_events(session):
+    session.info.pop("pending_events", None)
+
+
+def encode(event: dict) -> str:
+    return dumps(event).decode()
@@ -0,0 +1,46 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Header, HTTPException, Query
+
+# Page sizes for list endpoints. Clients that need everything follow the
+# `X-Next-Cursor` header until it is absent.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class Page:
+    after: Optional[str]
+    limit: int
+    # Accept header, used to pick the list representation (see fast_json)
+    accept: Optional[str] = None
+
+
+def page_params(
+    after: Optional[str] = Query(None, description="Opaque cursor from a previous X-Next-Cursor header"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    accept: Optional[str] = Header(None),
+) -> Page:
+    """FastAPI dependency collecting the `after`/`limit` query parameters."""
+    return Page(after=after, limit=limit, accept=accept)
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> int:
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        kind, _, value = base64.urlsafe_b64decode(padded.encode()).decode().partition(":")
+        if kind != "id":
+            raise ValueError(kind)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
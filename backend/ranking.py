@@ -0,0 +1,157 @@
+"""Combined technical / financial ranking of a tender's proposals.
+
+Quality-and-cost based scoring, computed with NumPy array operations over
+every proposal of every requested tender at once:
+
+- a proposal qualifies with a positive bid and a technical score of at
+  least `min_technical` (scores are out of 100); rejected proposals are
+  left out;
+- financial score = 100 * lowest qualified bid / bid, so L1 scores 100;
+- combined = tech_weight * technical + (1 - tech_weight) * financial;
+- L1 position orders qualified bids cheapest first, H1 position orders
+  them by combined score, best first; ties go to the earlier proposal;
+- `vs_estimate` is the bid's deviation from the tender's estimated_cost,
+  in percent (None without an estimate).
+
+The top `top_k` H1 proposals are the recommendation. Nothing is written;
+evaluators still set statuses through PUT /proposals/{id}.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import Query
+from sqlalchemy.orm import Session
+
+from . import models
+
+DEFAULT_TECH_WEIGHT = 0.7
+DEFAULT_TOP_K = 3
+
+EXCLUDED_STATUSES = ("Rejected",)
+
+
+@dataclass
+class Criteria:
+    tech_weight: float = DEFAULT_TECH_WEIGHT
+    min_technical: float = 0.0
+    top_k: int = DEFAULT_TOP_K
+
+
+def criteria_params(
+    tech_weight: float = Query(DEFAULT_TECH_WEIGHT, ge=0, le=1, description="Weight of the technical score; "
+                               "the financial score gets the rest"),
+    min_technical: float = Query(0.0, ge=0, le=100, description="Technical score a proposal needs to be ranked"),
+    top_k: int = Query(DEFAULT_TOP_K, ge=1, le=100, description="Proposals to recommend per tender"),
+) -> Criteria:
+    """FastAPI dependency collecting the ranking query parameters."""
+    return Criteria(tech_weight=tech_weight, min_technical=min_technical, top_k=top_k)
+
+
+def _positions(order: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """1-based position of each row within its group, given a sort `order`
+    that keeps groups contiguous and in group order; `first` is the index
+    of each row's first group member."""
+    positions = np.empty(len(order), dtype=np.int64)
+    positions[order] = np.arange(len(order)) - first[order] + 1
+    return positions
+
+
+def score(group: np.ndarray, ids: np.ndarray, technical: np.ndarray, bids: np.ndarray,
+          estimates: np.ndarray, criteria: Criteria) -> Dict[str, np.ndarray]:
+    """Per-proposal scores and positions; rows must be sorted by `group`
+    (a 0-based tender index, one value per proposal)."""
+    rows = np.arange(len(group))
+    is_first = np.r_[True, group[1:] != group[:-1]] if len(group) else np.zeros(0, dtype=bool)
+    first = np.maximum.accumulate(np.where(is_first, rows, 0)) if len(group) else rows
+    qualified = np.isfinite(bids) & (bids > 0) & (technical >= criteria.min_technical)
+
+    priced = np.where(qualified, bids, np.inf)
+    lowest = np.minimum.reduceat(priced, rows[is_first])[np.cumsum(is_first) - 1] if len(group) else priced
+    with np.errstate(divide="ignore", invalid="ignore"):
+        financial = np.where(qualified, 100.0 * lowest / bids, 0.0)
+        vs_estimate = np.where(estimates > 0, (bids - estimates) / estimates * 100.0, np.nan)
+    combined = np.where(qualified, criteria.tech_weight * technical + (1 - criteria.tech_weight) * financial, 0.0)
+
+    # Unqualified rows sort last in both orders and get no position
+    l1 = _positions(np.lexsort((ids, priced, group)), first)
+    h1 = _positions(np.lexsort((ids, np.where(qualified, -combined, np.inf), group)), first)
+    return {
+        "qualified": qualified,
+        "lowest": np.where(np.isfinite(lowest), lowest, np.nan),
+        "financial": financial,
+        "combined": combined,
+        "vs_estimate": vs_estimate,
+        "l1": np.where(qualified, l1, 0),
+        "h1": np.where(qualified, h1, 0),
+    }
+
+
+def _round(value) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def rank_tenders(db: Session, tenders: list, criteria: Criteria, full: bool = True) -> List[dict]:
+    """Rankings for `tenders` (rows with id, tender_id, title,
+    estimated_cost, sorted by id). With `full`, every proposal is listed;
+    otherwise only the recommended ones."""
+    if not tenders:
+        return []
+    index = {t.id: i for i, t in enumerate(tenders)}
+    p = models.Proposal
+    rows = (
+        db.query(p.tender_id, p.id, p.vendor_id, p.technical_score, p.financial_input)
+        .filter(p.tender_id.in_(list(index)), p.status.notin_(EXCLUDED_STATUSES))
+        .order_by(p.tender_id, p.id)
+        .all()
+    )
+    group = np.fromiter((index[r.tender_id] for r in rows), dtype=np.int64, count=len(rows))
+    ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+    technical = np.fromiter((r.technical_score or 0.0 for r in rows), dtype=float, count=len(rows))
+    bids = np.fromiter((np.nan if r.financial_input is None else r.financial_input for r in rows),
+                       dtype=float, count=len(rows))
+    estimated = np.array([t.estimated_cost or 0.0 for t in tenders], dtype=float)
+    scores = score(group, ids, technical, bids, estimated[group], criteria)
+
+    count = len(tenders)
+    bid_counts = np.bincount(group, minlength=count)
+    qualified_counts = np.bincount(group, weights=scores["qualified"], minlength=count)
+    lowest_bids = np.full(count, np.nan)
+    lowest_bids[group] = scores["lowest"]
+
+    results = [
+        {
+            "tender_id": t.id, "reference": t.tender_id, "title": t.title,
+            "estimated_cost": t.estimated_cost, "lowest_bid": _round(lowest_bids[i]),
+            "bids": int(bid_counts[i]), "qualified": int(qualified_counts[i]),
+            "proposals": [], "recommended": [],
+        }
+        for i, t in enumerate(tenders)
+    ]
+    recommended = scores["qualified"] & (scores["h1"] <= criteria.top_k)
+    # Only the rows that are reported become dicts
+    for i in np.flatnonzero(recommended | full):
+        row = rows[i]
+        entry = {
+            "proposal_id": row.id,
+            "vendor_id": row.vendor_id,
+            "technical_score": row.technical_score,
+            "financial_input": row.financial_input,
+            "financial_score": round(float(scores["financial"][i]), 4),
+            "combined_score": round(float(scores["combined"][i]), 4),
+            "l1_position": int(scores["l1"][i]) or None,
+            "h1_position": int(scores["h1"][i]) or None,
+            "vs_estimate": _round(scores["vs_estimate"][i]),
+            "qualified": bool(scores["qualified"][i]),
+        }
+        result = results[group[i]]
+        if recommended[i]:
+            result["recommended"].append(entry)
+        if full:
+            result["proposals"].append(entry)
+    for result in results:
+        result["recommended"].sort(key=lambda e: e["h1_position"])
+        result["proposals"].sort(key=lambda e: (e["h1_position"] is None, e["h1_position"] or 0, e["proposal_id"]))
+        if not full:
+            del result["proposals"]
+    return results
@@ -36,7 +36,7 @@ class ItemSchema(ItemBase):
 class TenderBase(BaseModel):
     title: str
     description: str
-    budget: float
+    budget: float = 0.0
     deadline: date
     status: str = "open"
     image_url: Optional[str] = None # Added for placeholder1
@@ -46,12 +46,13 @@ class TenderBase(BaseModel):
     package_id: Optional[str] = None
 
 class TenderCreate(TenderBase):
-    tender_id: str
+    tender_id: Optional[str] = None # Allocated by the server when omitted
     client_id: int
     
 class TenderSchema(TenderBase):
     id: int
     tender_id: str
+    client_id: Optional[int] = None
     status: TenderStatus
     created_at: datetime
     class Config:
@@ -75,6 +76,7 @@ class ProposalUpdate(BaseModel):
     financial_remarks: Optional[str] = None
     margin_analysis: Optional[str] = None
     status: Optional[str] = None
+    feedback: Optional[str] = None
 
 class ProposalSchema(ProposalBase):
     id: int
@@ -190,10 +192,23 @@ class MilestoneBase(BaseModel):
 class MilestoneCreate(MilestoneBase):
     pass
 
+class MilestoneUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    status: Optional[str] = None
+    proof_url: Optional[str] = None
+    delivery_id: Optional[str] = None
+    note_id: Optional[str] = None
+    transmission_id: Optional[str] = None
+    transmission_method: Optional[str] = None
+    inspection_status: Optional[str] = None
+    quality_remarks: Optional[str] = None
+    signed_challan_id: Optional[str] = None
+
 class MilestoneSchema(MilestoneBase):
     id: int
-    completion_date: Optional[datetime]
-    proof_url: Optional[str]
+    completion_date: Optional[datetime] = None
+    proof_url: Optional[str] = None
     delivery_id: Optional[str]
     note_id: Optional[str]
     transmission_id: Optional[str]
@@ -216,7 +231,34 @@ class WorkflowSchema(WorkflowBase):
     class Config:
         from_attributes = True
 
+class AuditLogSchema(BaseModel):
+    id: int
+    user_id: Optional[int]
+    action: Optional[str]
+    entity_type: Optional[str]
+    entity_id: Optional[int]
+    timestamp: datetime
+    path: Optional[str] = None
+    status_code: Optional[int] = None
+    class Config:
+        from_attributes = True
+
 class LoginRequest(BaseModel):
     username: str
     password: str
 
+class UploadStart(BaseModel):
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    size: int
+
+class SearchHit(BaseModel):
+    entity: str
+    id: int
+    label: Optional[str]
+    snippet: Optional[str]
+    score: float
+
+class LookupOption(BaseModel):
+    id: int
+    label: str
@@ -0,0 +1,132 @@
+"""Ranked full-text search over tenders, items and proposals.
+
+Each entity has an FTS5 index kept in sync by triggers (see fts.py and
+migration 10): tenders on title and description, items on name and
+description, proposals on the technical input. A search runs one MATCH
+per entity, ranked by bm25 with the title / name column weighted above
+the longer text, and returns a snippet around the matched words. The
+last word matches as a prefix, so results follow the user's typing.
+
+Hits are limited to the rows the caller may read (see visibility.py),
+as in the list routes and /changes. Without FTS5 the same request falls back to LIKE,
+unranked, newest first.
+"""
+import enum
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from . import fts, models
+from .auth import Principal
+from .visibility import NOTHING, visible_clause
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+SNIPPET_TOKENS = 12
+HIGHLIGHT = ("«", "»")
+ELLIPSIS = "…"
+
+
+class SearchEntity(str, enum.Enum):
+    TENDERS = "tenders"
+    ITEMS = "items"
+    PROPOSALS = "proposals"
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    fts_table: str
+    model: type
+    columns: Tuple[str, ...]
+    # bm25 weight per column
+    weights: Tuple[float, ...]
+    # SQL over the source row `src`
+    label: str
+
+    @property
+    def source(self) -> str:
+        return self.model.__tablename__
+
+
+INDEXES = {
+    SearchEntity.TENDERS: SearchIndex("tenders_fts", models.Tender, ("title", "description"), (4.0, 1.0), "src.title"),
+    SearchEntity.ITEMS: SearchIndex("items_fts", models.Item, ("name", "description"), (4.0, 1.0), "src.name"),
+    SearchEntity.PROPOSALS: SearchIndex(
+        "proposals_fts", models.Proposal, ("technical_input",), (1.0,), "'Proposal ' || src.id",
+    ),
+}
+
+
+def create_indexes(conn):
+    for index in INDEXES.values():
+        fts.create_index(conn, index.fts_table, index.source, index.columns)
+
+
+def filter_query(db: Session, query, entity: SearchEntity, id_column, q: str):
+    """Narrow a list route's `query` to `entity` rows matching `q`."""
+    index = INDEXES[entity]
+    return fts.filter_matches(db, query, index.fts_table, id_column, index.columns, q)
+
+
+def _scope(db: Session, index: SearchIndex, user: Optional[Principal]):
+    """(SQL condition, params) restricting `index` to what `user` may see."""
+    clause = visible_clause(index.model, user)
+    if clause is None:
+        return "", {}
+    # The clause only binds user ids, so it can be inlined
+    ids = select(index.model.id).where(clause).compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    return f" AND src.id IN ({ids})", {}
+
+
+def _ranked(db: Session, index: SearchIndex, expr: str, limit: int, user) -> list:
+    scope, params = _scope(db, index, user)
+    weights = ", ".join(str(w) for w in index.weights)
+    start, end = HIGHLIGHT
+    sql = (
+        f"SELECT src.id AS id, {index.label} AS label, "
+        f"snippet({index.fts_table}, -1, '{start}', '{end}', '{ELLIPSIS}', {SNIPPET_TOKENS}) AS snippet, "
+        f"bm25({index.fts_table}, {weights}) AS rank "
+        f"FROM {index.fts_table} JOIN {index.source} AS src ON src.id = {index.fts_table}.rowid "
+        f"WHERE {index.fts_table} MATCH :expr{scope} ORDER BY rank LIMIT :limit"
+    )
+    rows = db.execute(text(sql), {"expr": expr, "limit": limit, **params}).all()
+    # bm25 is lower for better matches; report higher-is-better
+    return [(-row.rank, row) for row in rows]
+
+
+def _unranked(db: Session, index: SearchIndex, query: str, limit: int, user) -> list:
+    scope, params = _scope(db, index, user)
+    matches = " OR ".join(f"src.{c} LIKE :pattern ESCAPE '\\'" for c in index.columns)
+    sql = (
+        f"SELECT src.id AS id, {index.label} AS label, "
+        f"substr(COALESCE(src.{index.columns[-1]}, ''), 1, 160) AS snippet, 0.0 AS rank "
+        f"FROM {index.source} AS src WHERE ({matches}){scope} ORDER BY src.id DESC LIMIT :limit"
+    )
+    rows = db.execute(text(sql), {"pattern": fts.like_pattern(query), "limit": limit, **params}).all()
+    return [(0.0, row) for row in rows]
+
+
+def search(db: Session, query: str, entities: List[SearchEntity], limit: int,
+           user: Optional[Principal] = None) -> List[dict]:
+    """The best `limit` hits across `entities`, best first."""
+    expr = fts.match_expression(query)
+    if expr is None:
+        return []
+    hits = []
+    for entity in entities:
+        index = INDEXES[entity]
+        if visible_clause(index.model, user) is NOTHING:
+            continue
+        if fts.has_index(db, index.fts_table):
+            found = _ranked(db, index, expr, limit, user)
+        else:
+            found = _unranked(db, index, query, limit, user)
+        hits.extend((score, entity, row) for score, row in found)
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+    return [
+        {"entity": entity.value, "id": row.id, "label": row.label, "snippet": row.snippet, "score": round(score, 4)}
+        for score, entity, row in hits[:limit]
+    ]
@@ -0,0 +1,100 @@
+"""Human-readable ID allocation (T-1001, PO-000001, ...).
+
+Numbers come from the `id_sequences` table. A process reserves a block of
+BLOCK_SIZE numbers in a short transaction of its own, then hands them out
+from memory. Allocating an ID is O(1) and needs no query most of the
+time. Reservations bump the row before reading it, so two workers can
+never receive overlapping blocks.
+
+Numbers left in a block when a process exits are skipped, so IDs are
+unique and increasing per process, but not gap-free.
+
+Route bodies run in async mode through AsyncSession.run_sync, on the
+event loop thread. A reservation made there is handed to the threadpool
+and awaited, so the loop keeps serving other requests meanwhile.
+"""
+import os
+import threading
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.util.concurrency import in_greenlet
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from sqlalchemy.util.concurrency import await_
+except ImportError:  # SQLAlchemy < 2.1
+    from sqlalchemy.util.concurrency import await_only as await_
+
+from . import database
+
+BLOCK_SIZE = int(os.environ.get("TENDER_ID_BLOCK_SIZE", "50"))
+
+# series -> (format, first number of a new series)
+SERIES = {
+    "tender": ("T-{}", 1001),
+    "po": ("PO-{:06d}", 1),
+    "invoice": ("INV-{:06d}", 1),
+    "transaction": ("TXN-{:06d}", 1),
+}
+
+
+def reserve_block(engine, name: str, size: int) -> int:
+    """Reserve `size` numbers of series `name`; return the first."""
+    with engine.begin() as conn:
+        bumped = conn.execute(
+            text("UPDATE id_sequences SET next_value = next_value + :n WHERE name = :name"),
+            {"n": size, "name": name},
+        )
+        if bumped.rowcount == 0:
+            conn.execute(
+                text("INSERT INTO id_sequences (name, next_value) VALUES (:name, :next)"),
+                {"name": name, "next": SERIES[name][1] + size},
+            )
+        return conn.execute(
+            text("SELECT next_value FROM id_sequences WHERE name = :name"), {"name": name}
+        ).scalar() - size
+
+
+class SequenceAllocator:
+    """Per-process cache of reserved number blocks."""
+
+    def __init__(self, engine=None, block_size: int = BLOCK_SIZE):
+        self.engine = engine
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks: Dict[str, List[int]] = {}  # name -> [next, end)
+
+    def next_number(self, name: str) -> int:
+        while True:
+            with self._lock:
+                block = self._blocks.get(name)
+                if block is not None and block[0] < block[1]:
+                    number = block[0]
+                    block[0] += 1
+                    return number
+            # Not under the lock: in async mode reserving yields to the
+            # event loop, where other requests may need a number too
+            first = self._reserve(name)
+            with self._lock:
+                block = self._blocks.get(name)
+                # A concurrent caller may have installed a newer block
+                # meanwhile; this one is then skipped
+                if block is None or block[0] >= block[1] and first >= block[1]:
+                    self._blocks[name] = [first, first + self.block_size]
+
+    def _reserve(self, name: str) -> int:
+        engine = self.engine or database.engine
+        if in_greenlet():
+            return await_(run_in_threadpool(reserve_block, engine, name, self.block_size))
+        return reserve_block(engine, name, self.block_size)
+
+    def next_id(self, name: str) -> str:
+        return SERIES[name][0].format(self.next_number(name))
+
+
+allocator = SequenceAllocator()
+
+
+def next_id(name: str) -> str:
+    return allocator.next_id(name)
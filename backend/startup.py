@@ -0,0 +1,100 @@
+"""Application startup, run from the FastAPI lifespan hook.
+
+Nothing here runs at import time, so importing `backend.main` (tests,
+tools, every uvicorn worker before it serves) stays cheap. Each phase is
+timed and the report is printed and kept on `app.state.startup_report`.
+
+Set TENDER_SKIP_SCHEMA_CHECK=1 in production once `python -m
+backend.upgrade_db` has been run as a deploy step; workers then skip the
+schema_version lookup entirely.
+"""
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+from . import database
+from .audit import writer as audit_writer
+from .upgrade_db import migrate
+
+SKIP_SCHEMA_CHECK = os.environ.get("TENDER_SKIP_SCHEMA_CHECK", "").lower() in ("1", "true", "yes")
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+UPLOADS_DIR = os.path.join(STATIC_DIR, "uploads")
+
+
+class StartupReport:
+    """Wall-clock time spent in each startup phase."""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float, str]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except Exception as e:
+            outcome = f"failed: {e}"
+            raise
+        finally:
+            self.phases.append((name, time.perf_counter() - started, outcome))
+
+    def skipped(self, name: str):
+        self.phases.append((name, 0.0, "skipped"))
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds, _ in self.phases)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round(self.total * 1000, 2),
+            "phases": [
+                {"name": name, "ms": round(seconds * 1000, 2), "outcome": outcome}
+                for name, seconds, outcome in self.phases
+            ],
+        }
+
+    def __str__(self):
+        lines = [f"Startup finished in {self.total * 1000:.1f} ms"]
+        for name, seconds, outcome in self.phases:
+            lines.append(f"  {name:<16} {seconds * 1000:8.1f} ms  {outcome}")
+        return "\n".join(lines)
+
+
+def run_startup(skip_schema_check: bool = SKIP_SCHEMA_CHECK) -> StartupReport:
+    report = StartupReport()
+    with report.phase("static dirs"):
+        os.makedirs(UPLOADS_DIR, exist_ok=True)
+    if skip_schema_check:
+        report.skipped("schema")
+    else:
+        try:
+            with report.phase("schema"):
+                migrate(database.engine)
+        except Exception as e:
+            # Do not stop startup; a query that needs the missing column
+            # will surface the explicit error.
+            print("DB schema migration failed:", e)
+    with report.phase("db connect"):
+        # Opens (and, for SQLite, tunes) the first pooled connection so the
+        # first request does not pay for it.
+        with database.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    return report
+
+
+@asynccontextmanager
+async def lifespan(app):
+    report = run_startup()
+    app.state.startup_report = report
+    print(report)
+    audit_writer.start()
+    try:
+        yield
+    finally:
+        await audit_writer.stop()
@@ -1,8 +1,41 @@
 const API_URL = ""; // Relative path
+const PAGE_SIZE = 1000; // Largest page the list endpoints accept
+
+// fetch() with the session token from /login/ (kept with the user in
+// localStorage) as a bearer Authorization header.
+function apiFetch(url, options = {}) {
+    const user = JSON.parse(localStorage.getItem('user') || 'null');
+    const headers = { ...(options.headers || {}) };
+    if (user && user.token) headers['Authorization'] = `Bearer ${user.token}`;
+    return fetch(url, { ...options, headers });
+}
+
+// URL of a cached thumbnail of an uploaded image, at least `size` px.
+// Other URLs (placeholders, external images) are returned unchanged.
+function thumbUrl(url, size) {
+    if (!url || !(url.startsWith('/files/') || url.startsWith('/static/uploads/'))) return url;
+    const scale = window.devicePixelRatio || 1;
+    return `${API_URL}/thumbnails/${Math.ceil(size * scale)}?src=${encodeURIComponent(url)}`;
+}
+
+// Follow the X-Next-Cursor header of a paginated list endpoint and
+// return every row.
+async function fetchAll(path) {
+    const rows = [];
+    let url = `${API_URL}${path}?limit=${PAGE_SIZE}`;
+    while (true) {
+        const res = await apiFetch(url);
+        if (!res.ok) throw new Error(`Could not fetch ${path}`);
+        rows.push(...await res.json());
+        const cursor = res.headers.get('X-Next-Cursor');
+        if (!cursor) return rows;
+        url = `${API_URL}${path}?limit=${PAGE_SIZE}&after=${encodeURIComponent(cursor)}`;
+    }
+}
 
 const api = {
     login: async (username, password) => {
-        const res = await fetch(`${API_URL}/login/`, {
+        const res = await apiFetch(`${API_URL}/login/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ username, password })
@@ -12,12 +45,11 @@ const api = {
     },
 
     getTenders: async () => {
-        const res = await fetch(`${API_URL}/tenders/`);
-        return await res.json();
+        return await fetchAll('/tenders/');
     },
 
     createTender: async (data) => {
-        const res = await fetch(`${API_URL}/tenders/`, {
+        const res = await apiFetch(`${API_URL}/tenders/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -26,7 +58,7 @@ const api = {
     },
 
     createContract: async (data) => {
-        const res = await fetch(`${API_URL}/contracts/`, {
+        const res = await apiFetch(`${API_URL}/contracts/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -35,7 +67,7 @@ const api = {
     },
 
     createPO: async (data) => {
-        const res = await fetch(`${API_URL}/purchase_orders/`, {
+        const res = await apiFetch(`${API_URL}/purchase_orders/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -44,27 +76,23 @@ const api = {
     },
 
     getInvoices: async () => {
-        const res = await fetch(`${API_URL}/invoices/`);
-        return await res.json();
+        return await fetchAll('/invoices/');
     },
 
     getContracts: async () => {
-        const res = await fetch(`${API_URL}/contracts/`);
-        return await res.json();
+        return await fetchAll('/contracts/');
     },
 
     getPOs: async () => {
-        const res = await fetch(`${API_URL}/purchase_orders/`);
-        return await res.json();
+        return await fetchAll('/purchase_orders/');
     },
 
     getPayments: async () => {
-        const res = await fetch(`${API_URL}/payments/`);
-        return await res.json();
+        return await fetchAll('/payments/');
     },
 
     createPayment: async (data) => {
-        const res = await fetch(`${API_URL}/payments/`, {
+        const res = await apiFetch(`${API_URL}/payments/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -73,12 +101,12 @@ const api = {
     },
 
     getMilestones: async (tenderId) => {
-        const res = await fetch(`${API_URL}/tenders/${tenderId}/milestones`);
+        const res = await apiFetch(`${API_URL}/tenders/${tenderId}/milestones`);
         return await res.json();
     },
 
     updateMilestone: async (mid, data) => {
-        const res = await fetch(`${API_URL}/milestones/${mid}`, {
+        const res = await apiFetch(`${API_URL}/milestones/${mid}`, {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -87,7 +115,7 @@ const api = {
     },
 
     register: async (data) => {
-        const res = await fetch(`${API_URL}/register/`, {
+        const res = await apiFetch(`${API_URL}/register/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -99,7 +127,7 @@ const api = {
     upload: async (file) => {
         const formData = new FormData();
         formData.append('file', file);
-        const res = await fetch(`${API_URL}/upload/`, { method: 'POST', body: formData });
+        const res = await apiFetch(`${API_URL}/upload/`, { method: 'POST', body: formData });
         if (!res.ok) {
             const err = await res.text();
             throw new Error(`Upload failed (${res.status}): ${err}`);
@@ -108,13 +136,11 @@ const api = {
     },
 
     getItems: async () => {
-        const res = await fetch(`${API_URL}/items/`);
-        if (!res.ok) throw new Error("Could not fetch items");
-        return await res.json();
+        return await fetchAll('/items/');
     },
 
     createItem: async (data) => {
-        const res = await fetch(`${API_URL}/items/`, {
+        const res = await apiFetch(`${API_URL}/items/`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -34,7 +34,7 @@ function renderSidebar() {
     const menuItems = allItems.filter(item => item.roles.includes(role));
 
     // Profile Header
-    const avatarUrl = currentUser.profile_image || 'https://via.placeholder.com/70';
+    const avatarUrl = thumbUrl(currentUser.profile_image, 70) || 'https://via.placeholder.com/70';
     const profileHeader = `
         <div class="sidebar-header">
             <div class="profile-avatar" style="background-image: url('${avatarUrl}')"></div>
@@ -388,7 +388,7 @@ async function loadContractsList() {
 }
 
 window.signContract = async (id) => {
-    await fetch(`/contracts/${id}/sign?signer=${currentUser.username}`, { method: 'PUT' });
+    await apiFetch(`/contracts/${id}/sign?signer=${currentUser.username}`, { method: 'PUT' });
     Components.showFeedback("Contract Signed Successfully!");
     loadContractsList();
 };
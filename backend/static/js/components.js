@@ -98,7 +98,7 @@ const Components = {
             } else if (col.type === 'number') {
                 input = `<input class="grid-input" type="number" value="${val}" data-key="${col.key}" oninput="Components.calcGrid('${gridId}')">`;
             } else if (col.type === 'image') {
-                const url = val || '/static/img/placeholder.png'; // Fallback
+                const url = thumbUrl(val, 40) || '/static/img/placeholder.png'; // Fallback
                 input = `<img src="${url}" class="grid-thumbnail" onerror="this.src='https://via.placeholder.com/40'">`;
             } else {
                 input = `<input class="grid-input" value="${val}" data-key="${col.key}">`;
@@ -1,24 +1,38 @@
 import os
+import tempfile
 import time
+import pytest
 from fastapi.testclient import TestClient
 
-# Ensure we use a fresh database for each test run by removing any
-# existing file before importing the app (the app creates tables on import).
-ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-DB_PATH = os.path.join(ROOT, 'tender_system.db')
-if os.path.exists(DB_PATH):
-    try:
-        os.remove(DB_PATH)
-    except OSError:
-        # If removal fails, continue — tests may still run but could hit
-        # UNIQUE constraint errors; this is best-effort cleanup.
-        pass
+# Ensure we use a fresh database for each test run by pointing the app at a
+# scratch file and removing it before importing the app (the app creates
+# tables at startup).
+DB_PATH = os.path.join(tempfile.gettempdir(), 'tender_system_test.db')
+os.environ['TENDER_DATABASE_URL'] = f"sqlite:///{DB_PATH}"
+# Cheap password hashing keeps the many test logins fast
+os.environ['TENDER_PASSWORD_ITERATIONS'] = '1000'
+os.environ['TENDER_AUDIT_ARCHIVE_DIR'] = tempfile.mkdtemp(prefix='tender_audit_archive_')
+for suffix in ('', '-wal', '-shm'):
+    if os.path.exists(DB_PATH + suffix):
+        try:
+            os.remove(DB_PATH + suffix)
+        except OSError:
+            # If removal fails, continue — tests may still run but could hit
+            # UNIQUE constraint errors; this is best-effort cleanup.
+            pass
 
 from backend.main import app
 
 client = TestClient(app)
 
 
+@pytest.fixture(scope="module", autouse=True)
+def app_lifespan():
+    # Entering the client runs the lifespan hook (schema, static dirs).
+    with client:
+        yield
+
+
 def test_core_flow():
     # Create user
     user_payload = {"username": "test_user", "password": "pass", "role": "client", "email": "a@b.com", "full_name": "Test User"}
@@ -97,3 +111,974 @@ def test_core_flow():
     invoices = r.json()
     found = [inv for inv in invoices if inv['id'] == invoice['id']]
     assert found and found[0]['status'] in ('Paid', 'Partial', 'Draft')
+
+
+def test_list_pagination():
+    for i in range(5):
+        r = client.post('/items/', json={"name": f"Page Item {i}", "unit": "pcs", "rate": 1.0})
+        assert r.status_code == 200
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        r = client.get('/items/', params=params)
+        assert r.status_code == 200
+        page = r.json()
+        assert len(page) <= 2
+        seen.extend(item['id'] for item in page)
+        cursor = r.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        params['after'] = cursor
+
+    assert seen == sorted(seen)
+    assert len(seen) == len(set(seen)) >= 5
+
+    r = client.get('/items/', params={"after": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_server_side_filters():
+    stamp = int(time.time() * 1000)
+    client_user = client.post('/users/', json={"username": f"filter_client_{stamp}", "password": "p", "role": "client", "email": "c@x.com", "full_name": "Filter Client"}).json()
+    vendor_user = client.post('/users/', json={"username": f"filter_vendor_{stamp}", "password": "p", "role": "vendor", "email": "v@x.com", "full_name": "Filter Vendor"}).json()
+
+    tender = client.post('/tenders/', json={
+        "tender_id": f"T-F-{stamp}", "title": "Filter Tender", "description": "d",
+        "deadline": "2030-01-01", "delivery_timeline": "10 days", "client_id": client_user['id'],
+    }).json()
+    po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor_user['id'], "po_number": f"PO-F-{stamp}", "items": "x", "total_amount": 10.0}).json()
+    invoice = client.post('/invoices/', json={"po_id": po['id'], "amount": 10.0, "total_payable": 10.0}).json()
+
+    r = client.get('/tenders/', params={"client_id": client_user['id']})
+    assert [t['id'] for t in r.json()] == [tender['id']]
+
+    r = client.get('/invoices/', params={"client_id": client_user['id'], "exclude_status": "Paid"})
+    assert [inv['id'] for inv in r.json()] == [invoice['id']]
+    r = client.get('/invoices/', params={"vendor_id": vendor_user['id'], "status": "Paid"})
+    assert r.json() == []
+
+    r = client.get('/users/', params={"role": "vendor"})
+    assert vendor_user['id'] in [u['id'] for u in r.json()]
+    assert client_user['id'] not in [u['id'] for u in r.json()]
+
+    r = client.get('/purchase_orders/', params={"vendor_id": vendor_user['id'], "created_to": "2000-01-01T00:00:00"})
+    assert r.json() == []
+
+
+def test_route_queries_use_indexes():
+    from backend.database import SessionLocal
+    from backend.index_advisor import advise
+
+    db = SessionLocal()
+    try:
+        full_scans = {route: scans for route, _, scans in advise(db) if scans}
+    finally:
+        db.close()
+    assert full_scans == {}
+
+
+def test_dashboard_summaries():
+    stamp = int(time.time() * 1000)
+    vendor_user = client.post('/users/', json={"username": f"dash_vendor_{stamp}", "password": "p", "role": "vendor", "email": "v@x.com", "full_name": "Dash Vendor"}).json()
+    client_user = client.post('/users/', json={"username": f"dash_client_{stamp}", "password": "p", "role": "client", "email": "c@x.com", "full_name": "Dash Client"}).json()
+    tender = client.post('/tenders/', json={
+        "tender_id": f"T-D-{stamp}", "title": "Dash Tender", "description": "d",
+        "deadline": "2030-01-01", "delivery_timeline": "10 days", "client_id": client_user['id'],
+    }).json()
+    client.post('/proposals/', json={"tender_id": tender['id'], "vendor_id": vendor_user['id'], "technical_input": "t", "financial_input": 50.0})
+    po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor_user['id'], "po_number": f"PO-D-{stamp}", "items": "x", "total_amount": 50.0}).json()
+    client.post('/invoices/', json={"po_id": po['id'], "amount": 50.0, "total_payable": 55.0})
+
+    r = client.get('/dashboard/summary/vendor', params={"user_id": vendor_user['id']})
+    assert r.status_code == 200
+    assert r.json()['total_bids'] == 1
+    assert r.json()['pending_bids'] == 1
+    assert r.json()['pending_invoices'] == 1
+
+    r = client.get('/dashboard/summary/client', params={"user_id": client_user['id']})
+    assert r.json()['pending_payments'] == 55.0
+
+    r = client.get('/dashboard/summary/admin')
+    assert r.json()['total_tenders'] == len(client.get('/tenders/', params={"limit": 1000}).json())
+
+    finance = client.get('/dashboard/summary/finance').json()
+    assert finance['outstanding_balance'] >= 55.0
+    assert len(finance['recent_payments']) <= 10
+
+    assert client.get('/dashboard/summary/technical').status_code == 200
+    assert client.get('/dashboard/summary/vendor').status_code == 400
+
+
+def test_async_db_mode(monkeypatch):
+    pytest.importorskip("aiosqlite")
+    from backend import database
+    monkeypatch.setattr(database, "DB_MODE", "async")
+
+    stamp = int(time.time() * 1000)
+    r = client.post('/items/', json={"name": f"Async Item {stamp}", "unit": "pcs", "rate": 2.5})
+    assert r.status_code == 200
+    item = r.json()
+
+    r = client.get('/items/', params={"limit": 1000})
+    assert item['id'] in [i['id'] for i in r.json()]
+
+
+def test_sqlite_connection_tuning():
+    from backend.database import engine
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+
+def test_versioned_migrations(tmp_path):
+    from sqlalchemy import create_engine, inspect
+    from backend.upgrade_db import LATEST_VERSION, SchemaContext, migrate
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE tenders (id INTEGER PRIMARY KEY, tender_id VARCHAR, title VARCHAR, deadline DATETIME, status VARCHAR(23), client_id INTEGER)")
+        conn.exec_driver_sql("INSERT INTO tenders (tender_id, title, status, client_id) VALUES ('T-1', 'Old', 'OPEN', 1)")
+        # Sequential and millisecond-stamped IDs from old desktop clients
+        conn.exec_driver_sql("INSERT INTO tenders (tender_id, title, status, client_id) VALUES ('T-2001', 'Numbered', 'OPEN', 1)")
+        conn.exec_driver_sql("INSERT INTO tenders (tender_id, title, status, client_id) VALUES ('T-1767611476700', 'Stamped', 'OPEN', 1)")
+
+    applied = migrate(legacy)
+    assert [m.version for m in applied] == list(range(1, LATEST_VERSION + 1))
+    assert migrate(legacy) == []
+    with legacy.connect() as conn:
+        # Seeded past T-2001, not past the timestamp
+        assert conn.exec_driver_sql("SELECT next_value FROM id_sequences WHERE name = 'tender'").scalar() == 2002
+
+    insp = inspect(legacy)
+    assert {"budget", "image_url", "submission_method"} <= {c["name"] for c in insp.get_columns("tenders")}
+    assert "ix_tenders_client_id" in {i["name"] for i in insp.get_indexes("tenders")}
+
+    # Rebuilding keeps rows and indexes and brings the table to the model's shape
+    with legacy.begin() as conn:
+        SchemaContext(conn).rebuild_table("tenders")
+        assert conn.exec_driver_sql("SELECT title FROM tenders").scalar() == "Old"
+    insp = inspect(legacy)
+    assert "ix_tenders_client_id" in {i["name"] for i in insp.get_indexes("tenders")}
+    assert "estimated_cost" in {c["name"] for c in insp.get_columns("tenders")}
+
+
+def test_startup_report_and_skip_schema_check():
+    from backend.startup import run_startup
+
+    report = app.state.startup_report
+    names = [p["name"] for p in report.as_dict()["phases"]]
+    assert names == ["static dirs", "schema", "db connect"]
+    assert all(p["outcome"] == "ok" for p in report.as_dict()["phases"])
+
+    skipped = run_startup(skip_schema_check=True)
+    assert ("schema", 0.0, "skipped") in skipped.phases
+
+
+def test_streaming_export(monkeypatch):
+    import csv
+    import io
+    import json
+    from backend import export
+
+    monkeypatch.setattr(export, 'BATCH_SIZE', 2)
+    r = client.get('/tenders/', params={"limit": 1000})
+    tender_ids = sorted(t['id'] for t in r.json())
+
+    r = client.get('/export/tenders')
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row['id'] for row in rows] == tender_ids
+
+    r = client.get('/export/tenders', params={"format": "csv", "status": "open"})
+    assert r.status_code == 200
+    reader = list(csv.DictReader(io.StringIO(r.text)))
+    assert reader and all(row['status'] == 'open' for row in reader)
+
+    r = client.get('/export/payments', params={"format": "csv", "created_from": "2999-01-01T00:00:00"})
+    assert r.text.strip() == ','.join(c.name for c in export.models.Payment.__table__.columns)
+
+    assert client.get('/export/tenders', params={"status": "bogus"}).status_code == 400
+    assert client.get('/export/users').status_code == 404
+    assert client.get('/export/tenders', params={"format": "xml"}).status_code == 422
+
+
+def test_fast_list_path_matches_pydantic():
+    from typing import List
+    from pydantic import TypeAdapter
+    from backend import models, schemas
+    from backend.database import SessionLocal
+
+    r = client.get('/tenders/', params={"limit": 1000})
+    assert r.status_code == 200
+    db = SessionLocal()
+    try:
+        objects = db.query(models.Tender).order_by(models.Tender.id).all()
+        adapter = TypeAdapter(List[schemas.TenderSchema])
+        expected = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    finally:
+        db.close()
+    assert r.json() == expected
+
+
+def test_compression_and_msgpack_negotiation():
+    import msgpack
+    from backend import compression
+
+    for i in range(20):
+        client.post('/items/', json={"name": f"Bulk Item {i}", "unit": "pcs", "rate": 2.0})
+
+    plain = client.get('/items/', params={"limit": 1000}, headers={"Accept-Encoding": "identity"})
+    assert 'content-encoding' not in plain.headers
+    assert len(plain.content) >= compression.MIN_SIZE
+
+    r = client.get('/items/', params={"limit": 1000}, headers={"Accept-Encoding": "gzip"})
+    assert r.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in r.headers['vary']
+    assert r.json() == plain.json()
+
+    r = client.get('/items/', params={"limit": 1000}, headers={"Accept-Encoding": "gzip;q=0.5, br"})
+    assert r.headers['content-encoding'] == 'br'
+    assert r.json() == plain.json()
+
+    # Small bodies are not worth compressing
+    r = client.get('/health', headers={"Accept-Encoding": "gzip"})
+    assert 'content-encoding' not in r.headers
+
+    # Streaming responses are compressed chunk by chunk
+    r = client.get('/export/items_missing', headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 404
+    r = client.get('/export/tenders', headers={"Accept-Encoding": "gzip"})
+    assert r.headers['content-encoding'] == 'gzip'
+    assert r.text.count('\n') >= 1
+
+    r = client.get('/items/', params={"limit": 1000}, headers={"Accept": "application/msgpack"})
+    assert r.headers['content-type'] == 'application/msgpack'
+    assert msgpack.unpackb(r.content) == plain.json()
+
+
+def test_conditional_get_etags():
+    r = client.get('/items/', params={"limit": 1000})
+    etag = r.headers['etag']
+    assert etag.startswith('W/"')
+
+    r = client.get('/items/', params={"limit": 1000}, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b''
+    assert r.headers['etag'] == etag
+
+    # Different query parameters are a different representation
+    r = client.get('/items/', params={"limit": 999}, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+
+    client.post('/items/', json={"name": "ETag Item", "unit": "pcs", "rate": 3.0})
+    r = client.get('/items/', params={"limit": 1000}, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers['etag'] != etag
+
+    tender = client.get('/tenders/', params={"limit": 1}).json()[0]
+    r = client.get(f"/tenders/{tender['id']}")
+    detail_etag = r.headers['etag']
+    assert client.get(f"/tenders/{tender['id']}", headers={"If-None-Match": detail_etag}).status_code == 304
+    client.put(f"/tenders/{tender['id']}/status", params={"status": tender['status']})
+    assert client.get(f"/tenders/{tender['id']}", headers={"If-None-Match": detail_etag}).status_code == 200
+
+
+def test_delta_sync_changes_feed():
+    from backend import models
+    from backend.database import SessionLocal
+
+    r = client.get('/changes', params={"since": 0, "limit": 5000})
+    assert r.status_code == 200
+    feed = r.json()
+    assert not feed['more']
+    since = feed['next']
+    assert feed['changes']['tenders']
+    assert all(row['change_seq'] <= since for rows in feed['changes'].values() for row in rows)
+
+    # Nothing new: an empty delta that keeps the position
+    feed = client.get('/changes', params={"since": since}).json()
+    assert feed['next'] == since
+    assert not any(feed['changes'].values()) and feed['deleted'] == []
+
+    tender = client.get('/tenders/', params={"limit": 1}).json()[0]
+    client.put(f"/tenders/{tender['id']}/status", params={"status": "under_review"})
+    feed = client.get('/changes', params={"since": since}).json()
+    assert [t['id'] for t in feed['changes']['tenders']] == [tender['id']]
+    assert feed['changes']['tenders'][0]['status'] == 'under_review'
+    assert feed['changes']['tenders'][0]['updated_at']
+    since = feed['next']
+
+    # Deletes leave a tombstone
+    db = SessionLocal()
+    try:
+        milestone = models.Milestone(tender_id=tender['id'], title="M", description="d")
+        db.add(milestone)
+        db.commit()
+        milestone_id = milestone.id
+        db.delete(milestone)
+        db.commit()
+    finally:
+        db.close()
+    feed = client.get('/changes', params={"since": since}).json()
+    assert feed['changes']['milestones'] == []
+    assert feed['deleted'] == [{"entity": "milestones", "id": milestone_id, "change_seq": feed['next']}]
+
+    # Paging through with a small limit yields every change exactly once
+    seen, position = [], 0
+    while True:
+        feed = client.get('/changes', params={"since": position, "limit": 3}).json()
+        page = [r['change_seq'] for rows in feed['changes'].values() for r in rows]
+        page += [d['change_seq'] for d in feed['deleted']]
+        assert len(page) <= 3 and all(position < seq <= feed['next'] for seq in page)
+        seen.extend(page)
+        position = feed['next']
+        if not feed['more']:
+            break
+    assert len(seen) == len(set(seen))
+    assert position == since + 2  # the milestone insert and its delete
+
+
+def test_changes_feed_scoped_to_caller():
+    stamp = int(time.time() * 1000)
+    owner = client.post('/users/', json={"username": f"sync_client_{stamp}", "password": "p", "role": "client", "email": "c@x", "full_name": "C"}).json()
+    bidder = client.post('/users/', json={"username": f"sync_bidder_{stamp}", "password": "p", "role": "vendor", "email": "b@x", "full_name": "B"}).json()
+    rival = client.post('/users/', json={"username": f"sync_rival_{stamp}", "password": "p", "role": "vendor", "email": "r@x", "full_name": "R"}).json()
+    tender = client.post('/tenders/', json={"title": "Synced", "description": "d", "deadline": "2030-01-01",
+                                            "delivery_timeline": "1 day", "client_id": owner['id']}).json()
+    own = client.post('/proposals/', json={"tender_id": tender['id'], "vendor_id": bidder['id'], "technical_input": "t", "financial_input": 10.0}).json()
+    theirs = client.post('/proposals/', json={"tender_id": tender['id'], "vendor_id": rival['id'], "technical_input": "t", "financial_input": 12.0}).json()
+
+    def feed_for(username):
+        token = client.post('/login/', json={'username': username, 'password': 'p'}).json()['token']
+        return client.get('/changes', params={"since": 0, "limit": 5000}, headers={"Authorization": f"Bearer {token}"}).json()
+
+    feed = feed_for(f"sync_bidder_{stamp}")
+    assert [p['id'] for p in feed['changes']['proposals']] == [own['id']]
+    assert feed['changes']['approval_workflows'] == []
+    assert tender['id'] in [t['id'] for t in feed['changes']['tenders']]
+
+    feed = feed_for(f"sync_client_{stamp}")
+    assert [t['id'] for t in feed['changes']['tenders']] == [tender['id']]
+    assert {p['id'] for p in feed['changes']['proposals']} == {own['id'], theirs['id']}
+
+    # Callers without a role scope still get everything
+    assert len(client.get('/changes', params={"since": 0, "limit": 5000}).json()['changes']['proposals']) > 2
+
+
+def test_websocket_change_events():
+    from backend import models
+    from backend.notifications import Subscriber
+
+    finance = client.post('/users/', json={"username": "ws_finance", "password": "p", "role": "finance", "email": "f@x", "full_name": "F"}).json()
+    owner = client.post('/users/', json={"username": "ws_client", "password": "p", "role": "client", "email": "c@x", "full_name": "C"}).json()
+
+    def token(username):
+        return client.post('/login/', json={'username': username, 'password': 'p'}).json()['token']
+
+    with client.websocket_connect(f"/ws/events?token={token('ws_finance')}") as finance_ws, \
+            client.websocket_connect(f"/ws/events?token={token('ws_client')}") as owner_ws:
+        tender = client.post('/tenders/', json={
+            "tender_id": f"WS-{time.time_ns()}", "title": "Live", "description": "d", "budget": 1.0,
+            "deadline": "2030-01-01", "estimated_cost": 1.0, "delivery_timeline": "1 day",
+            "client_id": owner['id'],
+        }).json()
+        for ws in (finance_ws, owner_ws):
+            event = ws.receive_json()
+            assert (event['type'], event['entity'], event['op'], event['id']) == ('change', 'tenders', 'insert', tender['id'])
+            assert event['row']['title'] == 'Live'
+
+        client.put(f"/tenders/{tender['id']}/status", params={"status": "under_review"})
+        event = owner_ws.receive_json()
+        assert (event['op'], event['row']['status']) == ('update', 'under_review')
+
+    # As in /changes, a vendor holding an order on the tender hears about its contract
+    vendor = client.post('/users/', json={"username": f"ws_vendor_{time.time_ns()}", "password": "p", "role": "vendor", "email": "v@x", "full_name": "V"}).json()
+    with client.websocket_connect(f"/ws/events?token={token(vendor['username'])}") as vendor_ws:
+        po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "items": "x", "total_amount": 1.0}).json()
+        contract = client.post('/contracts/', json={"tender_id": tender['id'], "content": "c", "scope_of_work": "s",
+                                                    "start_date": "2030-01-01T00:00:00", "end_date": "2030-02-01T00:00:00"}).json()
+        assert [(e['entity'], e['id']) for e in (vendor_ws.receive_json(), vendor_ws.receive_json())] == [
+            ('purchase_orders', po['id']), ('contracts', contract['id'])]
+
+    # A socket without a session token is refused, whatever it claims to be
+    from starlette.websockets import WebSocketDisconnect
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/ws/events?user_id={owner['id']}&role=client") as ws:
+            ws.receive_json()
+
+    envelope = {"client_id": 1, "vendor_ids": (2, 5), "all_vendors": False}
+    assert Subscriber(1, models.UserRole.CLIENT).wants(envelope)
+    assert not Subscriber(3, models.UserRole.CLIENT).wants(envelope)
+    assert Subscriber(2, models.UserRole.VENDOR).wants(envelope)
+    assert Subscriber(5, models.UserRole.VENDOR).wants(envelope)
+    assert not Subscriber(4, models.UserRole.VENDOR).wants(envelope)
+    assert Subscriber(4, models.UserRole.VENDOR).wants(dict(envelope, all_vendors=True))
+    assert Subscriber(9, models.UserRole.FINANCE).wants(envelope)
+    # Staff-only rows (approval workflows)
+    assert not Subscriber(1, models.UserRole.CLIENT).wants({"client_id": None, "vendor_ids": (), "all_vendors": False})
+
+
+def test_id_sequence_allocation():
+    import threading
+    from backend.sequences import SequenceAllocator
+
+    client_user = client.post('/users/', json={"username": "seq_client", "password": "p", "role": "client", "email": "s@x", "full_name": "S"}).json()
+    payload = {"title": "Seq", "description": "d", "budget": 1.0, "deadline": "2030-01-01",
+               "estimated_cost": 1.0, "delivery_timeline": "1 day", "client_id": client_user['id']}
+    first = client.post('/tenders/', json=payload).json()['tender_id']
+    second = client.post('/tenders/', json=payload).json()['tender_id']
+    assert first.startswith('T-') and int(second[2:]) == int(first[2:]) + 1
+
+    # Two "workers" with tiny blocks, hammered from several threads each
+    workers = [SequenceAllocator(block_size=3), SequenceAllocator(block_size=3)]
+    issued = []
+    lock = threading.Lock()
+
+    def take(allocator):
+        ids = [allocator.next_id("po") for _ in range(25)]
+        with lock:
+            issued.extend(ids)
+
+    threads = [threading.Thread(target=take, args=(w,)) for w in workers for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(issued) == len(set(issued)) == 150
+
+
+def test_id_reservation_off_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+    from sqlalchemy.util.concurrency import greenlet_spawn
+    from backend import sequences
+
+    reserved_on = []
+
+    def reserve_block(engine, name, size):
+        reserved_on.append(threading.get_ident())
+        return 7
+
+    monkeypatch.setattr(sequences, "reserve_block", reserve_block)
+
+    async def main():
+        # An async-mode route body runs like this, via AsyncSession.run_sync
+        return await greenlet_spawn(sequences.SequenceAllocator(block_size=2).next_id, "po"), threading.get_ident()
+
+    po_number, loop_thread = asyncio.run(main())
+    assert po_number == "PO-000007" and reserved_on and loop_thread not in reserved_on
+
+
+def test_bulk_create_and_update():
+    rows = [{"name": f"Catalog {i}", "unit": "pcs", "rate": float(i)} for i in range(300)]
+    rows.insert(5, {"name": "Broken", "unit": "pcs", "rate": "not-a-number"})
+    r = client.post('/items/bulk', json=rows)
+    assert r.status_code == 200
+    body = r.json()
+    assert body['created'] == 300
+    assert [e['index'] for e in body['errors']] == [5]
+    assert body['errors'][0]['errors'][0]['loc'] == ['rate']
+    ids = [res['id'] for res in body['results']]
+    assert ids == sorted(ids) and len(set(ids)) == 300
+
+    # atomic batches are all-or-nothing
+    r = client.post('/items/bulk', params={"atomic": "true"}, json=[{"name": "x", "unit": "u", "rate": 1}, {"name": "y"}])
+    assert r.status_code == 422
+    assert client.get('/items/', params={"limit": 1000}).json()[-1]['id'] == ids[-1]
+
+    owner = client.post('/users/', json={"username": "bulk_client", "password": "p", "role": "client", "email": "b@x", "full_name": "B"}).json()
+    tender = {"title": "Bulk", "description": "d", "deadline": "2030-01-01", "delivery_timeline": "1 day", "client_id": owner['id']}
+    since = client.get('/changes', params={"since": 0, "limit": 5000}).json()['next']
+    r = client.post('/tenders/bulk', json=[tender, dict(tender, client_id=999999), dict(tender, tender_id="BULK-DUP"), dict(tender, tender_id="BULK-DUP")])
+    body = r.json()
+    assert body['created'] == 2
+    assert {e['index'] for e in body['errors']} == {1, 3}
+    created = [res['id'] for res in body['results']]
+
+    r = client.patch('/tenders/bulk', json=[{"id": created[0], "title": "Renamed"}, {"id": 999999, "title": "Nope"}])
+    assert r.json()['updated'] == 1
+    assert r.json()['errors'][0]['index'] == 1
+    assert client.get(f"/tenders/{created[0]}").json()['title'] == 'Renamed'
+
+    # Updates are checked like creates, field by field
+    for change, field in [({"tender_id": "BULK-DUP"}, "tender_id"), ({"title": None}, "title"),
+                          ({"client_id": 999999}, "client_id"), ({"colour": "red"}, "colour")]:
+        body = client.patch('/tenders/bulk', json=[dict(change, id=created[0])]).json()
+        assert body['updated'] == 0 and body['errors'][0]['errors'][0]['loc'] == [field]
+    assert client.get(f"/tenders/{created[0]}").json()['title'] == 'Renamed'
+    # A row may keep its own unique value
+    body = client.patch('/tenders/bulk', json=[{"id": created[1], "tender_id": "BULK-DUP", "title": "Kept"}]).json()
+    assert body == {"updated": 1, "errors": []}
+
+    # Bulk writes keep delta sync current
+    feed = client.get('/changes', params={"since": since}).json()
+    assert {t['id'] for t in feed['changes']['tenders']} == set(created)
+
+
+def test_content_addressed_uploads(monkeypatch, tmp_path):
+    import hashlib
+    from backend import uploads
+    monkeypatch.setattr(uploads, "STORE_DIR", str(tmp_path / "objects"))
+    monkeypatch.setattr(uploads, "PARTIAL_DIR", str(tmp_path / "partial"))
+
+    data = b"%PDF-1.4 proposal " * 5000
+    sha = hashlib.sha256(data).hexdigest()
+    first = client.post('/upload/', files={"file": ("tech.pdf", data, "application/pdf")}).json()
+    second = client.post('/upload/', files={"file": ("copy.pdf", data, "application/pdf")}).json()
+    assert first['url'] == second['url'] == f"/files/{sha}"
+    assert len(list((tmp_path / "objects").rglob("*"))) == 2  # one shard dir, one file
+
+    r = client.get(first['url'], headers={"Range": "bytes=0-7"})
+    assert r.status_code == 206 and r.content == b"%PDF-1.4"
+    assert r.headers['content-type'] == 'application/pdf'
+    assert 'immutable' in r.headers['cache-control']
+
+    # Resumable: interrupted after the first chunk, resumed at the reported offset
+    big = os.urandom(300_000)
+    session = client.post('/uploads/', json={"filename": "scan.png", "size": len(big)}).json()
+    upload = f"/uploads/{session['upload_id']}"
+    assert client.put(upload, params={"offset": 0}, content=big[:100_000]).status_code == 200
+    r = client.put(upload, params={"offset": 0}, content=big[:100_000])
+    assert r.status_code == 409 and r.headers['upload-offset'] == '100000'
+    uploads._writers.clear()  # as if resumed in another worker
+    offset = client.get(upload).json()['offset']
+    client.put(upload, params={"offset": offset}, content=big[offset:])
+    done = client.post(f"{upload}/complete").json()
+    assert done['sha256'] == hashlib.sha256(big).hexdigest()
+    assert done['content_type'] == 'image/png'
+    assert client.get(done['url']).content == big
+    assert client.get(upload).status_code == 404
+
+    # Delivery proof is attached to a milestone by URL, the other fields kept
+    tender = client.get('/tenders/', params={"limit": 1}).json()[0]
+    milestone = client.post('/milestones/', json={"tender_id": tender['id'], "title": "Dispatch", "description": "d"}).json()
+    r = client.put(f"/milestones/{milestone['id']}", json={"proof_url": done['url'], "status": "In Progress"})
+    assert r.status_code == 200
+    assert (r.json()['proof_url'], r.json()['title']) == (done['url'], "Dispatch")
+
+    # Size limits
+    assert client.post('/uploads/', json={"size": uploads.MAX_UPLOAD_BYTES + 1}).status_code == 413
+    small = client.post('/uploads/', json={"size": 10}).json()
+    assert client.put(f"/uploads/{small['upload_id']}", params={"offset": 0}, content=b"x" * 11).status_code == 413
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 1000)
+    assert client.post('/upload/', files={"file": ("big.bin", b"x" * 1001)}).status_code == 413
+    assert not list((tmp_path / "partial").glob("direct-*"))
+
+
+def test_image_thumbnails(monkeypatch, tmp_path):
+    PIL = pytest.importorskip("PIL.Image")
+    import io
+    from backend import thumbnails, uploads
+    monkeypatch.setattr(uploads, "STORE_DIR", str(tmp_path / "objects"))
+    monkeypatch.setattr(uploads, "PARTIAL_DIR", str(tmp_path / "partial"))
+    monkeypatch.setattr(thumbnails, "cache", thumbnails.ThumbnailCache(str(tmp_path / "thumbs"), max_bytes=10_000))
+
+    def image_url(color):
+        buf = io.BytesIO()
+        PIL.new("RGB", (1200, 800), color).save(buf, "JPEG")
+        return client.post('/upload/', files={"file": ("photo.jpg", buf.getvalue(), "image/jpeg")}).json()['url']
+
+    url = image_url("red")
+    r = client.get('/thumbnails/100', params={"src": url})
+    assert r.status_code == 200 and r.headers['content-type'] == 'image/jpeg'
+    assert 'immutable' in r.headers['cache-control']
+    assert PIL.open(io.BytesIO(r.content)).size == (128, 85)  # rounded up to the 128 bucket
+    assert client.get('/thumbnails/100', params={"src": url}, headers={"Range": "bytes=0-1"}).status_code == 206
+
+    assert client.get('/thumbnails/64', params={"src": "/static/uploads/../../main.py"}).status_code == 404
+    not_image = client.post('/upload/', files={"file": ("notes.txt", b"plain text")}).json()['url']
+    assert client.get('/thumbnails/64', params={"src": not_image}).status_code == 415
+
+    # The least recently used derivatives go once the cache is over its cap
+    for color in ("green", "blue", "white", "black", "yellow", "purple"):
+        client.get('/thumbnails/512', params={"src": image_url(color)})
+    sizes = [f.stat().st_size for f in (tmp_path / "thumbs").rglob("*.jpg")]
+    assert sum(sizes) <= 10_000 and len(sizes) < 7
+
+
+def test_session_tokens_and_scoping(monkeypatch):
+    from sqlalchemy import event
+    from backend import auth, database
+
+    alice = client.post('/users/', json={"username": "tok_alice", "password": "s3cret", "role": "client", "email": "a@x", "full_name": "A"}).json()
+    bob = client.post('/users/', json={"username": "tok_bob", "password": "pw", "role": "client", "email": "b@x", "full_name": "B"}).json()
+    with database.engine.connect() as conn:
+        stored = conn.exec_driver_sql("SELECT password FROM users WHERE id = ?", (alice['id'],)).scalar()
+        assert stored.startswith("pbkdf2_sha256$1000$") and "s3cret" not in stored
+        # A plaintext password from before hashing still logs in, and is upgraded
+        conn.exec_driver_sql("UPDATE users SET password = 'pw' WHERE id = ?", (bob['id'],))
+        conn.commit()
+    assert client.post('/login/', json={"username": "tok_bob", "password": "wrong"}).status_code == 401
+    assert client.post('/login/', json={"username": "tok_bob", "password": "pw"}).status_code == 200
+    with database.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT password FROM users WHERE id = ?", (bob['id'],)).scalar().startswith("pbkdf2_sha256$")
+
+    session = client.post('/login/', json={"username": "tok_alice", "password": "s3cret"}).json()
+    headers = {"Authorization": f"Bearer {session['token']}"}
+    client.post('/tenders/', json={"title": "Mine", "description": "d", "deadline": "2030-01-01",
+                                   "delivery_timeline": "1 day", "client_id": alice['id']})
+
+    # Authenticated requests are served from the cache without reading users
+    user_queries = []
+    def count(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            user_queries.append(statement)
+    event.listen(database.engine, "before_cursor_execute", count)
+    try:
+        for _ in range(3):
+            mine = client.get('/tenders/', headers=headers).json()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+    assert len(user_queries) <= 1
+    assert mine and {t['client_id'] for t in mine} == {alice['id']}
+    assert client.get('/tenders/', params={"client_id": bob['id']}, headers=headers).status_code == 403
+
+    # Self-registration cannot hand out staff roles
+    signup = {"username": f"signup_{time.time_ns()}", "password": "p", "email": "s@x", "full_name": "S"}
+    assert client.post('/register/', json=dict(signup, role="admin")).status_code == 403
+    assert client.post('/users/', json=dict(signup, role="finance"), headers=headers).status_code == 403
+    assert client.post('/register/', json=dict(signup, role="vendor")).json()['role'] == "vendor"
+
+    assert client.get('/tenders/', headers={"Authorization": "Bearer forged.token"}).status_code == 401
+    monkeypatch.setattr(auth, "REQUIRE_AUTH", True)
+    assert client.get('/tenders/').status_code == 401
+    assert client.get('/tenders/', headers=headers).status_code == 200
+    assert client.get('/health').status_code == 200
+
+
+def test_automatic_audit_capture():
+    import asyncio
+    import datetime
+    from backend.audit import AuditWriter
+
+    user = client.post('/users/', json={"username": "audited", "password": "p", "role": "client", "email": "au@x", "full_name": "Au"}).json()
+    headers = {"Authorization": f"Bearer {client.post('/login/', json={'username': 'audited', 'password': 'p'}).json()['token']}"}
+    tender = client.post('/tenders/', headers=headers, json={"title": "Audited", "description": "d", "deadline": "2030-01-01",
+                                                              "delivery_timeline": "1 day", "client_id": user['id']}).json()
+    client.put(f"/tenders/{tender['id']}/status", params={"status": "under_review"}, headers=headers)
+
+    # Written by the background task, not by the requests themselves
+    deadline = time.time() + 5
+    while True:
+        logs = [l for l in client.get('/audit_logs/').json() if l['entity_type'] == 'tenders' and l['entity_id'] == tender['id']]
+        if len(logs) == 2 or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert {l['action'] for l in logs} == {"POST /tenders/", "PUT /tenders/{tender_id}/status"}
+    assert {l['user_id'] for l in logs} == {user['id']}
+    assert {l['status_code'] for l in logs} == {200}
+    stats = client.get('/audit_logs/writer').json()
+    assert stats['running'] and stats['batches'] >= 1
+
+    # A full queue makes submitters wait instead of dropping entries
+    async def flood():
+        writer = AuditWriter(queue_size=2, batch_size=10, flush_interval=0.01)
+        writer.start()
+        row = {"action": "TEST", "entity_type": "test", "timestamp": datetime.datetime.utcnow()}
+        await asyncio.gather(*(writer.submit(dict(row)) for _ in range(50)))
+        await writer.stop()
+        return writer.stats()
+    stats = asyncio.run(flood())
+    assert stats['written'] == 50 and stats['backpressure_waits'] > 0 and stats['batches'] < 50
+
+
+def test_audit_log_query():
+    tender = client.post('/tenders/', json={"title": "Searched", "description": "d", "deadline": "2030-01-01",
+                                            "delivery_timeline": "1 day", "client_id": 1}).json()
+    client.put(f"/tenders/{tender['id']}/status", params={"status": "under_review"})
+    for _ in range(25):
+        client.post('/audit_logs/', json={"action": "MANUAL check", "entity_type": "query_test", "entity_id": 7})
+
+    # Cursor paging walks back through every entry, newest first, no repeats
+    seen, cursor = [], None
+    while True:
+        params = {"entity_type": "query_test", "entity_id": 7, "limit": 10}
+        if cursor:
+            params["after"] = cursor
+        r = client.get('/audit_logs/', params=params)
+        assert r.status_code == 200
+        seen += r.json()
+        cursor = r.headers.get('x-next-cursor')
+        if not cursor:
+            break
+    assert len(seen) == 25 and len({l['id'] for l in seen}) == 25
+    keys = [(l['timestamp'], l['id']) for l in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    # Full-text search over the action and path, last word as a prefix
+    deadline = time.time() + 5
+    while True:
+        hits = client.get('/audit_logs/', params={"q": "tenders stat", "entity_id": tender['id']}).json()
+        if hits or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert [l['action'] for l in hits] == ["PUT /tenders/{tender_id}/status"]
+    assert client.get('/audit_logs/', params={"q": "nosuchword"}).json() == []
+    assert client.get('/audit_logs/', params={"after": "garbage"}).status_code == 400
+
+    client.post('/users/', json={"username": "audit_reader", "password": "p", "role": "vendor", "email": "ar@x", "full_name": "Ar"})
+    token = client.post('/login/', json={'username': 'audit_reader', 'password': 'p'}).json()['token']
+    assert client.get('/audit_logs/', headers={"Authorization": f"Bearer {token}"}).status_code == 403
+    assert client.get('/audit_logs/writer', headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+
+def test_audit_archive_compaction():
+    import datetime
+    from backend import models
+    from backend.audit import write_batch
+    from backend.database import SessionLocal
+
+    def entries(month, count):
+        start = datetime.datetime(2024, month, 1)
+        return [{"action": "ARCHIVED entry", "entity_type": "archive_test", "entity_id": month,
+                 "path": f"/archive/{month}", "timestamp": start + datetime.timedelta(hours=i)} for i in range(count)]
+
+    write_batch(entries(1, 12) + entries(2, 8))
+    r = client.post('/audit_logs/archive')
+    assert r.status_code == 200
+    assert [(m['month'], m['rows']) for m in r.json()] == [("2024-01", 12), ("2024-02", 8)]
+    assert [m['month'] for m in client.get('/audit_logs/archive').json()] == ["2024-02", "2024-01"]
+    db = SessionLocal()
+    try:
+        assert db.query(models.AuditLog).filter_by(entity_type="archive_test").count() == 0
+    finally:
+        db.close()
+
+    # A late entry for an archived month stays hot until the next run merges it
+    write_batch(entries(1, 13)[12:])
+    seen, cursor = [], None
+    while True:
+        params = {"entity_type": "archive_test", "limit": 7}
+        if cursor:
+            params["after"] = cursor
+        r = client.get('/audit_logs/', params=params)
+        seen += r.json()
+        cursor = r.headers.get('x-next-cursor')
+        if not cursor:
+            break
+    assert len(seen) == 21 and len({l['id'] for l in seen}) == 21
+    keys = [(l['timestamp'], l['id']) for l in seen]
+    assert keys == sorted(keys, reverse=True)
+
+    assert [m['rows'] for m in client.post('/audit_logs/archive').json()] == [1]
+    january = client.get('/audit_logs/', params={"entity_type": "archive_test", "created_from": "2024-01-01T00:00:00",
+                                                 "created_to": "2024-02-01T00:00:00"}).json()
+    assert len(january) == 13
+    hits = client.get('/audit_logs/', params={"q": "archive 2", "entity_type": "archive_test"}).json()
+    assert len(hits) == 8 and {l['entity_id'] for l in hits} == {2}
+
+
+def test_full_text_search():
+    stamp = int(time.time() * 1000)
+    vendor = client.post('/users/', json={"username": f"fts_vendor_{stamp}", "password": "p", "role": "vendor", "email": "v@x", "full_name": "V"}).json()
+    other = client.post('/users/', json={"username": f"fts_other_{stamp}", "password": "p", "role": "vendor", "email": "o@x", "full_name": "O"}).json()
+    titled = client.post('/tenders/', json={"title": "Hydraulic excavator rental", "description": "Earthmoving for the canal",
+                                            "deadline": "2030-01-01", "delivery_timeline": "1 day", "client_id": 1}).json()
+    described = client.post('/tenders/', json={"title": "Site works", "description": "Needs one hydraulic press",
+                                               "deadline": "2030-01-01", "delivery_timeline": "1 day", "client_id": 1}).json()
+    client.post('/items/', json={"name": "Hydraulic hose", "unit": "pcs", "rate": 3.0, "description": "Rubber"})
+    own = client.post('/proposals/', json={"tender_id": titled['id'], "vendor_id": vendor['id'], "technical_input": "Two hydraulic units on site", "financial_input": 10.0}).json()
+    client.post('/proposals/', json={"tender_id": titled['id'], "vendor_id": other['id'], "technical_input": "Hydraulic backup fleet", "financial_input": 12.0})
+
+    hits = client.get('/search', params={"q": "hydrau"}).json()
+    assert {(h['entity'], h['label']) for h in hits} >= {("tenders", "Hydraulic excavator rental"), ("items", "Hydraulic hose")}
+    tenders = [h for h in hits if h['entity'] == 'tenders']
+    # A title match outranks a description match
+    assert [h['id'] for h in tenders] == [titled['id'], described['id']]
+    assert "«Hydraulic»" in tenders[0]['snippet']
+
+    only_tenders = client.get('/search', params={"q": "canal", "entity": "tenders"}).json()
+    assert [h['id'] for h in only_tenders] == [titled['id']]
+    assert client.get('/search', params={"q": "?!"}).json() == []
+
+    # Vendors only find their own proposals
+    token = client.post('/login/', json={'username': f"fts_vendor_{stamp}", 'password': 'p'}).json()['token']
+    mine = client.get('/search', params={"q": "hydraulic", "entity": "proposals"}, headers={"Authorization": f"Bearer {token}"}).json()
+    assert len(mine) == 1 and "units" in mine[0]['snippet']
+
+    # List routes take the same text filter; edits are reindexed by triggers
+    assert [t['id'] for t in client.get('/tenders/', params={"q": "press"}).json()] == [described['id']]
+    from backend import models
+    from backend.database import SessionLocal
+    db = SessionLocal()
+    try:
+        db.query(models.Proposal).filter_by(id=own['id']).update({"technical_input": "Two cranes on site"})
+        db.commit()
+    finally:
+        db.close()
+    assert [h['id'] for h in client.get('/search', params={"q": "cranes", "entity": "proposals"}).json()] == [own['id']]
+    assert own['id'] not in [h['id'] for h in client.get('/search', params={"q": "hydraulic", "entity": "proposals"}).json()]
+    assert [i['name'] for i in client.get('/items/', params={"q": "hose"}).json()] == ["Hydraulic hose"]
+
+
+def test_lookup_typeahead():
+    stamp = int(time.time() * 1000)
+    acme = client.post('/users/', json={"username": f"acme_{stamp}", "password": "p", "role": "vendor", "email": "a@x", "full_name": "Acme Supplies"}).json()
+    client.post('/users/', json={"username": f"lookup_client_{stamp}", "password": "p", "role": "client", "email": "c@x", "full_name": "Acme Client"})
+    tender = client.post('/tenders/', json={"title": "Turbine overhaul", "description": "d", "deadline": "2030-01-01",
+                                            "delivery_timeline": "1 day", "client_id": 1}).json()
+    po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": acme['id'], "items": "x", "total_amount": 1.0}).json()
+
+    by_code = client.get('/lookup/tenders', params={"q": tender['tender_id'].lower()}).json()
+    assert by_code[0] == {"id": tender['id'], "label": f"{tender['tender_id']} - Turbine overhaul"}
+    assert tender['id'] in [o['id'] for o in client.get('/lookup/tenders', params={"q": tender['tender_id'][2:]}).json()]
+    assert [o['id'] for o in client.get('/lookup/tenders', params={"q": "turbi"}).json()] == [tender['id']]
+
+    # Vendors by username or case-insensitive name prefix; other roles never match
+    vendors = client.get('/lookup/vendors', params={"q": "acme s"}).json()
+    assert vendors == [{"id": acme['id'], "label": f"Acme Supplies (acme_{stamp})"}]
+    assert [o['id'] for o in client.get('/lookup/vendors', params={"q": "acme"}).json()] == [acme['id']]
+
+    assert [o['id'] for o in client.get('/lookup/purchase_orders', params={"q": po['po_number']}).json()] == [po['id']]
+    # A bare number finds the zero-padded PO number
+    assert po['id'] in [o['id'] for o in client.get('/lookup/purchase_orders', params={"q": str(int(po['po_number'][3:]))}).json()]
+    assert len(client.get('/lookup/tenders', params={"limit": 2}).json()) == 2
+    assert client.get('/lookup/contracts').status_code == 422
+
+
+def test_proposal_ranking():
+    stamp = int(time.time() * 1000)
+    vendors = [client.post('/users/', json={"username": f"rank_v{i}_{stamp}", "password": "p", "role": "vendor", "email": "v@x", "full_name": f"V{i}"}).json()
+               for i in range(4)]
+    tender = client.post('/tenders/', json={"title": "Ranked", "description": "d", "deadline": "2030-01-01", "delivery_timeline": "1 day",
+                                            "client_id": 1, "estimated_cost": 100.0}).json()
+    bids = [(80.0, 100.0), (90.0, 120.0), (40.0, 90.0), (95.0, 200.0)]  # (technical score, bid)
+    proposals = []
+    for vendor, (tech, bid) in zip(vendors, bids):
+        p = client.post('/proposals/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "technical_input": "t", "financial_input": bid}).json()
+        client.put(f"/proposals/{p['id']}", json={"technical_score": tech})
+        proposals.append(p['id'])
+
+    r = client.get(f"/tenders/{tender['id']}/ranking", params={"min_technical": 50, "top_k": 2})
+    assert r.status_code == 200
+    ranking = r.json()
+    # The 40-point proposal is not qualified, so L1 is the 100.0 bid
+    assert ranking['lowest_bid'] == 100.0 and ranking['bids'] == 4 and ranking['qualified'] == 3
+    by_id = {e['proposal_id']: e for e in ranking['proposals']}
+    assert by_id[proposals[0]]['financial_score'] == 100.0 and by_id[proposals[0]]['l1_position'] == 1
+    assert by_id[proposals[1]]['combined_score'] == round(0.7 * 90 + 0.3 * 100 * 100 / 120, 4)
+    assert by_id[proposals[2]]['qualified'] is False and by_id[proposals[2]]['h1_position'] is None
+    assert by_id[proposals[3]]['vs_estimate'] == 100.0
+    assert [e['proposal_id'] for e in ranking['recommended']] == [proposals[1], proposals[0]]
+    assert [e['h1_position'] for e in ranking['proposals']] == [1, 2, 3, None]
+
+    # A heavier financial weight puts the cheapest bid first
+    cheap_first = client.get(f"/tenders/{tender['id']}/ranking", params={"tech_weight": 0.2, "min_technical": 50}).json()
+    assert cheap_first['recommended'][0]['proposal_id'] == proposals[0]
+
+    # Batch mode over every tender under review
+    client.put(f"/tenders/{tender['id']}/status", params={"status": "under_review"})
+    batch = client.get('/rankings', params={"min_technical": 50, "top_k": 1}).json()
+    mine = [t for t in batch if t['tender_id'] == tender['id']]
+    assert len(mine) == 1 and "proposals" not in mine[0]
+    assert [e['proposal_id'] for e in mine[0]['recommended']] == [proposals[1]]
+
+    token = client.post('/login/', json={'username': f"rank_v0_{stamp}", 'password': 'p'}).json()['token']
+    assert client.get(f"/tenders/{tender['id']}/ranking", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+
+def test_finance_records_scoped_to_caller():
+    import json
+    stamp = int(time.time() * 1000)
+    owner = client.post('/users/', json={"username": f"scope_client_{stamp}", "password": "p", "role": "client", "email": "c@x", "full_name": "C"}).json()
+    vendors = [client.post('/users/', json={"username": f"scope_v{i}_{stamp}", "password": "p", "role": "vendor", "email": "v@x", "full_name": "V"}).json()
+               for i in range(2)]
+    tender = client.post('/tenders/', json={"title": "Scoped", "description": "d", "deadline": "2030-01-01",
+                                            "delivery_timeline": "1 day", "client_id": owner['id']}).json()
+    contract = client.post('/contracts/', json={"tender_id": tender['id'], "content": "c", "scope_of_work": "s",
+                                                "start_date": "2030-01-01T00:00:00", "end_date": "2030-02-01T00:00:00"}).json()
+    payments = []
+    for vendor in vendors:
+        po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "items": "x", "total_amount": 5.0}).json()
+        invoice = client.post('/invoices/', json={"po_id": po['id'], "amount": 5.0, "total_payable": 5.0}).json()
+        payments.append(client.post('/payments/', json={"invoice_id": invoice['id'], "amount_paid": 5.0, "payment_mode": "wire"}).json()['id'])
+    client.post('/users/', json={"username": f"scope_out_{stamp}", "password": "p", "role": "vendor", "email": "o@x", "full_name": "O"}).json()
+
+    def get(path, username, **params):
+        token = client.post('/login/', json={'username': username, 'password': 'p'}).json()['token']
+        return client.get(path, params=dict(params, limit=1000), headers={"Authorization": f"Bearer {token}"})
+
+    assert [p['id'] for p in get('/payments/', f"scope_v0_{stamp}").json()] == [payments[0]]
+    assert {p['id'] for p in get('/payments/', f"scope_client_{stamp}").json()} == set(payments)
+    exported = [json.loads(line) for line in get('/export/payments', f"scope_v1_{stamp}").text.splitlines()]
+    assert [row['id'] for row in exported] == [payments[1]]
+
+    # Contracts and milestones follow the tender: its client, and vendors holding an order on it
+    assert contract['id'] in [c['id'] for c in get('/contracts/', f"scope_v0_{stamp}").json()]
+    assert get('/contracts/', f"scope_out_{stamp}").json() == []
+    milestone = client.post('/milestones/', json={"tender_id": tender['id'], "title": "M", "description": "d"}).json()
+    assert [m['id'] for m in get(f"/tenders/{tender['id']}/milestones", f"scope_client_{stamp}").json()] == [milestone['id']]
+    assert get(f"/tenders/{tender['id']}/milestones", f"scope_out_{stamp}").json() == []
+
+
+def test_list_routes_hide_other_clients_records():
+    stamp = int(time.time() * 1000)
+    a, b = [client.post('/users/', json={"username": f"iso_{n}_{stamp}", "password": "p", "role": "client", "email": "c@x", "full_name": n}).json()
+            for n in ("a", "b")]
+    vendor = client.post('/users/', json={"username": f"iso_v_{stamp}", "password": "p", "role": "vendor", "email": "v@x", "full_name": "V"}).json()
+    tender = client.post('/tenders/', json={"title": "B only", "description": "d", "deadline": "2030-01-01",
+                                            "delivery_timeline": "1 day", "client_id": b['id']}).json()
+    proposal = client.post('/proposals/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "technical_input": "secret plan", "financial_input": 1234.0}).json()
+    po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "items": "x", "total_amount": 1.0}).json()
+
+    def as_client(name):
+        token = client.post('/login/', json={'username': f"iso_{name}_{stamp}", 'password': 'p'}).json()['token']
+        return {"Authorization": f"Bearer {token}"}
+
+    headers = as_client("a")
+    assert proposal['id'] not in [p['id'] for p in client.get('/proposals/', params={"limit": 1000}, headers=headers).json()]
+    assert po['id'] not in [o['id'] for o in client.get('/purchase_orders/', params={"limit": 1000}, headers=headers).json()]
+    assert tender['id'] not in [t['id'] for t in client.get('/tenders/', params={"limit": 1000}, headers=headers).json()]
+    assert client.get(f"/tenders/{tender['id']}", headers=headers).status_code == 404
+    assert client.get('/search', params={"q": "secret"}, headers=headers).json() == []
+    assert po['id'] not in [o['id'] for o in client.get('/lookup/purchase_orders', params={"limit": 50}, headers=headers).json()]
+
+    headers = as_client("b")
+    assert [p['id'] for p in client.get('/proposals/', headers=headers).json()] == [proposal['id']]
+    assert [o['id'] for o in client.get('/purchase_orders/', headers=headers).json()] == [po['id']]
+    assert client.get(f"/tenders/{tender['id']}", headers=headers).status_code == 200
+    hits = client.get('/search', params={"q": "secret", "entity": "proposals"}, headers=headers).json()
+    assert [h['id'] for h in hits] == [proposal['id']] and "«secret»" in hits[0]['snippet']
+
+
+def test_write_routes_gated_by_role_and_ownership():
+    stamp = int(time.time() * 1000)
+    owner, other = [client.post('/users/', json={"username": f"gate_{n}_{stamp}", "password": "p", "role": "client", "email": "c@x", "full_name": n}).json()
+                    for n in ("owner", "other")]
+    vendor = client.post('/users/', json={"username": f"gate_v_{stamp}", "password": "p", "role": "vendor", "email": "v@x", "full_name": "V"}).json()
+    tender = client.post('/tenders/', json={"title": "Gated", "description": "d", "deadline": "2030-01-01",
+                                            "delivery_timeline": "1 day", "client_id": owner['id']}).json()
+    proposal = client.post('/proposals/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "technical_input": "t", "financial_input": 10.0}).json()
+    po = client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "items": "x", "total_amount": 1.0}).json()
+    milestone = client.post('/milestones/', json={"tender_id": tender['id'], "title": "M", "description": "d"}).json()
+
+    def as_user(name):
+        token = client.post('/login/', json={'username': f"gate_{name}_{stamp}", 'password': 'p'}).json()['token']
+        return {"Authorization": f"Bearer {token}"}
+
+    # Vendors cannot score or move their own bid
+    headers = as_user("v")
+    assert client.put(f"/proposals/{proposal['id']}", json={"technical_score": 100.0}, headers=headers).status_code == 403
+    assert client.put(f"/tenders/{tender['id']}/status", params={"status": "approved"}, headers=headers).status_code == 403
+    assert client.post('/purchase_orders/', json={"tender_id": tender['id'], "vendor_id": vendor['id'], "items": "x", "total_amount": 9.0},
+                       headers=headers).status_code == 403
+    assert client.post('/proposals/bulk', json=[], headers=headers).status_code == 403
+    assert client.put(f"/milestones/{milestone['id']}", json={"inspection_status": "passed"}, headers=headers).status_code == 403
+    assert client.put(f"/milestones/{milestone['id']}", json={"status": "in_progress"}, headers=headers).status_code == 200
+    assert client.put(f"/purchase_orders/{po['id']}/acknowledge", headers=headers).status_code == 200
+
+    # Another client's rows are missing, not forbidden
+    headers = as_user("other")
+    assert client.put(f"/proposals/{proposal['id']}", json={"status": "approved"}, headers=headers).status_code == 404
+    assert client.put(f"/tenders/{tender['id']}/status", params={"status": "rejected"}, headers=headers).status_code == 404
+    assert client.post('/milestones/', json={"tender_id": tender['id'], "title": "X", "description": "d"}, headers=headers).status_code == 404
+
+    # The owner approves, but evaluation stays with staff
+    headers = as_user("owner")
+    assert client.put(f"/proposals/{proposal['id']}", json={"technical_score": 100.0}, headers=headers).status_code == 403
+    r = client.put(f"/proposals/{proposal['id']}", json={"status": "approved", "feedback": "ok"}, headers=headers)
+    assert r.status_code == 200 and r.json()['status'] == "approved"
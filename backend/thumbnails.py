@@ -0,0 +1,189 @@
+"""Sized thumbnails of uploaded images, generated on first request.
+
+GET /thumbnails/{size}?src=<image url> accepts the URLs stored in
+`User.profile_image`, `Item.image_url` and `Tender.image_url`: store
+URLs (/files/<sha256>) and legacy /static/uploads/<name> paths. The
+requested size is rounded up to one of SIZES so the cache holds a few
+variants per image, not one per pixel width.
+
+Derivatives are written to uploads/thumbnails and served from there.
+Their file mtime records the last access, and once the directory grows
+past TENDER_THUMBNAIL_CACHE_BYTES the least recently used ones are
+removed. Thumbnails of store files never change and are served as
+immutable; thumbnails of legacy paths are keyed on the source's mtime.
+
+Needs Pillow. Without it the client is redirected to the original image.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from typing import Dict, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+
+from .startup import UPLOADS_DIR
+from . import uploads
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional; clients are sent the original
+    Image = None
+
+SIZES = (64, 128, 256, 512)
+CACHE_BYTES = int(os.environ.get("TENDER_THUMBNAIL_CACHE_BYTES", str(256 * 1024 * 1024)))
+# Eviction trims the cache to this fraction of CACHE_BYTES, so it does
+# not run again on the very next miss.
+EVICT_TO = 0.8
+# Refuse to decode images larger than this (decompression bombs)
+MAX_SOURCE_PIXELS = 50_000_000
+JPEG_QUALITY = 85
+
+THUMBNAIL_DIR = os.path.join(UPLOADS_DIR, "thumbnails")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=86400"
+
+STATIC_UPLOADS_PREFIX = "/static/uploads/"
+
+
+def size_bucket(size: int) -> int:
+    for bucket in SIZES:
+        if size <= bucket:
+            return bucket
+    return SIZES[-1]
+
+
+def resolve_source(src: str) -> Tuple[str, str, bool]:
+    """(file path, cache key prefix, immutable) of an image URL."""
+    path = src.split("?", 1)[0]
+    if path.startswith("/files/"):
+        sha256 = path[len("/files/"):]
+        if len(sha256) != 64 or not all(c in "0123456789abcdef" for c in sha256):
+            raise HTTPException(status_code=404, detail="Image not found")
+        return uploads.object_path(sha256), sha256, True
+    if path.startswith(STATIC_UPLOADS_PREFIX):
+        root = os.path.realpath(UPLOADS_DIR)
+        full = os.path.realpath(os.path.join(root, path[len(STATIC_UPLOADS_PREFIX):]))
+        if os.path.commonpath([root, full]) == root and os.path.isfile(full):
+            stat = os.stat(full)
+            return full, f"{full}:{stat.st_mtime_ns}:{stat.st_size}", False
+    raise HTTPException(status_code=404, detail="Image not found")
+
+
+def _render(source: str, size: int) -> Tuple[bytes, str]:
+    with Image.open(source) as img:
+        if img.width * img.height > MAX_SOURCE_PIXELS:
+            raise HTTPException(status_code=422, detail="Image is too large to thumbnail")
+        # Lets the JPEG decoder downscale while decoding
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size), Image.LANCZOS)
+        out = io.BytesIO()
+        if img.mode in ("RGBA", "LA", "P"):
+            img.save(out, "PNG", optimize=True)
+            return out.getvalue(), "png"
+        img.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return out.getvalue(), "jpg"
+
+
+class ThumbnailCache:
+    """Derivatives on disk, evicted least recently used first."""
+
+    def __init__(self, directory: str = THUMBNAIL_DIR, max_bytes: int = CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Bytes on disk as last seen by this process; rescanned on eviction
+        self._total: Optional[int] = None
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{ext}")
+
+    def _find(self, key: str) -> Optional[str]:
+        for ext in ("jpg", "png"):
+            path = self._path(key, ext)
+            try:
+                # Touch: mtime is the LRU clock
+                os.utime(path)
+                return path
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    stat = entry.stat()
+                    yield stat.st_mtime, stat.st_size, entry.path
+
+    def _store(self, key: str, data: bytes, ext: str) -> str:
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as fh:
+            fh.write(data)
+        os.replace(temp, path)
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._entries())
+        else:
+            self._total += len(data)
+        if self._total > self.max_bytes:
+            self.evict()
+        return path
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total = total
+
+    def _generate(self, key: str, source: str, size: int) -> str:
+        return self._find(key) or self._store(key, *_render(source, size))
+
+    async def get(self, source: str, prefix: str, size: int) -> str:
+        """Path of the `size` thumbnail of `source`, generated on a miss."""
+        key = hashlib.sha256(f"{prefix}:{size}".encode()).hexdigest()
+        found = await anyio.to_thread.run_sync(self._find, key)
+        if found:
+            return found
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            # Concurrent misses for one thumbnail render it once
+            async with lock:
+                return await anyio.to_thread.run_sync(self._generate, key, source, size)
+        finally:
+            self._locks.pop(key, None)
+
+
+cache = ThumbnailCache()
+
+
+async def thumbnail(src: str, size: int) -> Optional[Tuple[str, str]]:
+    """(path to serve, Cache-Control) for the `size` thumbnail of `src`,
+    or None when thumbnails are unavailable (no Pillow)."""
+    source, prefix, immutable = resolve_source(src)
+    if not os.path.isfile(source):
+        raise HTTPException(status_code=404, detail="Image not found")
+    if Image is None:
+        return None
+    cache_control = IMMUTABLE if immutable else REVALIDATE
+    try:
+        path = await cache.get(source, prefix, size_bucket(size))
+    except (OSError, Image.DecompressionBombError):
+        # Not an image Pillow can read
+        raise HTTPException(status_code=415, detail="Not a supported image")
+    return path, cache_control
+
+
+def media_type(path: str) -> str:
+    return "image/png" if path.endswith(".png") else "image/jpeg"
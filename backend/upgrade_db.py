@@ -1,92 +1,306 @@
-import os
-import sqlite3
-from typing import List
-
-# Use the project's top-level DB file (same location used by SQLAlchemy URL)
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tender_system.db"))
-
-
-def table_columns(table: str, db_path: str = None) -> List[str]:
-    db_path = db_path or DB_PATH
-    if not os.path.exists(db_path):
-        return []
-    conn = sqlite3.connect(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute(f"PRAGMA table_info('{table}')")
-        rows = cur.fetchall()
-        return [r[1] for r in rows]
-    finally:
-        conn.close()
-
-
-def ensure_column(table: str, column_def: str, db_path: str = None) -> bool:
-    """Ensure `column_def` (e.g. 'submission_method TEXT') exists on `table`.
-    Returns True if added, False if already present.
-    """
-    db_path = db_path or DB_PATH
-    col_name = column_def.split()[0]
-    cols = table_columns(table, db_path=db_path)
-    if col_name in cols:
-        return False
-    if not os.path.exists(db_path):
-        # Nothing to do if DB doesn't exist yet
-        return False
-    conn = sqlite3.connect(db_path)
-    try:
-        cur = conn.cursor()
-        # SQLite supports simple ADD COLUMN
-        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column_def}")
-        conn.commit()
+"""Versioned schema migrations.
+
+The applied version is kept in a `schema_version` table. A run opens one
+connection, reads that version and returns immediately when the database is
+current, so checking an up-to-date database costs a single query. Otherwise it
+lets SQLAlchemy create any missing tables and then applies the pending steps
+in order, recording each one.
+
+Steps must be idempotent: on a brand-new database create_all has already
+built the latest schema, and the steps only get recorded.
+
+Run explicitly before starting the API:
+
+    python -m backend.upgrade_db
+"""
+import datetime
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+
+from . import fts, models, search
+from .audit import AUDIT_FTS_TABLE
+from .database import engine as default_engine
+
+VERSION_TABLE = "schema_version"
+
+
+class SchemaContext:
+    """A migration run's connection plus cached schema introspection."""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self._tables: Optional[Set[str]] = None
+        self._columns: Dict[str, Set[str]] = {}
+        self._indexes: Dict[str, Set[str]] = {}
+
+    def tables(self) -> Set[str]:
+        if self._tables is None:
+            self._tables = set(inspect(self.conn).get_table_names())
+        return self._tables
+
+    def columns(self, table: str) -> Set[str]:
+        if table not in self._columns:
+            self._columns[table] = {c["name"] for c in inspect(self.conn).get_columns(table)}
+        return self._columns[table]
+
+    def indexes(self, table: str) -> Set[str]:
+        if table not in self._indexes:
+            self._indexes[table] = {i["name"] for i in inspect(self.conn).get_indexes(table)}
+        return self._indexes[table]
+
+    def forget(self, table: str):
+        self._tables = None
+        self._columns.pop(table, None)
+        self._indexes.pop(table, None)
+
+    def add_column(self, table: str, column_def: str) -> bool:
+        """Add `column_def` (e.g. 'submission_method TEXT') unless present."""
+        if column_def.split()[0] in self.columns(table):
+            return False
+        self.conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column_def}")
+        self.columns(table).add(column_def.split()[0])
+        return True
+
+    def create_index(self, name: str, table: str, columns: str, where: str = None) -> bool:
+        """Create index `name` on `table(columns)`, optionally partial."""
+        if name in self.indexes(table):
+            return False
+        # Reflection skips expression indexes, hence IF NOT EXISTS
+        sql = f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+        if where:
+            sql += f" WHERE {where}"
+        self.conn.exec_driver_sql(sql)
+        self.indexes(table).add(name)
         return True
-    finally:
-        conn.close()
 
+    def rebuild_table(self, table: str):
+        """Recreate `table` from its current model definition (SQLite).
+
+        SQLite cannot change column types or constraints in place, so this
+        follows its documented rebuild procedure: create the new table,
+        copy the shared columns, drop the old one, rename, and recreate its
+        explicit indexes.
+        """
+        target = models.Base.metadata.tables[table]
+        tmp_name = f"{table}__rebuild"
+        index_sql = [
+            row[0] for row in self.conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :t AND sql IS NOT NULL"),
+                {"t": table},
+            )
+        ]
+        shared = [c.name for c in target.columns if c.name in self.columns(table)]
+        column_list = ", ".join(shared)
+
+        create_sql = str(CreateTable(target).compile(self.conn))
+        self.conn.exec_driver_sql(create_sql.replace(f"CREATE TABLE {table} (", f"CREATE TABLE {tmp_name} (", 1))
+        self.conn.exec_driver_sql(f"INSERT INTO {tmp_name} ({column_list}) SELECT {column_list} FROM {table}")
+        self.conn.exec_driver_sql(f"DROP TABLE {table}")
+        self.conn.exec_driver_sql(f"ALTER TABLE {tmp_name} RENAME TO {table}")
+        for sql in index_sql:
+            self.conn.exec_driver_sql(sql)
+        self.forget(table)
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[SchemaContext], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Register a migration step; versions must be added in increasing order."""
+    def register(fn):
+        assert not MIGRATIONS or version > MIGRATIONS[-1].version, "migration versions must increase"
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return register
+
+
+@migration(1, "Columns added after the first release")
+def add_late_columns(ctx: SchemaContext):
+    ctx.add_column("tenders", "submission_method TEXT")
+    ctx.add_column("milestones", "inspection_status TEXT DEFAULT 'Pending'")
+    ctx.add_column("milestones", "quality_remarks TEXT")
+    ctx.add_column("milestones", "signed_challan_id TEXT")
+    ctx.add_column("payments", "commission_amount FLOAT DEFAULT 0")
+    ctx.add_column("users", "profile_image TEXT")
+    ctx.add_column("tenders", "image_url TEXT")
+    ctx.add_column("tenders", "budget FLOAT DEFAULT 0.0")
 
-def ensure_db_schema(db_path: str = None):
-    """Inspect common migrations and add any missing columns we know about.
 
-    This is intentionally small and safe (only ADD COLUMN). Use proper
-    migrations for larger schema changes.
-    """
-    db_path = db_path or DB_PATH
-    if not os.path.exists(db_path):
-        # nothing to fix on a brand new DB; tables will be created by SQLAlchemy
+@migration(2, "Index foreign keys, status columns, audit timestamps and workflow lookups")
+def add_secondary_indexes(ctx: SchemaContext):
+    # Names follow SQLAlchemy's ix_<table>_<column> convention so databases
+    # built by create_all and upgraded ones end up identical.
+    ctx.create_index("ix_tenders_client_id", "tenders", "client_id")
+    ctx.create_index("ix_tenders_status", "tenders", "status")
+    ctx.create_index("ix_tenders_open_deadline", "tenders", "deadline", where="status = 'OPEN'")
+    ctx.create_index("ix_proposals_tender_id", "proposals", "tender_id")
+    ctx.create_index("ix_proposals_vendor_id", "proposals", "vendor_id")
+    ctx.create_index("ix_proposals_status", "proposals", "status")
+    ctx.create_index("ix_contracts_tender_id", "contracts", "tender_id")
+    ctx.create_index("ix_purchase_orders_tender_id", "purchase_orders", "tender_id")
+    ctx.create_index("ix_purchase_orders_vendor_id", "purchase_orders", "vendor_id")
+    ctx.create_index("ix_invoices_po_id", "invoices", "po_id")
+    ctx.create_index("ix_invoices_status", "invoices", "status")
+    ctx.create_index("ix_invoices_unpaid", "invoices", "po_id", where="status != 'Paid'")
+    ctx.create_index("ix_payments_invoice_id", "payments", "invoice_id")
+    ctx.create_index("ix_payments_status", "payments", "status")
+    ctx.create_index("ix_milestones_tender_id", "milestones", "tender_id")
+    ctx.create_index("ix_audit_logs_user_id", "audit_logs", "user_id")
+    ctx.create_index("ix_audit_logs_timestamp", "audit_logs", "timestamp")
+    ctx.create_index("ix_approval_workflows_entity", "approval_workflows", "entity_type, entity_id")
+
+
+@migration(3, "Per-table change counters for ETags")
+def add_table_versions(ctx: SchemaContext):
+    models.TableVersion.__table__.create(ctx.conn, checkfirst=True)
+    ctx.forget(models.TableVersion.__tablename__)
+
+
+@migration(4, "updated_at / change_seq on synced entities, change sequence and tombstones")
+def add_change_tracking(ctx: SchemaContext):
+    models.ChangeSequence.__table__.create(ctx.conn, checkfirst=True)
+    models.Tombstone.__table__.create(ctx.conn, checkfirst=True)
+    ctx.forget(models.ChangeSequence.__tablename__)
+    ctx.forget(models.Tombstone.__tablename__)
+    ctx.conn.exec_driver_sql("INSERT OR IGNORE INTO change_sequence (id, value) VALUES (1, 0)")
+    for table in ("tenders", "proposals", "contracts", "purchase_orders", "invoices",
+                  "payments", "milestones", "approval_workflows"):
+        ctx.add_column(table, "updated_at DATETIME")
+        ctx.add_column(table, "change_seq INTEGER")
+        ctx.create_index(f"ix_{table}_change_seq", table, "change_seq")
+        # Give existing rows sequence values after everything handed out so
+        # far, so a first sync from 0 picks them up.
+        offset = ctx.conn.exec_driver_sql("SELECT value FROM change_sequence WHERE id = 1").scalar()
+        stamped_from = "created_at" if "created_at" in ctx.columns(table) else "CURRENT_TIMESTAMP"
+        ctx.conn.exec_driver_sql(
+            f"UPDATE {table} SET change_seq = {offset} + id, "
+            f"updated_at = COALESCE(updated_at, {stamped_from}) WHERE change_seq IS NULL"
+        )
+        ctx.conn.exec_driver_sql(
+            f"UPDATE change_sequence SET value = (SELECT COALESCE(MAX(change_seq), {offset}) FROM {table}) "
+            f"WHERE id = 1 AND (SELECT COALESCE(MAX(change_seq), 0) FROM {table}) > value"
+        )
+
+
+# Longest tender number the sequence is seeded from; see add_id_sequences
+MAX_TENDER_DIGITS = 9
+
+
+@migration(5, "ID sequences, seeded past existing tender numbers")
+def add_id_sequences(ctx: SchemaContext):
+    models.IdSequence.__table__.create(ctx.conn, checkfirst=True)
+    ctx.forget(models.IdSequence.__tablename__)
+    # Tender IDs used to be numbered T-<count + 1001> by the desktop client;
+    # continue after the highest one. Some clients stamped T-<epoch millis>
+    # instead (13 digits); those are left out, or the series would jump
+    # past them. PO/invoice/transaction numbers were random 8-character
+    # hex, which the 6-digit series cannot collide with.
+    ctx.conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO id_sequences (name, next_value) "
+        "SELECT 'tender', MAX(1001, COALESCE(MAX(CAST(substr(tender_id, 3) AS INTEGER)) + 1, 1001)) "
+        "FROM tenders WHERE tender_id GLOB 'T-[0-9]*' AND substr(tender_id, 3) NOT GLOB '*[^0-9]*' "
+        f"AND length(tender_id) <= {2 + MAX_TENDER_DIGITS}"
+    )
+
+
+@migration(6, "Content-addressed upload store and resumable upload sessions")
+def add_upload_store(ctx: SchemaContext):
+    for model in (models.StoredFile, models.UploadSession):
+        model.__table__.create(ctx.conn, checkfirst=True)
+        ctx.forget(model.__tablename__)
+
+
+@migration(7, "Request path and response status on audit log entries")
+def add_audit_request_columns(ctx: SchemaContext):
+    ctx.add_column("audit_logs", "path VARCHAR")
+    ctx.add_column("audit_logs", "status_code INTEGER")
+
+
+@migration(8, "Composite audit log indexes and full-text index over audit actions")
+def add_audit_search(ctx: SchemaContext):
+    ctx.create_index("ix_audit_logs_user_time", "audit_logs", "user_id, timestamp")
+    ctx.create_index("ix_audit_logs_entity_time", "audit_logs", "entity_type, entity_id, timestamp")
+    ctx.create_index("ix_audit_logs_action_time", "audit_logs", "action, timestamp")
+    if fts.fts5_available(ctx.conn):
+        fts.create_index(ctx.conn, AUDIT_FTS_TABLE, "audit_logs", ("action", "path"))
+
+
+@migration(9, "Never reuse audit log ids once entries are archived")
+def add_audit_autoincrement(ctx: SchemaContext):
+    if ctx.conn.dialect.name != "sqlite":
         return
+    table_sql = ctx.conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'audit_logs'"
+    ).scalar()
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+    ctx.rebuild_table("audit_logs")
+    if AUDIT_FTS_TABLE in ctx.tables():
+        fts.create_triggers(ctx.conn, AUDIT_FTS_TABLE, "audit_logs", ("action", "path"))
+
+
+@migration(10, "Full-text indexes over tenders, items and proposals")
+def add_search_indexes(ctx: SchemaContext):
+    if not fts.fts5_available(ctx.conn):
+        return
+    for index in search.INDEXES.values():
+        for column in index.columns:
+            ctx.add_column(index.source, f"{column} TEXT")
+    search.create_indexes(ctx.conn)
+
+
+@migration(11, "Case-insensitive index on user full names for lookups")
+def add_lookup_indexes(ctx: SchemaContext):
+    ctx.create_index("ix_users_full_name_lower", "users", "lower(full_name)")
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    )
+    return conn.exec_driver_sql(f"SELECT MAX(version) FROM {VERSION_TABLE}").scalar() or 0
+
 
-    added = []
-    # columns we expect on tenders table
-    if ensure_column("tenders", "submission_method TEXT", db_path=db_path):
-        added.append("tenders.submission_method")
-    
-    # Milestone updates
-    if ensure_column("milestones", "inspection_status TEXT DEFAULT 'Pending'", db_path=db_path):
-        added.append("milestones.inspection_status")
-    if ensure_column("milestones", "quality_remarks TEXT", db_path=db_path):
-        added.append("milestones.quality_remarks")
-    if ensure_column("milestones", "signed_challan_id TEXT", db_path=db_path):
-        added.append("milestones.signed_challan_id")
-
-    # Payment updates
-    if ensure_column("payments", "commission_amount FLOAT DEFAULT 0", db_path=db_path):
-        added.append("payments.commission_amount")
-
-    # User updates
-    if ensure_column("users", "profile_image TEXT", db_path=db_path):
-        added.append("users.profile_image")
-    
-    # Tender updates
-    if ensure_column("tenders", "image_url TEXT", db_path=db_path):
-        added.append("tenders.image_url")
-    if ensure_column("tenders", "budget FLOAT DEFAULT 0.0", db_path=db_path):
-        added.append("tenders.budget")
-
-    # future-proof: if you add other columns that cause OperationalError,
-    # list them here in the same form: (table, "col_name TYPE")
-
-    if added:
-        print("Added missing columns:", ", ".join(added))
+def migrate(bind: Engine = None) -> List[Migration]:
+    """Bring the database up to LATEST_VERSION; return the steps applied."""
+    bind = bind or default_engine
+    applied = []
+    with bind.begin() as conn:
+        version = current_version(conn)
+        if version >= LATEST_VERSION:
+            return applied
+        models.Base.metadata.create_all(bind=conn)
+        ctx = SchemaContext(conn)
+        for step in MIGRATIONS:
+            if step.version <= version:
+                continue
+            step.apply(ctx)
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, description, applied_at) VALUES (:v, :d, :at)"),
+                {"v": step.version, "d": step.description, "at": datetime.datetime.utcnow()},
+            )
+            applied.append(step)
+    return applied
 
 
 if __name__ == "__main__":
-    ensure_db_schema()
+    steps = migrate()
+    for step in steps:
+        print(f"Applied migration {step.version}: {step.description}")
+    if not steps:
+        print(f"Schema is up to date (version {LATEST_VERSION}).")
@@ -0,0 +1,316 @@
+"""Content-addressed upload storage.
+
+Uploaded bytes are streamed to a temporary file chunk by chunk, off the
+event loop, and hashed with SHA-256 as they are written. The finished file
+is renamed to `uploads/objects/<sha[:2]>/<sha>`, so identical documents are
+stored once and two files with the same name no longer overwrite each
+other. A `stored_files` row keeps the content type, size and first file
+name; `document_url`, `proof_url` and `image_url` hold its `/files/<sha>`
+URL.
+
+Two ways in:
+- POST /upload/ takes a multipart form in one request (small files, the
+  web client);
+- POST /uploads/ opens a resumable session. The client PUTs the raw bytes
+  in chunks at `?offset=`, asks GET /uploads/{id} where to continue after
+  an interruption, and POSTs /uploads/{id}/complete at the end.
+
+The bytes received so far live in `uploads/partial/<id>`; its size is the
+session's offset, so appending a chunk does not touch the database. The
+running hash is kept in memory; when a session is resumed in another
+process (or after a restart) the partial file is hashed on completion.
+
+Every upload is capped at TENDER_UPLOAD_MAX_BYTES. Sessions left
+unfinished for TENDER_UPLOAD_SESSION_TTL_HOURS are removed when the next
+one starts.
+"""
+import asyncio
+import datetime
+import hashlib
+import mimetypes
+import os
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+import anyio
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import DBSession
+from .startup import UPLOADS_DIR
+
+MAX_UPLOAD_BYTES = int(os.environ.get("TENDER_UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+SESSION_TTL = datetime.timedelta(hours=float(os.environ.get("TENDER_UPLOAD_SESSION_TTL_HOURS", "24")))
+
+CHUNK_SIZE = 1024 * 1024
+
+STORE_DIR = os.path.join(UPLOADS_DIR, "objects")
+PARTIAL_DIR = os.path.join(UPLOADS_DIR, "partial")
+
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+
+def object_path(sha256: str) -> str:
+    return os.path.join(STORE_DIR, sha256[:2], sha256)
+
+
+def file_url(sha256: str) -> str:
+    return f"/files/{sha256}"
+
+
+def content_type_for(declared: Optional[str], filename: Optional[str]) -> str:
+    if declared and declared != DEFAULT_CONTENT_TYPE:
+        return declared
+    guessed = mimetypes.guess_type(filename or "")[0]
+    return guessed or DEFAULT_CONTENT_TYPE
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+
+
+class _HashingWriter:
+    """Appends chunks to a file and feeds them to a running hash.
+
+    `hashed` counts the bytes the hash has seen; it equals the file size
+    unless a write failed midway, in which case the hash is discarded.
+    """
+
+    def __init__(self, hasher=None, hashed: int = 0):
+        self.hasher = hasher
+        self.hashed = hashed
+
+    def _write(self, fh, chunk: bytes):
+        fh.write(chunk)
+        if self.hasher is not None:
+            self.hasher.update(chunk)
+            self.hashed += len(chunk)
+
+    async def append(self, path: str, chunks: AsyncIterator[bytes], written: int, limit: int) -> int:
+        """Append `chunks` to `path`, which holds `written` bytes; return the new size."""
+        fh = await anyio.to_thread.run_sync(open, path, "ab")
+        try:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > limit:
+                    raise _too_large(limit)
+                # One thread hop per chunk for both the write and the hash
+                await anyio.to_thread.run_sync(self._write, fh, chunk)
+        finally:
+            await anyio.to_thread.run_sync(fh.close)
+        return written
+
+
+def _hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _place(temp_path: str, sha256: str):
+    """Move a finished temp file into the store, or drop it when the
+    content is already there."""
+    target = object_path(sha256)
+    if os.path.exists(target):
+        os.remove(temp_path)
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(temp_path, target)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def describe(stored: models.StoredFile) -> dict:
+    return {
+        "url": file_url(stored.sha256),
+        "sha256": stored.sha256,
+        "size": stored.size,
+        "content_type": stored.content_type,
+    }
+
+
+def _record(db: Session, sha256: str, size: int, content_type: str, filename: Optional[str],
+            session_id: Optional[str] = None) -> dict:
+    if session_id is not None:
+        db.query(models.UploadSession).filter(models.UploadSession.id == session_id).delete()
+    stored = db.get(models.StoredFile, sha256)
+    if stored is None:
+        stored = models.StoredFile(sha256=sha256, size=size, content_type=content_type, original_name=filename)
+        db.add(stored)
+    try:
+        db.commit()
+    except IntegrityError:
+        # The same content was recorded concurrently
+        db.rollback()
+        stored = db.get(models.StoredFile, sha256)
+    return describe(stored)
+
+
+async def _store(db: DBSession, temp_path: str, sha256: str, size: int, content_type: str,
+                 filename: Optional[str], session_id: Optional[str] = None) -> dict:
+    await anyio.to_thread.run_sync(_place, temp_path, sha256)
+    return await db.run(_record, sha256, size, content_type, filename, session_id)
+
+
+async def store_stream(db: DBSession, chunks: AsyncIterator[bytes], filename: Optional[str],
+                       content_type: Optional[str]) -> dict:
+    """Stream `chunks` into the store; return the stored file's description."""
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    temp_path = os.path.join(PARTIAL_DIR, f"direct-{uuid.uuid4().hex}")
+    writer = _HashingWriter(hashlib.sha256())
+    try:
+        size = await writer.append(temp_path, chunks, 0, MAX_UPLOAD_BYTES)
+        sha256 = writer.hasher.hexdigest()
+        return await _store(db, temp_path, sha256, size, content_type_for(content_type, filename), filename)
+    finally:
+        await anyio.to_thread.run_sync(_remove, temp_path)
+
+
+async def upload_chunks(upload) -> AsyncIterator[bytes]:
+    """Chunks of a Starlette UploadFile."""
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+# Resumable sessions
+
+# upload id -> writer holding the running hash (this process only)
+_writers: Dict[str, _HashingWriter] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _partial_path(upload_id: str) -> str:
+    return os.path.join(PARTIAL_DIR, upload_id)
+
+
+def _received(upload_id: str) -> int:
+    try:
+        return os.path.getsize(_partial_path(upload_id))
+    except FileNotFoundError:
+        return 0
+
+
+def _lock(upload_id: str) -> asyncio.Lock:
+    return _locks.setdefault(upload_id, asyncio.Lock())
+
+
+def _forget(upload_id: str):
+    _writers.pop(upload_id, None)
+    _locks.pop(upload_id, None)
+
+
+def _session_status(session: models.UploadSession) -> dict:
+    return {
+        "upload_id": session.id,
+        "offset": _received(session.id),
+        "size": session.size,
+        "chunk_size": CHUNK_SIZE,
+    }
+
+
+def _create_session(db: Session, filename: Optional[str], content_type: str, size: int) -> dict:
+    cutoff = datetime.datetime.utcnow() - SESSION_TTL
+    expired = [s.id for s in db.query(models.UploadSession.id).filter(models.UploadSession.created_at < cutoff)]
+    if expired:
+        db.query(models.UploadSession).filter(models.UploadSession.id.in_(expired)).delete()
+    session = models.UploadSession(id=uuid.uuid4().hex, filename=filename, content_type=content_type, size=size)
+    db.add(session)
+    db.commit()
+    for upload_id in expired:
+        _remove(_partial_path(upload_id))
+        _forget(upload_id)
+    open(_partial_path(session.id), "wb").close()
+    _writers[session.id] = _HashingWriter(hashlib.sha256())
+    return _session_status(session)
+
+
+def _get_session(db: Session, upload_id: str) -> models.UploadSession:
+    session = db.get(models.UploadSession, upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+async def start_session(db: DBSession, filename: Optional[str], content_type: Optional[str], size: int) -> dict:
+    if size > MAX_UPLOAD_BYTES:
+        raise _too_large(MAX_UPLOAD_BYTES)
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    return await db.run(_create_session, filename, content_type_for(content_type, filename), size)
+
+
+async def session_status(db: DBSession, upload_id: str) -> dict:
+    return _session_status(await db.run(_get_session, upload_id))
+
+
+async def append_chunk(db: DBSession, upload_id: str, offset: int, chunks: AsyncIterator[bytes],
+                       length: Optional[int] = None) -> dict:
+    """Append a chunk starting at `offset`, which must be the bytes received so far."""
+    session = await db.run(_get_session, upload_id)
+    if length is not None and offset + length > session.size:
+        raise _too_large(session.size)
+    async with _lock(upload_id):
+        received = _received(upload_id)
+        if offset != received:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Upload is at offset {received}",
+                headers={"Upload-Offset": str(received)},
+            )
+        writer = _writers.get(upload_id)
+        if writer is None or writer.hashed != received:
+            # Resumed elsewhere; the hash is computed from the file on completion
+            writer = _writers[upload_id] = _HashingWriter()
+        await writer.append(_partial_path(upload_id), chunks, received, session.size)
+    return _session_status(session)
+
+
+async def complete_session(db: DBSession, upload_id: str) -> dict:
+    session = await db.run(_get_session, upload_id)
+    path = _partial_path(upload_id)
+    async with _lock(upload_id):
+        received = _received(upload_id)
+        if received != session.size:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Upload is incomplete: {received} of {session.size} bytes received",
+                headers={"Upload-Offset": str(received)},
+            )
+        writer = _writers.get(upload_id)
+        if writer is not None and writer.hasher is not None and writer.hashed == received:
+            sha256 = writer.hasher.hexdigest()
+        else:
+            sha256 = await anyio.to_thread.run_sync(_hash_file, path)
+        result = await _store(db, path, sha256, received, session.content_type, session.filename, upload_id)
+    _forget(upload_id)
+    return result
+
+
+def _delete_session(db: Session, upload_id: str):
+    _get_session(db, upload_id)
+    db.query(models.UploadSession).filter(models.UploadSession.id == upload_id).delete()
+    db.commit()
+
+
+async def abort_session(db: DBSession, upload_id: str):
+    await db.run(_delete_session, upload_id)
+    await anyio.to_thread.run_sync(_remove, _partial_path(upload_id))
+    _forget(upload_id)
+
+
+def stored_file(db: Session, sha256: str) -> models.StoredFile:
+    stored = db.get(models.StoredFile, sha256)
+    if stored is None or not os.path.exists(object_path(sha256)):
+        raise HTTPException(status_code=404, detail="File not found")
+    return stored
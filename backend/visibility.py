@@ -0,0 +1,91 @@
+"""Which rows of each synced entity a caller may read.
+
+Staff roles, and anonymous callers where TENDER_REQUIRE_AUTH allows
+them, see everything. Otherwise, as in the list routes (`scoped_id`):
+- clients see their own tenders and everything hanging off them:
+  proposals, contracts, milestones, purchase orders, invoices, payments;
+- vendors see every tender, their own proposals, purchase orders,
+  invoices and payments, and the contracts and milestones of tenders
+  they hold an order on;
+- approval workflows are staff only;
+- the item catalog is open to everyone.
+
+Ownership of invoices and payments is resolved through the purchase
+order and tender with subqueries, so the filters apply to any query or
+SELECT over the entity's own table.
+
+Write routes use the same rules for ownership: a row the caller cannot
+read is reported as missing (404), not forbidden.
+"""
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import false, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .auth import Principal
+
+# A filter that matches no row; callers can test for it with `is`
+NOTHING = false()
+
+
+def _client_tenders(user_id: int):
+    return select(models.Tender.id).where(models.Tender.client_id == user_id)
+
+
+def _vendor_tenders(user_id: int):
+    return select(models.PurchaseOrder.tender_id).where(models.PurchaseOrder.vendor_id == user_id)
+
+
+def _orders(user: Principal):
+    po = models.PurchaseOrder
+    if user.role == models.UserRole.CLIENT:
+        return select(po.id).where(po.tender_id.in_(_client_tenders(user.user_id)))
+    return select(po.id).where(po.vendor_id == user.user_id)
+
+
+def visible_clause(model, user: Optional[Principal]):
+    """Filter on `model` restricting it to `user`'s rows; None if every
+    row is visible, NOTHING if none is."""
+    if user is None or user.is_staff or model is models.Item:
+        return None
+    client = user.role == models.UserRole.CLIENT
+    if not client and user.role != models.UserRole.VENDOR:
+        return NOTHING
+    uid = user.user_id
+    if model is models.Tender:
+        return model.client_id == uid if client else None
+    if model is models.Proposal:
+        return model.tender_id.in_(_client_tenders(uid)) if client else model.vendor_id == uid
+    if model in (models.Contract, models.Milestone):
+        return model.tender_id.in_(_client_tenders(uid) if client else _vendor_tenders(uid))
+    if model is models.PurchaseOrder:
+        return model.tender_id.in_(_client_tenders(uid)) if client else model.vendor_id == uid
+    if model is models.Invoice:
+        return model.po_id.in_(_orders(user))
+    if model is models.Payment:
+        return model.invoice_id.in_(select(models.Invoice.id).where(models.Invoice.po_id.in_(_orders(user))))
+    return NOTHING
+
+
+def visible(query, model, user: Optional[Principal]):
+    """`query` over `model` narrowed to the rows `user` may read."""
+    clause = visible_clause(model, user)
+    return query if clause is None else query.filter(clause)
+
+
+def visible_row(db: Session, model, row_id: int, user: Optional[Principal], detail: str):
+    """The `model` row `row_id` if `user` may read it; 404 otherwise."""
+    row = visible(db.query(model), model, user).filter(model.id == row_id).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return row
+
+
+def require_visible(db: Session, model, row_id: int, user: Optional[Principal], detail: str):
+    """404 unless `user` may read the `model` row `row_id`. Unscoped
+    callers are not checked; the row may then not exist at all."""
+    clause = visible_clause(model, user)
+    if clause is not None and db.query(model.id).filter(model.id == row_id, clause).first() is None:
+        raise HTTPException(status_code=404, detail=detail)
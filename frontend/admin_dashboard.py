@@ -2,7 +2,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QScrollArea, QGridLayout, QTableWidget, QTableWidgetItem, 
                              QHeaderView, QFrame, QPushButton, QDialog)
 from PySide6.QtCore import Qt
-import requests
+from .api_client import get_all, get_json
 from .components import StatCard, ActionCard
 
 API_URL = "http://localhost:8000"
@@ -55,19 +55,12 @@ class AdminDashboard(QWidget):
 
     def refresh_stats(self):
         try:
-            users = requests.get(f"{API_URL}/users/").json()
-            tenders = requests.get(f"{API_URL}/tenders/").json()
-            self.total_users.update_value(str(len(users)))
-            self.active_tenders.update_value(str(len(tenders)))
-            
-            # Fetch payments for revenue summary
-            pay_res = requests.get(f"{API_URL}/payments/")
-            if pay_res.status_code == 200:
-                verified_payments = [p for p in pay_res.json() if p['status'] == 'Verified']
-                total_rev = sum(p['amount_paid'] for p in verified_payments)
-                self.revenue_summary.update_value(f"$ {total_rev:,.0f}")
-            else:
-                self.revenue_summary.update_value("$ 0")
+            summary = get_json("/dashboard/summary/admin")
+            self.total_users.update_value(str(summary['total_users']))
+            self.active_tenders.update_value(str(summary['total_tenders']))
+            self.revenue_summary.update_value(f"$ {summary['verified_revenue']:,.0f}")
+
+            tenders = get_all("/tenders/")
 
             # Populate table
             self.table.setRowCount(len(tenders))
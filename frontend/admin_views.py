@@ -1,8 +1,9 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                              QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
-                             QFrame, QComboBox, QDateEdit, QFormLayout, QLineEdit)
+                             QFrame, QComboBox, QDateEdit, QFormLayout, QLineEdit,
+                             QFileDialog, QMessageBox)
 from PySide6.QtCore import Qt, QDate
-import requests
+from .api_client import download, get_json
 
 API_URL = "http://localhost:8000"
 
@@ -26,12 +27,19 @@ class ReportsAnalyticsView(QWidget):
         fb_layout = QHBoxLayout(filter_bar)
         
         fb_layout.addWidget(QLabel("Date From:"))
-        fb_layout.addWidget(QDateEdit(QDate.currentDate().addMonths(-1)))
+        self.date_from = QDateEdit(QDate.currentDate().addMonths(-1))
+        fb_layout.addWidget(self.date_from)
         fb_layout.addWidget(QLabel("To:"))
-        fb_layout.addWidget(QDateEdit(QDate.currentDate()))
+        self.date_to = QDateEdit(QDate.currentDate())
+        fb_layout.addWidget(self.date_to)
+
+        self.export_entity = QComboBox()
+        self.export_entity.addItems(["payments", "invoices", "tenders"])
+        fb_layout.addWidget(self.export_entity)
         
         export_btn = QPushButton("Export Excel")
         export_btn.setStyleSheet("background-color: #059669; color: white;")
+        export_btn.clicked.connect(self.export_csv)
         fb_layout.addWidget(export_btn)
         
         layout.addWidget(filter_bar)
@@ -46,6 +54,23 @@ class ReportsAnalyticsView(QWidget):
         layout.addWidget(table)
         layout.addStretch()
 
+    def export_csv(self):
+        entity = self.export_entity.currentText()
+        dest, _ = QFileDialog.getSaveFileName(self, "Export", f"{entity}.csv", "CSV Files (*.csv)")
+        if not dest:
+            return
+        # The range is inclusive of the "To" day, the API's end is exclusive
+        params = {
+            "format": "csv",
+            "created_from": self.date_from.date().toString(Qt.ISODate),
+            "created_to": self.date_to.date().addDays(1).toString(Qt.ISODate),
+        }
+        try:
+            download(f"/export/{entity}", dest, params=params)
+            QMessageBox.information(self, "Export", f"Saved {entity} to {dest}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Export failed: {e}")
+
 class AuditLogsView(QWidget):
     def __init__(self, user_data):
         super().__init__()
@@ -60,23 +85,31 @@ class AuditLogsView(QWidget):
         header.setStyleSheet("font-size: 24px; font-weight: bold; color: #1e3a8a;")
         layout.addWidget(header)
         
-        table = QTableWidget(10, 3)
-        table.setHorizontalHeaderLabels(["Timestamp", "User Action", "Entity Modified"])
-        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        
-        logs = [
-            ["2026-01-04 16:50", "LOGIN", "User: admin"],
-            ["2026-01-04 16:45", "TENDER_CREATED", "T-1025"],
-            ["2026-01-04 16:40", "PAYMENT_RECORDED", "INV-8801"],
-            ["2026-01-04 16:35", "STATUS_CHANGE", "T-990 -> Under Review"]
-        ]
-        
-        for i, row in enumerate(logs):
-            for j, val in enumerate(row):
-                table.setItem(i, j, QTableWidgetItem(val))
-                
-        layout.addWidget(table)
-        layout.addStretch()
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["Timestamp", "User", "Action", "Entity Modified"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.load_logs)
+        layout.addWidget(refresh_btn, alignment=Qt.AlignRight)
+        self.load_logs()
+
+    def load_logs(self):
+        # Every create/update/delete is recorded by the backend automatically
+        try:
+            logs = get_json('/audit_logs/')
+        except Exception:
+            return
+        self.table.setRowCount(len(logs))
+        for i, log in enumerate(logs):
+            entity = log.get('entity_type') or ''
+            if log.get('entity_id') is not None:
+                entity = f"{entity} #{log['entity_id']}"
+            user = f"User #{log['user_id']}" if log.get('user_id') is not None else "Anonymous"
+            values = [(log.get('timestamp') or '')[:19].replace('T', ' '), user, log.get('action') or '', entity]
+            for j, val in enumerate(values):
+                self.table.setItem(i, j, QTableWidgetItem(val))
 
 class AdminSettingsView(QWidget):
     def __init__(self, user_data):
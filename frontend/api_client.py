@@ -0,0 +1,185 @@
+import os
+from collections import OrderedDict
+
+import requests
+
+try:
+    import msgpack
+except ImportError:  # fall back to JSON lists
+    msgpack = None
+
+try:
+    import brotli  # noqa: F401  (lets urllib3 decode Content-Encoding: br)
+    ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    ACCEPT_ENCODING = "gzip"
+
+API_URL = "http://localhost:8000"
+
+# Largest page the backend accepts (see backend/pagination.py)
+PAGE_SIZE = 1000
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Responses kept for ETag revalidation, least recently used evicted first
+ETAG_CACHE_SIZE = 64
+
+# One keep-alive session asking for the most compact encodings available
+session = requests.Session()
+session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+if msgpack is not None:
+    session.headers["Accept"] = f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.9"
+
+
+# (path, params) -> (ETag, decoded body, headers) of the last 200 response
+_etag_cache = OrderedDict()
+
+
+def sign_in(user_data):
+    """Send the session token from /login/ with every later request."""
+    session.headers["Authorization"] = f"Bearer {user_data['token']}"
+    # Responses are scoped to the caller; do not revalidate another user's
+    _etag_cache.clear()
+
+
+def sign_out():
+    session.headers.pop("Authorization", None)
+    _etag_cache.clear()
+
+
+def cached_get(path, params=None):
+    """GET `path`, revalidating a previously seen response by its ETag.
+
+    Unchanged data comes back as an empty 304 and the cached body is
+    returned, so idle dashboard refreshes cost only a header exchange.
+    Returns (decoded body, response headers); on a 304 the headers are the
+    cached ones, since a 304 does not repeat e.g. X-Next-Cursor.
+
+    Later pages of a list (`after` cursors) and /lookup/ typeahead
+    queries are rarely repeated and are not cached.
+    """
+    key = (path, tuple(sorted((params or {}).items())))
+    cacheable = "after" not in (params or {}) and not path.startswith("/lookup/")
+    cached = _etag_cache.get(key) if cacheable else None
+    if cached:
+        _etag_cache.move_to_end(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    res = session.get(f"{API_URL}{path}", params=params, headers=headers)
+    if res.status_code == 304 and cached:
+        return cached[1], cached[2]
+    res.raise_for_status()
+    body = decode(res)
+    etag = res.headers.get("ETag")
+    if etag and cacheable:
+        _etag_cache[key] = (etag, body, res.headers)
+        _etag_cache.move_to_end(key)
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    else:
+        _etag_cache.pop(key, None)
+    return body, res.headers
+
+
+def decode(res):
+    """Decode a JSON or MessagePack response body."""
+    if msgpack is not None and res.headers.get("Content-Type", "").startswith(MSGPACK_MEDIA_TYPE):
+        return msgpack.unpackb(res.content)
+    return res.json()
+
+
+def get_all(path, params=None):
+    """GET every page of a cursor-paginated list endpoint and return all rows.
+
+    Follows the `X-Next-Cursor` response header until the last page. Raises
+    `requests.HTTPError` on a non-2xx response.
+    """
+    rows = []
+    query = dict(params or {}, limit=PAGE_SIZE)
+    while True:
+        page, headers = cached_get(path, dict(query))
+        rows.extend(page)
+        cursor = headers.get("X-Next-Cursor")
+        if not cursor:
+            return rows
+        query["after"] = cursor
+
+
+def get_json(path, params=None):
+    """GET a single (non-paginated) endpoint and return the decoded body."""
+    return cached_get(path, params)[0]
+
+
+def download(path, dest, params=None, chunk_size=64 * 1024):
+    """Stream a GET response body to the file `dest` without buffering it."""
+    with session.get(f"{API_URL}{path}", params=params, stream=True) as res:
+        res.raise_for_status()
+        with open(dest, "wb") as f:
+            for chunk in res.iter_content(chunk_size):
+                f.write(chunk)
+    return dest
+
+
+
+def upload(path, chunk_size=1024 * 1024, content_type=None):
+    """Upload the file at `path` in resumable chunks; return its stored
+    description ({"url", "sha256", ...}, see backend/uploads.py).
+
+    A chunk that fails is retried from the offset the server reports, so a
+    dropped connection only costs the chunk in flight.
+    """
+    size = os.path.getsize(path)
+    res = session.post(f"{API_URL}/uploads/", json={
+        "filename": os.path.basename(path), "content_type": content_type, "size": size,
+    })
+    res.raise_for_status()
+    upload_url = f"{API_URL}/uploads/{res.json()['upload_id']}"
+    offset, failures = 0, 0
+    with open(path, "rb") as f:
+        while offset < size:
+            f.seek(offset)
+            try:
+                res = session.put(upload_url, params={"offset": offset}, data=f.read(chunk_size))
+            except requests.ConnectionError:
+                failures += 1
+                if failures > 3:
+                    raise
+                offset = session.get(upload_url).json()["offset"]
+                continue
+            if res.status_code == 409:
+                offset = int(res.headers["Upload-Offset"])
+                continue
+            res.raise_for_status()
+            offset = res.json()["offset"]
+    res = session.post(f"{upload_url}/complete")
+    res.raise_for_status()
+    return res.json()
+
+class LocalCopy:
+    """Client-side mirror of the synced entities, kept current via /changes.
+
+    `tables` maps entity name (e.g. "tenders") to {id: row}. Call `sync()`
+    on each refresh; after the first full sync it only transfers the rows
+    written or deleted since the previous call.
+    """
+
+    def __init__(self):
+        self.since = 0
+        self.tables = {}
+
+    def sync(self):
+        changed = 0
+        while True:
+            res = session.get(f"{API_URL}/changes", params={"since": self.since, "limit": 5000})
+            res.raise_for_status()
+            feed = decode(res)
+            for entity, rows in feed["changes"].items():
+                table = self.tables.setdefault(entity, {})
+                for row in rows:
+                    table[row["id"]] = row
+                changed += len(rows)
+            for tombstone in feed["deleted"]:
+                self.tables.get(tombstone["entity"], {}).pop(tombstone["id"], None)
+            changed += len(feed["deleted"])
+            self.since = feed["next"]
+            if not feed["more"]:
+                return changed
@@ -2,7 +2,8 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
                              QScrollArea, QFrame, QMessageBox)
 from PySide6.QtCore import Qt, QTimer
-import requests
+from .api_client import LocalCopy, get_json, session
+from .live_updates import stream_for
 from .components import StatCard, ActionCard
 from .tender_dialogs import TenderFormDialog
 
@@ -12,6 +13,8 @@ class ClientPortal(QWidget):
     def __init__(self, user_data):
         super().__init__()
         self.user_data = user_data
+        # Mirror of this client's records; each refresh only fetches what changed
+        self.local = LocalCopy()
         self.init_ui()
 
     def init_ui(self):
@@ -51,47 +54,45 @@ class ClientPortal(QWidget):
         layout.addStretch()
         self.refresh_data()
 
-        # Auto refresh every 10 seconds so the UI reflects backend changes
+        # Changes to this client's tenders are pushed over the event socket;
+        # poll every 10 seconds only while it is disconnected.
+        self.stream = stream_for(self.user_data)
+        self.stream.change.connect(self.on_change)
+        self.stream.resync.connect(self.refresh_data)
         self._refresh_timer = QTimer(self)
         self._refresh_timer.setInterval(10000)
-        self._refresh_timer.timeout.connect(self.refresh_data)
+        self._refresh_timer.timeout.connect(self.poll_if_disconnected)
         self._refresh_timer.start()
 
+    def poll_if_disconnected(self):
+        if not self.stream.connected:
+            self.refresh_data()
+
+    def on_change(self, event):
+        # Counters depend on several entities; the ETag cache keeps the
+        # reload cheap for the parts that did not change.
+        if event['entity'] in ('tenders', 'invoices', 'payments'):
+            self.refresh_data()
+
     def refresh_data(self):
         try:
-            # Fetch tenders for this client
-            res = requests.get(f"{API_URL}/tenders/")
-            if res.status_code == 200:
-                all_tenders = res.json()
-                # Filter for this client
-                my_tenders = [t for t in all_tenders if t.get('client_id') == self.user_data['id']]
-                
-                self.table.setRowCount(len(my_tenders))
-                for i, t in enumerate(my_tenders):
-                    self.table.setItem(i, 0, QTableWidgetItem(t['tender_id']))
-                    self.table.setItem(i, 1, QTableWidgetItem(t['title']))
-                    self.table.setItem(i, 2, QTableWidgetItem(t['status'].upper()))
-                    self.table.setItem(i, 3, QTableWidgetItem(t['deadline'][:16].replace('T', ' ')))
-                
-                # Update stats with real counts
-                self.awaiting_app.update_value(str(len([t for t in my_tenders if t['status'] == 'submitted'])))
-                self.active_contracts.update_value(str(len([t for t in my_tenders if t['status'] == 'approved'])))
-                
-                # Fetch invoices to calculate real pending payments
-                inv_res = requests.get(f"{API_URL}/invoices/")
-                if inv_res.status_code == 200:
-                    all_invoices = inv_res.json()
-                    # Filter invoices for this client's tenders
-                    my_tender_ids = [t['id'] for t in my_tenders]
-                    # We need to know which POs belong to which tenders. 
-                    # For simplicity, we'll fetch POs too or assume we can filter by po.tender_id.
-                    po_res = requests.get(f"{API_URL}/purchase_orders/")
-                    if po_res.status_code == 200:
-                        all_pos = po_res.json()
-                        my_po_ids = [po['id'] for po in all_pos if po['tender_id'] in my_tender_ids]
-                        my_invoices = [inv for inv in all_invoices if inv['po_id'] in my_po_ids and inv['status'] != 'Paid']
-                        total_pending = sum(inv['total_payable'] for inv in my_invoices)
-                        self.pending_payments.update_value(f"$ {total_pending:,.0f}")
+            # /changes only carries this client's tenders
+            self.local.sync()
+            tenders = self.local.tables.get("tenders", {})
+            my_tenders = [tenders[i] for i in sorted(tenders)]
+            
+            self.table.setRowCount(len(my_tenders))
+            for i, t in enumerate(my_tenders):
+                self.table.setItem(i, 0, QTableWidgetItem(t['tender_id']))
+                self.table.setItem(i, 1, QTableWidgetItem(t['title']))
+                self.table.setItem(i, 2, QTableWidgetItem(t['status'].upper()))
+                self.table.setItem(i, 3, QTableWidgetItem(t['deadline'][:16].replace('T', ' ')))
+            
+            # Update stats with server-side counts
+            summary = get_json("/dashboard/summary/client", {"user_id": self.user_data['id']})
+            self.awaiting_app.update_value(str(summary['awaiting_approval']))
+            self.active_contracts.update_value(str(summary['active_contracts']))
+            self.pending_payments.update_value(f"$ {summary['pending_payments']:,.0f}")
         except Exception as e:
             print(f"Error refreshing client portal: {e}")
 
@@ -101,9 +102,9 @@ class ClientPortal(QWidget):
             data = dialog.get_data()
             try:
                 data['client_id'] = self.user_data['id']
-                data['tender_id'] = f"T-{requests.get(f'{API_URL}/tenders/').json().__len__() + 1001}"
+                # tender_id is allocated by the server
                 
-                res = requests.post(f"{API_URL}/tenders/", json=data)
+                res = session.post(f"{API_URL}/tenders/", json=data)
                 if res.status_code == 200:
                     self.refresh_data()
                     QMessageBox.information(self, "Success", "Tender created successfully!")
@@ -3,7 +3,9 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QHeaderView, QFrame, QFormLayout, QLineEdit, QComboBox,
                              QCheckBox, QMessageBox)
 from PySide6.QtCore import Qt
-import requests
+from .api_client import get_all, get_json, session
+from .live_updates import stream_for
+from .lookup import LookupCompleter
 
 API_URL = "http://localhost:8000"
 
@@ -68,19 +70,17 @@ class TechnicalEvaluationView(QWidget):
 
     def load_proposals(self):
         try:
-            res = requests.get(f"{API_URL}/proposals/")
-            if res.status_code == 200:
-                self.proposals = res.json()
-                self.table.setRowCount(len(self.proposals))
-                for i, p in enumerate(self.proposals):
-                    self.table.setItem(i, 0, QTableWidgetItem(f"T-{p['tender_id']}"))
-                    self.table.setItem(i, 1, QTableWidgetItem(f"V-{p['vendor_id']}"))
-                    self.table.setItem(i, 2, QTableWidgetItem("View PDF"))
-                    self.table.setItem(i, 3, QTableWidgetItem(str(p['technical_score'])))
-                    
-                    btn = QPushButton("Review")
-                    btn.clicked.connect(lambda _, idx=i: self.select_proposal(idx))
-                    self.table.setCellWidget(i, 4, btn)
+            self.proposals = get_all("/proposals/")
+            self.table.setRowCount(len(self.proposals))
+            for i, p in enumerate(self.proposals):
+                self.table.setItem(i, 0, QTableWidgetItem(f"T-{p['tender_id']}"))
+                self.table.setItem(i, 1, QTableWidgetItem(f"V-{p['vendor_id']}"))
+                self.table.setItem(i, 2, QTableWidgetItem("View PDF"))
+                self.table.setItem(i, 3, QTableWidgetItem(str(p['technical_score'])))
+                
+                btn = QPushButton("Review")
+                btn.clicked.connect(lambda _, idx=i: self.select_proposal(idx))
+                self.table.setCellWidget(i, 4, btn)
         except: pass
 
     def select_proposal(self, idx):
@@ -101,7 +101,7 @@ class TechnicalEvaluationView(QWidget):
             "status": "Shortlisted"
         }
         try:
-            res = requests.put(f"{API_URL}/proposals/{p['id']}", json=data)
+            res = session.put(f"{API_URL}/proposals/{p['id']}", json=data)
             if res.status_code == 200:
                 QMessageBox.information(self, "Success", "Technical evaluation submitted and saved to database.")
                 self.load_proposals()
@@ -121,7 +121,36 @@ class FinancialEvaluationView(QWidget):
         header = QLabel("Financial Evaluation & Commercial Input (Sales & Finance)")
         header.setStyleSheet("font-size: 24px; font-weight: bold; color: #1e3a8a;")
         layout.addWidget(header)
-        
+
+        # Combined ranking of the selected tender's bids (backend/ranking.py)
+        rank_bar = QHBoxLayout()
+        self.tender_select = QComboBox()
+        self.tender_select.setPlaceholderText("Type a tender ID or title...")
+        self.tender_lookup = LookupCompleter(self.tender_select, "tenders")
+        self.tech_weight = QLineEdit("0.7")
+        self.tech_weight.setMaximumWidth(60)
+        self.min_technical = QLineEdit("0")
+        self.min_technical.setMaximumWidth(60)
+        rank_btn = QPushButton("Rank Bids")
+        rank_btn.clicked.connect(self.load_ranking)
+        rank_bar.addWidget(QLabel("Tender:"))
+        rank_bar.addWidget(self.tender_select, 1)
+        rank_bar.addWidget(QLabel("Technical weight:"))
+        rank_bar.addWidget(self.tech_weight)
+        rank_bar.addWidget(QLabel("Min technical:"))
+        rank_bar.addWidget(self.min_technical)
+        rank_bar.addWidget(rank_btn)
+        layout.addLayout(rank_bar)
+
+        self.ranking_table = QTableWidget(0, 8)
+        self.ranking_table.setHorizontalHeaderLabels(["H1", "L1", "Vendor", "Tech Score", "Bid", "Financial Score", "Combined", "vs Estimate"])
+        self.ranking_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.ranking_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.ranking_table.itemSelectionChanged.connect(self.select_ranked)
+        layout.addWidget(self.ranking_table)
+        self.ranked = []
+        self.tender_lookup.refresh()
+
         form_frame = QFrame()
         form_frame.setStyleSheet("background-color: white; border-radius: 12px; padding: 20px;")
         f_layout = QFormLayout(form_frame)
@@ -158,10 +187,50 @@ class FinancialEvaluationView(QWidget):
         
         layout.addStretch()
 
+    def load_ranking(self):
+        tender_id = self.tender_select.currentData()
+        if not tender_id:
+            QMessageBox.warning(self, "Error", "Please select a tender.")
+            return
+        try:
+            params = {"tech_weight": float(self.tech_weight.text() or 0.7), "min_technical": float(self.min_technical.text() or 0)}
+            ranking = get_json(f"/tenders/{tender_id}/ranking", params)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to rank bids: {e}")
+            return
+        self.ranked = ranking['proposals']
+        self.ranking_table.setRowCount(len(self.ranked))
+        for i, e in enumerate(self.ranked):
+            vs_estimate = f"{e['vs_estimate']:+.1f}%" if e['vs_estimate'] is not None else "-"
+            cells = [f"H{e['h1_position']}" if e['h1_position'] else "-", f"L{e['l1_position']}" if e['l1_position'] else "-",
+                     f"V-{e['vendor_id']}", str(e['technical_score']), f"$ {e['financial_input'] or 0:,.2f}",
+                     f"{e['financial_score']:.1f}", f"{e['combined_score']:.1f}", vs_estimate]
+            for col, text in enumerate(cells):
+                self.ranking_table.setItem(i, col, QTableWidgetItem(text))
+
+    def select_ranked(self):
+        row = self.ranking_table.currentRow()
+        if row < 0 or row >= len(self.ranked):
+            return
+        e = self.ranked[row]
+        bid = e['financial_input'] or 0
+        self.cost_lbl.setText(f"$ {bid:,.2f}")
+        self.margin_lbl.setText(f"{e['vs_estimate']:+.1f}% vs estimate" if e['vs_estimate'] is not None else "N/A")
+        self.tax_lbl.setText(f"$ {bid * 0.18:,.2f}")
+
     def handle_recommendation(self, status):
-        # In a real app, we'd pick the active proposal. 
-        # For demo, we'll notify success and explain the role-based state change.
-        QMessageBox.information(self, "Success", f"Commercial input saved. Proposal marked as {status}.")
+        row = self.ranking_table.currentRow()
+        if row < 0 or row >= len(self.ranked):
+            QMessageBox.warning(self, "Error", "Please select a ranked proposal first.")
+            return
+        data = {"status": status, "financial_remarks": self.remarks.toPlainText()}
+        try:
+            res = session.put(f"{API_URL}/proposals/{self.ranked[row]['proposal_id']}", json=data)
+            if res.status_code == 200:
+                QMessageBox.information(self, "Success", f"Commercial input saved. Proposal marked as {status}.")
+                self.load_ranking()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed: {e}")
 
 class ClientApprovalView(QWidget):
     def __init__(self, user_data):
@@ -183,24 +252,58 @@ class ClientApprovalView(QWidget):
         layout.addWidget(self.table)
         self.load_approvals()
 
+        # Shortlisted proposals come and go as they are evaluated
+        stream = stream_for(self.user_data)
+        stream.change.connect(self.on_change)
+        stream.resync.connect(self.load_approvals)
+
     def load_approvals(self):
         try:
-            res = requests.get(f"{API_URL}/proposals/")
-            if res.status_code == 200:
-                self.proposals = [p for p in res.json() if p['status'] == 'Shortlisted']
-                self.table.setRowCount(len(self.proposals))
-                for i, p in enumerate(self.proposals):
-                    self.table.setItem(i, 0, QTableWidgetItem(f"T-{p['tender_id']}"))
-                    self.table.setItem(i, 1, QTableWidgetItem(str(p['technical_score'])))
-                    self.table.setItem(i, 2, QTableWidgetItem(p.get('financial_remarks', '')))
-                    self.table.setItem(i, 3, QTableWidgetItem(p['status']))
-                    self.table.setItem(i, 4, QTableWidgetItem("N/A"))
-                    
-                    btn = QPushButton("Select")
-                    btn.clicked.connect(lambda _, idx=i: self.select_proposal(idx))
-                    self.table.setCellWidget(i, 5, btn)
+            self.proposals = get_all("/proposals/", {"status": "Shortlisted"})
+            self.table.setRowCount(len(self.proposals))
+            for i, p in enumerate(self.proposals):
+                self.set_approval_row(i, p)
         except: pass
 
+    def set_approval_row(self, i, p):
+        self.table.setItem(i, 0, QTableWidgetItem(f"T-{p['tender_id']}"))
+        self.table.setItem(i, 1, QTableWidgetItem(str(p['technical_score'])))
+        self.table.setItem(i, 2, QTableWidgetItem(p.get('financial_remarks') or ''))
+        self.table.setItem(i, 3, QTableWidgetItem(p['status']))
+        self.table.setItem(i, 4, QTableWidgetItem("N/A"))
+
+        btn = QPushButton("Select")
+        btn.clicked.connect(lambda _, pid=p['id']: self.select_proposal(self.index_of(pid)))
+        self.table.setCellWidget(i, 5, btn)
+
+    def index_of(self, proposal_id):
+        for i, p in enumerate(self.proposals):
+            if p['id'] == proposal_id:
+                return i
+        return None
+
+    def on_change(self, event):
+        if event['entity'] != 'proposals':
+            return
+        idx = self.index_of(event['id'])
+        shortlisted = event['op'] != 'delete' and event['row']['status'] == "Shortlisted"
+        if idx is not None and not shortlisted:
+            # Decided or withdrawn: drop it from the queue
+            self.proposals.pop(idx)
+            self.table.removeRow(idx)
+            if getattr(self, 'current_idx', None) == idx:
+                del self.current_idx
+            elif getattr(self, 'current_idx', None) is not None and self.current_idx > idx:
+                self.current_idx -= 1
+        elif shortlisted:
+            if idx is None:
+                idx = len(self.proposals)
+                self.proposals.append(event['row'])
+                self.table.insertRow(idx)
+            else:
+                self.proposals[idx] = event['row']
+            self.set_approval_row(idx, event['row'])
+
     def select_proposal(self, idx):
         self.current_idx = idx
 
@@ -215,7 +318,7 @@ class ClientApprovalView(QWidget):
             "feedback": self.comments.toPlainText()
         }
         try:
-            res = requests.put(f"{API_URL}/proposals/{p['id']}", json=data)
+            res = session.put(f"{API_URL}/proposals/{p['id']}", json=data)
             if res.status_code == 200:
                 QMessageBox.information(self, "Success", f"Proposal {status.lower()}ed and logged in system.")
                 self.load_approvals()
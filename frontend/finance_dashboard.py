@@ -3,7 +3,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QScrollArea, QFrame)
 from PySide6.QtCore import Qt
 from .components import StatCard, ActionCard
-import requests
+from .api_client import get_json
 
 API_URL = "http://localhost:8000"
 
@@ -51,31 +51,20 @@ class FinanceDashboard(QWidget):
 
     def refresh_data(self):
         try:
-            # Fetch all invoices
-            inv_res = requests.get(f"{API_URL}/invoices/")
-            pay_res = requests.get(f"{API_URL}/payments/")
+            # Counters and the latest payments, aggregated server-side
+            summary = get_json("/dashboard/summary/finance")
             
-            if inv_res.status_code == 200 and pay_res.status_code == 200:
-                invoices = inv_res.json()
-                payments = pay_res.json()
-                
-                pending_invs = [inv for inv in invoices if inv['status'] != 'Paid']
-                self.inv_pending.update_value(str(len(pending_invs)))
-                
-                verified_payments = [p for p in payments if p['status'] == 'Verified']
-                total_received = sum(p['amount_paid'] for p in verified_payments)
-                self.pay_received.update_value(f"$ {total_received:,.0f}")
-                
-                total_outstanding = sum(inv['total_payable'] for inv in pending_invs)
-                self.out_balance.update_value(f"$ {total_outstanding:,.0f}")
-                
-                # Populate table with recent payments
-                self.table.setRowCount(len(payments))
-                for i, p in enumerate(reversed(payments)):
-                    if i >= 10: break # Show only last 10
-                    self.table.setItem(i, 0, QTableWidgetItem(p['payment_date'][:10]))
-                    self.table.setItem(i, 1, QTableWidgetItem(f"Invoice #{p['invoice_id']}"))
-                    self.table.setItem(i, 2, QTableWidgetItem(p['status']))
-                    self.table.setItem(i, 3, QTableWidgetItem(f"$ {p['amount_paid']:,.0f}"))
+            self.inv_pending.update_value(str(summary['pending_invoices']))
+            self.pay_received.update_value(f"$ {summary['payments_received']:,.0f}")
+            self.out_balance.update_value(f"$ {summary['outstanding_balance']:,.0f}")
+            
+            # Populate table with recent payments
+            payments = summary['recent_payments']
+            self.table.setRowCount(len(payments))
+            for i, p in enumerate(payments):
+                self.table.setItem(i, 0, QTableWidgetItem(p['payment_date'][:10]))
+                self.table.setItem(i, 1, QTableWidgetItem(f"Invoice #{p['invoice_id']}"))
+                self.table.setItem(i, 2, QTableWidgetItem(p['status']))
+                self.table.setItem(i, 3, QTableWidgetItem(f"$ {p['amount_paid']:,.0f}"))
         except Exception as e:
             print(f"Error refreshing finance dashboard: {e}")
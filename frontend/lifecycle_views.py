@@ -3,7 +3,10 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QTableWidget, QTableWidgetItem, QHeaderView,
                              QFileDialog, QMessageBox, QDateEdit, QComboBox, QCheckBox)
 from PySide6.QtCore import Qt, QDate
-import requests
+import mimetypes
+from .api_client import get_all, session, upload
+from .live_updates import stream_for
+from .lookup import LookupCompleter
 
 API_URL = "http://localhost:8000"
 
@@ -26,14 +29,18 @@ class OrderGenerationView(QWidget):
         f_layout = QFormLayout(form_frame)
         
         self.tender_ref = QComboBox()
-        self.tender_ref.setEditable(True)
-        self.tender_ref.setPlaceholderText("Select Tender Reference...")
+        self.tender_ref.setPlaceholderText("Type a tender ID or title...")
+        self.tender_lookup = LookupCompleter(self.tender_ref, "tenders")
+        self.vendor_select = QComboBox()
+        self.vendor_select.setPlaceholderText("Type a vendor name...")
+        self.vendor_lookup = LookupCompleter(self.vendor_select, "vendors")
         self.order_num = QLineEdit()
         self.order_num.setPlaceholderText("Enter Order Number...")
         self.order_date = QDateEdit(QDate.currentDate())
         self.approved_by = QLineEdit()
 
         f_layout.addRow("Tender Reference:", self.tender_ref)
+        f_layout.addRow("Vendor:", self.vendor_select)
         f_layout.addRow("Order Number:", self.order_num)
         f_layout.addRow("Order Date:", self.order_date)
 
@@ -59,21 +66,9 @@ class OrderGenerationView(QWidget):
         self.load_tenders_and_vendors()
 
     def load_tenders_and_vendors(self):
-        try:
-            tres = requests.get(f"{API_URL}/tenders/")
-            if tres.status_code == 200:
-                tenders = tres.json()
-                self.tender_ref.clear()
-                for t in tenders:
-                    # show readable label, keep id in userData
-                    self.tender_ref.addItem(f"{t['tender_id']} - {t['title']}", t['id'])
-            ures = requests.get(f"{API_URL}/users/")
-            self._vendors = []
-            if ures.status_code == 200:
-                users = ures.json()
-                self._vendors = [u for u in users if u['role'] == 'vendor']
-        except Exception as e:
-            print('Failed to load tenders/vendors:', e)
+        # Only the first options; typing fetches matches (see lookup.py)
+        self.tender_lookup.refresh()
+        self.vendor_lookup.refresh()
 
     def handle_po_issue(self):
         if not self.ack_box.isChecked():
@@ -84,7 +79,10 @@ class OrderGenerationView(QWidget):
                 tender_id = self.tender_ref.currentData()
             except Exception:
                 tender_id = None
-            vendor_id = self._vendors[0]['id'] if self._vendors else 0
+            vendor_id = self.vendor_select.currentData()
+            if not vendor_id:
+                QMessageBox.warning(self, "Error", "Please select a vendor.")
+                return
             data = {
                 "tender_id": tender_id or 0,
                 "vendor_id": vendor_id,
@@ -94,7 +92,7 @@ class OrderGenerationView(QWidget):
                 "approved_by": self.approved_by.text()
             }
             try:
-                res = requests.post(f"{API_URL}/purchase_orders/", json=data)
+                res = session.post(f"{API_URL}/purchase_orders/", json=data)
                 if res.status_code == 200:
                     QMessageBox.information(self, "Success", "Purchase Order issued and logged in system.")
                     # refresh any local views if needed
@@ -122,6 +120,7 @@ class ContractManagementView(QWidget):
         
         # New: Select Tender to link contract
         self.tender_select = QComboBox()
+        self.tender_lookup = LookupCompleter(self.tender_select, "tenders")
         f_layout.addRow("Link to Tender:", self.tender_select)
         
         f_layout.addRow("Scope of Work:", QLineEdit(placeholderText="Define scope..."))
@@ -145,14 +144,7 @@ class ContractManagementView(QWidget):
         self.load_tenders()
 
     def load_tenders(self):
-        try:
-            res = requests.get(f"{API_URL}/tenders/")
-            if res.status_code == 200:
-                tenders = res.json()
-                self.tender_select.clear()
-                for t in tenders:
-                    self.tender_select.addItem(f"{t['tender_id']} - {t['title']}", t['id'])
-        except: pass
+        self.tender_lookup.refresh()
 
     def handle_save_contract(self):
         tender_id = self.tender_select.currentData()
@@ -170,7 +162,7 @@ class ContractManagementView(QWidget):
             "dispatch_id": self.trans_id.text()
         }
         try:
-            res = requests.post(f"{API_URL}/contracts/", json=data)
+            res = session.post(f"{API_URL}/contracts/", json=data)
             if res.status_code == 200:
                 QMessageBox.information(self, "Success", "Contract dispatched.")
         except Exception as e:
@@ -192,6 +184,7 @@ class DeliveryMilestoneView(QWidget):
         
         # Select Tender
         self.tender_select = QComboBox()
+        self.tender_lookup = LookupCompleter(self.tender_select, "tenders")
         self.tender_select.currentIndexChanged.connect(self.load_milestones)
         layout.addWidget(QLabel("Select Tender Project:"))
         layout.addWidget(self.tender_select)
@@ -205,19 +198,13 @@ class DeliveryMilestoneView(QWidget):
         self.load_tenders()
 
     def load_tenders(self):
-        try:
-            res = requests.get(f"{API_URL}/tenders/")
-            if res.status_code == 200:
-                self.tender_select.clear()
-                for t in res.json():
-                    self.tender_select.addItem(f"{t['title']}", t['id'])
-        except: pass
+        self.tender_lookup.refresh()
 
     def load_milestones(self):
         try:
             tid = self.tender_select.currentData()
             if not tid: return
-            res = requests.get(f"{API_URL}/tenders/{tid}/milestones")
+            res = session.get(f"{API_URL}/tenders/{tid}/milestones")
             if res.status_code == 200:
                 self.populate_table(res.json())
         except: pass
@@ -228,7 +215,7 @@ class DeliveryMilestoneView(QWidget):
             self.table.insertRow(row)
             self.table.setItem(row, 0, QTableWidgetItem(m['title']))
             self.table.setItem(row, 1, QTableWidgetItem(m['status']))
-            self.table.setItem(row, 2, QTableWidgetItem(str(m.get('delivery_id') or 'Pending')))
+            self.table.setItem(row, 2, QTableWidgetItem(str(m.get('delivery_id') or ('Uploaded' if m.get('proof_url') else 'Pending'))))
             self.table.setItem(row, 3, QTableWidgetItem(m.get('inspection_status', 'Pending')))
             self.table.setItem(row, 4, QTableWidgetItem(m.get('quality_remarks', '')))
             
@@ -250,16 +237,22 @@ class DeliveryMilestoneView(QWidget):
             self.table.setCellWidget(row, 5, btn_widget)
 
     def handle_upload(self, mid):
-        # Simulating upload
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select Delivery Proof", "", "Documents (*.pdf *.png *.jpg *.jpeg)")
+        if not file_path:
+            return
         try:
-            requests.put(f"{API_URL}/milestones/{mid}", json={"delivery_id": "DEL-123", "status": "In Progress"})
+            # Chunked and resumable, so large scans survive a flaky link
+            stored = upload(file_path, content_type=mimetypes.guess_type(file_path)[0])
+            res = session.put(f"{API_URL}/milestones/{mid}", json={"proof_url": stored['url'], "status": "In Progress"})
+            res.raise_for_status()
             self.load_milestones()
-        except: pass
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Upload failed: {e}")
 
     def handle_inspection(self, mid):
         # Simulating inspection pass
         try:
-            requests.put(f"{API_URL}/milestones/{mid}", json={"inspection_status": "Passed", "status": "Completed"})
+            session.put(f"{API_URL}/milestones/{mid}", json={"inspection_status": "Passed", "status": "Completed"})
             self.load_milestones()
         except: pass
 
@@ -284,6 +277,7 @@ class BillingInvoiceView(QWidget):
         f_layout = QFormLayout(form_frame)
         
         self.po_select = QComboBox()
+        self.po_lookup = LookupCompleter(self.po_select, "purchase_orders")
         f_layout.addRow("Reference (PO):", self.po_select)
         f_layout.addRow("Tax (%)", QLineEdit("18"))
         f_layout.addRow("Discount (%)", QLineEdit("0"))
@@ -330,21 +324,13 @@ class BillingInvoiceView(QWidget):
             "verification_date": self.ver_date.date().toPython().isoformat()
         }
         try:
-            res = requests.post(f"{API_URL}/invoices/", json=data)
+            res = session.post(f"{API_URL}/invoices/", json=data)
             if res.status_code == 200:
                 QMessageBox.information(self, "Success", "Final audited invoice issued.")
         except: pass
 
     def load_purchase_orders(self):
-        try:
-            res = requests.get(f"{API_URL}/purchase_orders/")
-            if res.status_code == 200:
-                pos = res.json()
-                self.po_select.clear()
-                for po in pos:
-                    self.po_select.addItem(f"{po.get('po_number','PO-'+str(po['id']))} - Tender {po.get('tender_id')}", po['id'])
-        except Exception as e:
-            print('Failed to load POs:', e)
+        self.po_lookup.refresh()
 
 class PaymentManagementView(QWidget):
     def __init__(self, user_data, is_recording=False):
@@ -391,10 +377,16 @@ class PaymentManagementView(QWidget):
             layout.addWidget(form_frame)
             layout.addStretch()
         else:
-            table = QTableWidget(0, 5)
-            table.setHorizontalHeaderLabels(["Ref", "Amount", "Transfer ID", "System Record", "Action"])
-            layout.addWidget(table)
-            self.load_payments(table)
+            self.table = QTableWidget(0, 5)
+            self.table.setHorizontalHeaderLabels(["Ref", "Amount", "Transfer ID", "System Record", "Action"])
+            layout.addWidget(self.table)
+            self.payment_ids = []
+            self.load_payments(self.table)
+
+            # Patch rows as payments change instead of re-polling the list
+            stream = stream_for(self.user_data)
+            stream.change.connect(self.on_change)
+            stream.resync.connect(lambda: self.load_payments(self.table))
 
     def handle_payment_init(self):
         try:
@@ -411,42 +403,59 @@ class PaymentManagementView(QWidget):
             "commission_amount": amt * 0.10 # 10% auto commission
         }
         try:
-            res = requests.post(f"{API_URL}/payments/", json=data)
+            res = session.post(f"{API_URL}/payments/", json=data)
             if res.status_code == 200:
                 QMessageBox.information(self, "Success", "Payment initiated and recorded.")
         except: pass
 
     def load_invoices_for_payment(self):
         try:
-            r = requests.get(f"{API_URL}/invoices/")
-            if r.status_code == 200:
-                invs = r.json()
-                self.invoice_select.clear()
-                for inv in invs:
-                    self.invoice_select.addItem(f"{inv.get('invoice_number','INV-'+str(inv['id']))} - ${inv.get('total_payable',0)}", inv['id'])
+            invs = get_all("/invoices/")
+            self.invoice_select.clear()
+            for inv in invs:
+                self.invoice_select.addItem(f"{inv.get('invoice_number','INV-'+str(inv['id']))} - ${inv.get('total_payable',0)}", inv['id'])
         except Exception as e:
             print('Failed to load invoices:', e)
 
     def load_payments(self, table):
         try:
-            res = requests.get(f"{API_URL}/payments/")
-            if res.status_code == 200:
-                payments = res.json()
-                table.setRowCount(len(payments))
-                for i, p in enumerate(payments):
-                    table.setItem(i, 0, QTableWidgetItem(f"P-{p['id']}"))
-                    table.setItem(i, 1, QTableWidgetItem(f"$ {p['amount_paid']:,.2f}"))
-                    table.setItem(i, 2, QTableWidgetItem(p.get('transfer_id', '')))
-                    table.setItem(i, 3, QTableWidgetItem(p['status']))
-                    
-                    btn = QPushButton("Verify")
-                    btn.clicked.connect(lambda _, pid=p['id']: self.handle_verify(pid))
-                    table.setCellWidget(i, 4, btn)
+            payments = get_all("/payments/")
+            table.setRowCount(len(payments))
+            self.payment_ids = [p['id'] for p in payments]
+            for i, p in enumerate(payments):
+                self.set_payment_row(table, i, p)
         except: pass
 
+    def set_payment_row(self, table, i, p):
+        table.setItem(i, 0, QTableWidgetItem(f"P-{p['id']}"))
+        table.setItem(i, 1, QTableWidgetItem(f"$ {p['amount_paid']:,.2f}"))
+        table.setItem(i, 2, QTableWidgetItem(p.get('transfer_id', '')))
+        table.setItem(i, 3, QTableWidgetItem(p['status']))
+
+        btn = QPushButton("Verify")
+        btn.clicked.connect(lambda _, pid=p['id']: self.handle_verify(pid))
+        table.setCellWidget(i, 4, btn)
+
+    def on_change(self, event):
+        if event['entity'] != 'payments':
+            return
+        pid = event['id']
+        if event['op'] == 'delete':
+            if pid in self.payment_ids:
+                self.table.removeRow(self.payment_ids.index(pid))
+                self.payment_ids.remove(pid)
+            return
+        if pid in self.payment_ids:
+            row = self.payment_ids.index(pid)
+        else:
+            row = len(self.payment_ids)
+            self.payment_ids.append(pid)
+            self.table.insertRow(row)
+        self.set_payment_row(self.table, row, event['row'])
+
     def handle_verify(self, pid):
         try:
-            res = requests.put(f"{API_URL}/payments/{pid}/verify")
+            res = session.put(f"{API_URL}/payments/{pid}/verify")
             if res.status_code == 200:
                 QMessageBox.information(self, "Success", "Payment reconciled and verified.")
         except: pass
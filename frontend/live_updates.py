@@ -0,0 +1,75 @@
+import json
+
+from PySide6.QtCore import QObject, QTimer, QUrl, Signal
+from PySide6.QtWebSockets import QWebSocket
+
+from .api_client import API_URL
+
+RECONNECT_MS = 5000
+KEEPALIVE_MS = 30000
+
+
+class EventStream(QObject):
+    """Change events pushed by the backend's /ws/events socket.
+
+    Views connect to `change` (one event dict per written row, see
+    backend/notifications.py) and patch their tables in place. `resync`
+    fires when events were missed (reconnect, or the client fell behind)
+    and views should reload. While `connected` is False, views fall back
+    to polling.
+    """
+
+    change = Signal(dict)
+    resync = Signal()
+
+    def __init__(self, user_data, parent=None):
+        super().__init__(parent)
+        ws_base = API_URL.replace("http://", "ws://").replace("https://", "wss://")
+        self.url = QUrl(f"{ws_base}/ws/events?token={user_data['token']}")
+        self.connected = False
+        self._socket = QWebSocket()
+        self._socket.connected.connect(self._on_connected)
+        self._socket.disconnected.connect(self._on_disconnected)
+        self._socket.textMessageReceived.connect(self._on_message)
+        self._reconnect = QTimer(self)
+        self._reconnect.setSingleShot(True)
+        self._reconnect.timeout.connect(self.open)
+        self._keepalive = QTimer(self)
+        self._keepalive.setInterval(KEEPALIVE_MS)
+        self._keepalive.timeout.connect(lambda: self._socket.sendTextMessage("ping"))
+        self.open()
+
+    def open(self):
+        self._socket.open(self.url)
+
+    def _on_connected(self):
+        self.connected = True
+        self._keepalive.start()
+        # Anything written while we were away was missed
+        self.resync.emit()
+
+    def _on_disconnected(self):
+        self.connected = False
+        self._keepalive.stop()
+        self._reconnect.start(RECONNECT_MS)
+
+    def _on_message(self, message):
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return
+        if event.get("type") == "change":
+            self.change.emit(event)
+        elif event.get("type") == "resync":
+            self.resync.emit()
+
+
+_streams = {}
+
+
+def stream_for(user_data):
+    """The shared EventStream of the logged-in user."""
+    key = user_data['id']
+    if key not in _streams:
+        _streams[key] = EventStream(user_data)
+    return _streams[key]
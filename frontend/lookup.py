@@ -0,0 +1,60 @@
+from PySide6.QtCore import QObject, QStringListModel, Qt, QTimer
+from PySide6.QtWidgets import QComboBox, QCompleter
+
+from .api_client import get_json
+
+DEBOUNCE_MS = 250
+LOOKUP_LIMIT = 20
+
+
+class LookupCompleter(QObject):
+    """Fill an editable combo box from /lookup/{entity} as the user types.
+
+    Requests wait until typing pauses for DEBOUNCE_MS, and return at most
+    LOOKUP_LIMIT {id, label} options (see backend/lookup.py), so a picker
+    costs the same however many tenders, vendors or orders exist. Each
+    option's id is its item data: views keep reading `currentData()`,
+    which is None until an option is picked.
+    """
+
+    def __init__(self, combo: QComboBox, entity: str, limit: int = LOOKUP_LIMIT):
+        super().__init__(combo)
+        self.combo = combo
+        self.entity = entity
+        self.limit = limit
+        self._model = QStringListModel(self)
+
+        combo.setEditable(True)
+        combo.setInsertPolicy(QComboBox.NoInsert)
+        completer = QCompleter(self._model, combo)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        # The server already matched; show every option it returned
+        completer.setFilterMode(Qt.MatchContains)
+        combo.setCompleter(completer)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self.refresh)
+        combo.lineEdit().textEdited.connect(lambda _: self._timer.start())
+
+    def refresh(self):
+        typed = self.combo.currentText()
+        try:
+            options = get_json(f"/lookup/{self.entity}", {"q": typed, "limit": self.limit})
+        except Exception as e:
+            print(f"Lookup of {self.entity} failed:", e)
+            return
+        self.combo.blockSignals(True)
+        try:
+            self.combo.clear()
+            for option in options:
+                self.combo.addItem(option['label'], option['id'])
+            # Nothing is picked until the user chooses an option
+            self.combo.setCurrentIndex(-1)
+            self.combo.setEditText(typed)
+        finally:
+            self.combo.blockSignals(False)
+        self._model.setStringList([option['label'] for option in options])
+        if typed and self.combo.lineEdit().hasFocus():
+            self.combo.completer().complete()
@@ -6,7 +6,6 @@ if sys.version_info[0] < 3 or (sys.version_info[0] == 3 and sys.version_info[1]
     sys.exit(
         "Tender UI requires Python 3.6+ — run with `python3 -m frontend.main` or activate a Python 3 venv."
     )
-import requests
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                              QStackedWidget, QFrame, QMessageBox, QComboBox,
@@ -16,6 +15,7 @@ from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QColor, QIcon, QFont
 
 # Internal Imports
+from .api_client import session, sign_in, sign_out
 from .components import SidebarButton, StatCard, ActionCard
 from .admin_dashboard import AdminDashboard
 from .client_portal import ClientPortal
@@ -210,9 +210,11 @@ class LoginWindow(QWidget):
         password = self.password_input.text()
 
         try:
-            response = requests.post(f"{API_URL}/login/", json={"username": username, "password": password})
+            response = session.post(f"{API_URL}/login/", json={"username": username, "password": password})
             if response.status_code == 200:
-                self.on_login_success(response.json())
+                user_data = response.json()
+                sign_in(user_data)
+                self.on_login_success(user_data)
             else:
                 QMessageBox.warning(self, "Login Failed", "Invalid credentials")
         except Exception as e:
@@ -390,6 +392,7 @@ class MainApplication(QMainWindow):
         self.stacked_widget.setCurrentWidget(self.dashboard_wrapper)
 
     def logout(self):
+        sign_out()
         self.stacked_widget.setCurrentIndex(0)
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QScrollArea, QFrame)
 from PySide6.QtCore import Qt
 from .components import StatCard, ActionCard
-import requests
+from .api_client import get_all, get_json
 
 API_URL = "http://localhost:8000"
 
@@ -51,28 +51,20 @@ class TechnicalDashboard(QWidget):
 
     def refresh_data(self):
         try:
-            res = requests.get(f"{API_URL}/tenders/")
-            if res.status_code == 200:
-                tenders = res.json()
-                # Tenders awaiting tech review
-                pending = [t for t in tenders if t['status'] in ['open', 'submitted']]
-                
-                self.table.setRowCount(len(pending))
-                for i, t in enumerate(pending):
-                    self.table.setItem(i, 0, QTableWidgetItem(t['tender_id']))
-                    self.table.setItem(i, 1, QTableWidgetItem(t['title']))
-                    self.table.setItem(i, 2, QTableWidgetItem(str(t.get('client_id', 'N/A'))))
-                    self.table.setItem(i, 3, QTableWidgetItem(t['deadline'][:16].replace('T', ' ')))
-                
-                self.pending_eval.update_value(str(len(pending)))
-                
-                # Fetch proposals for scores and completed reviews
-                prop_res = requests.get(f"{API_URL}/proposals/")
-                if prop_res.status_code == 200:
-                    proposals = prop_res.json()
-                    scored_proposals = [p for p in proposals if p['technical_score'] > 0]
-                    avg_score = sum(p['technical_score'] for p in scored_proposals) / len(scored_proposals) if scored_proposals else 0
-                    self.avg_score.update_value(f"{avg_score:.1f}/100")
-                    self.completed_eval.update_value(str(len(scored_proposals)))
+            # Tenders awaiting tech review
+            pending = get_all("/tenders/", {"status": "open"}) + get_all("/tenders/", {"status": "submitted"})
+            
+            self.table.setRowCount(len(pending))
+            for i, t in enumerate(pending):
+                self.table.setItem(i, 0, QTableWidgetItem(t['tender_id']))
+                self.table.setItem(i, 1, QTableWidgetItem(t['title']))
+                self.table.setItem(i, 2, QTableWidgetItem(str(t.get('client_id', 'N/A'))))
+                self.table.setItem(i, 3, QTableWidgetItem(t['deadline'][:16].replace('T', ' ')))
+            
+            # Scores and completed reviews, aggregated server-side
+            summary = get_json("/dashboard/summary/technical")
+            self.pending_eval.update_value(str(summary['pending_evaluation']))
+            self.avg_score.update_value(f"{summary['average_technical_score']:.1f}/100")
+            self.completed_eval.update_value(str(summary['completed_evaluations']))
         except Exception as e:
             print(f"Error refreshing technical dashboard: {e}")
@@ -2,7 +2,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QTableWidget, QTableWidgetItem, QHeaderView,
                              QFrame, QLineEdit, QComboBox)
 from PySide6.QtCore import Qt
-import requests
+from .api_client import get_all, session
 from .tender_dialogs import TenderFormDialog
 
 API_URL = "http://localhost:8000"
@@ -38,9 +38,12 @@ class TenderListView(QWidget):
         fb_layout = QHBoxLayout(filter_bar)
         
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Search by ID or Title...")
+        self.search_input.setPlaceholderText("Search title or description...")
+        self.search_input.returnPressed.connect(self.load_tenders)
         self.status_filter = QComboBox()
-        self.status_filter.addItems(["All Statuses", "Open", "Under Review", "Approved", "Rejected"])
+        self.status_filter.addItem("All Statuses", None)
+        for label, value in [("Open", "open"), ("Under Review", "under_review"), ("Approved", "approved"), ("Rejected", "rejected")]:
+            self.status_filter.addItem(label, value)
         
         refresh_btn = QPushButton("Apply Filters")
         refresh_btn.clicked.connect(self.load_tenders)
@@ -66,16 +69,20 @@ class TenderListView(QWidget):
 
     def load_tenders(self):
         try:
-            res = requests.get(f"{API_URL}/tenders/")
-            if res.status_code == 200:
-                tenders = res.json()
-                self.table.setRowCount(len(tenders))
-                for i, t in enumerate(tenders):
-                    self.table.setItem(i, 0, QTableWidgetItem(t['tender_id']))
-                    self.table.setItem(i, 1, QTableWidgetItem(t['title']))
-                    self.table.setItem(i, 2, QTableWidgetItem(str(t.get('client_id', 'N/A'))))
-                    self.table.setItem(i, 3, QTableWidgetItem(t['status'].upper()))
-                    self.table.setItem(i, 4, QTableWidgetItem(t['created_at'][:10]))
+            # Filtered on the server; text goes through the full-text index
+            params = {}
+            if self.search_input.text().strip():
+                params['q'] = self.search_input.text().strip()
+            if self.status_filter.currentData():
+                params['status'] = self.status_filter.currentData()
+            tenders = get_all("/tenders/", params)
+            self.table.setRowCount(len(tenders))
+            for i, t in enumerate(tenders):
+                self.table.setItem(i, 0, QTableWidgetItem(t['tender_id']))
+                self.table.setItem(i, 1, QTableWidgetItem(t['title']))
+                self.table.setItem(i, 2, QTableWidgetItem(str(t.get('client_id', 'N/A'))))
+                self.table.setItem(i, 3, QTableWidgetItem(t['status'].upper()))
+                self.table.setItem(i, 4, QTableWidgetItem(t['created_at'][:10]))
         except Exception as e:
             print(f"Error loading tenders: {e}")
 
@@ -86,9 +93,9 @@ class TenderListView(QWidget):
             try:
                 # Add client_id from user_data
                 data['client_id'] = self.user_data['id']
-                data['tender_id'] = f"T-{requests.get(f'{API_URL}/tenders/').json().__len__() + 1001}"
+                # tender_id is allocated by the server
                 
-                res = requests.post(f"{API_URL}/tenders/", json=data)
+                res = session.post(f"{API_URL}/tenders/", json=data)
                 if res.status_code == 200:
                     self.load_tenders()
                     QMessageBox.information(self, "Success", "Tender created successfully!")
@@ -3,7 +3,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QScrollArea, QFrame)
 from PySide6.QtCore import Qt
 from .components import StatCard, ActionCard
-import requests
+from .api_client import get_all, get_json
 
 API_URL = "http://localhost:8000"
 
@@ -51,32 +51,19 @@ class VendorPortal(QWidget):
 
     def refresh_data(self):
         try:
-            # Fetch all proposals
-            res = requests.get(f"{API_URL}/proposals/")
-            if res.status_code == 200:
-                all_proposals = res.json()
-                # Filter for this vendor
-                my_props = [p for p in all_proposals if p['vendor_id'] == self.user_data['id']]
-                
-                self.table.setRowCount(len(my_props))
-                for i, p in enumerate(my_props):
-                    self.table.setItem(i, 0, QTableWidgetItem(f"T-{p['tender_id']}"))
-                    self.table.setItem(i, 1, QTableWidgetItem("Tender Title")) # Ideally fetch tender title
-                    self.table.setItem(i, 2, QTableWidgetItem(f"$ {p['financial_input']:,.0f}"))
-                    self.table.setItem(i, 3, QTableWidgetItem(p['status'].upper()))
-                
-                self.my_bids.update_value(str(len(my_props)))
-                approved = len([p for p in my_props if p['status'] == 'Approved'])
-                pending = len([p for p in my_props if p['status'] not in ['Approved', 'Rejected']])
-                self.app_pending.update_value(f"{approved} / {pending}")
-
-                # Fetch invoices for this vendor
-                po_res = requests.get(f"{API_URL}/purchase_orders/")
-                inv_res = requests.get(f"{API_URL}/invoices/")
-                if po_res.status_code == 200 and inv_res.status_code == 200:
-                    my_pos = [po for po in po_res.json() if po['vendor_id'] == self.user_data['id']]
-                    my_po_ids = [po['id'] for po in my_pos]
-                    pending_invs = [inv for inv in inv_res.json() if inv['po_id'] in my_po_ids and inv['status'] != 'Paid']
-                    self.pend_inv.update_value(str(len(pending_invs)))
+            # Fetch this vendor's proposals
+            my_props = get_all("/proposals/", {"vendor_id": self.user_data['id']})
+            
+            self.table.setRowCount(len(my_props))
+            for i, p in enumerate(my_props):
+                self.table.setItem(i, 0, QTableWidgetItem(f"T-{p['tender_id']}"))
+                self.table.setItem(i, 1, QTableWidgetItem("Tender Title")) # Ideally fetch tender title
+                self.table.setItem(i, 2, QTableWidgetItem(f"$ {p['financial_input']:,.0f}"))
+                self.table.setItem(i, 3, QTableWidgetItem(p['status'].upper()))
+            
+            summary = get_json("/dashboard/summary/vendor", {"user_id": self.user_data['id']})
+            self.my_bids.update_value(str(summary['total_bids']))
+            self.app_pending.update_value(f"{summary['approved_bids']} / {summary['pending_bids']}")
+            self.pend_inv.update_value(str(summary['pending_invoices']))
         except Exception as e:
             print(f"Error refreshing vendor portal: {e}")